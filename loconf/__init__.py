@@ -50,21 +50,84 @@ class Configuration(object):
     def comdebug(self):
         return bool(self._confdata.get("comdebug", False))
 
+    @property
+    def optimize_lexer(self):
+        return bool(self._confdata.get("optimize_lexer", False))
+
     @functools.cached_property
     def dbconn(self):
+        """
+        “database” is either the path of an SQLite database file or
+        a table with a “type” of “sqlite” (and a “path”) or “psycopg2”
+        (and connection “params”). With a “pool” table in the latter,
+        connections are pooled so threads can use the database
+        concurrently:
+
+            [database.pool]
+            min = 1 # Connections kept open
+            max = 8
+            timeout = 30 # Seconds to wait for one
+        """
         entry = self._confdata["database"]
+        from .database import connection
         if type(entry) is str:
-            # The the string as a path and open it as some database
-            # format.
-            pass
+            return connection.SQLiteConnection(
+                pathlib.Path(entry).expanduser())
         else:
             typ = entry.get("type", "none")
-            from .database import connection
-            if typ == "psycopg2":
-                return connection.PostgresConnection(entry.get("params"))
+            if typ == "sqlite":
+                return connection.SQLiteConnection(
+                    pathlib.Path(entry["path"]).expanduser())
+            elif typ == "psycopg2":
+                pool = entry.get("pool", {})
+                return connection.PostgresConnection(
+                    entry.get("params"),
+                    pool_min=pool.get("min", 1),
+                    pool_max=pool.get("max", None),
+                    pool_timeout=pool.get("timeout", 30))
             else:
                 raise ValueError(f"Unknown database type “{typ}”")
 
+    @property
+    def parser_backend(self):
+        return self._confdata.get("parser_backend", "ply")
+
+    @functools.cached_property
+    def include_cache(self):
+        """
+        Set “include_cache” to true to pickle parsed include files
+        to ~/.cache/loconf or to a path to use that directory instead.
+        """
+        entry = self._confdata.get("include_cache", False)
+        if entry is True:
+            cachedir = pathlib.Path(pathlib.Path.home(), ".cache", "loconf")
+        elif entry:
+            cachedir = pathlib.Path(entry).expanduser()
+        else:
+            cachedir = None
+
+        from .language.cache import IncludeCache
+        return IncludeCache(cachedir)
+
+    @functools.cached_property
+    def latency_profiles(self):
+        """
+        Latency profiles by decoder from the “latency_profiles” table
+        and those learned by the tools, kept in
+        ~/.cache/loconf/latency_profiles.toml or the file named by
+        “latency_profiles_file”.
+        """
+        path = self._confdata.get("latency_profiles_file", None)
+        if path is None:
+            path = pathlib.Path(pathlib.Path.home(), ".cache", "loconf",
+                                "latency_profiles.toml")
+        else:
+            path = pathlib.Path(path).expanduser()
+
+        from .dccex.timing import LatencyProfiles
+        return LatencyProfiles(self._confdata.get("latency_profiles", {}),
+                               path)
+
     @functools.cached_property
     def station(self):
         entry = self._confdata["station"]
@@ -75,6 +138,10 @@ class Configuration(object):
 
             from .dccex.station import DCCEX_Station
             return DCCEX_Station(**params)
+        elif type == "stationd":
+            # The daemon opens the port, see loconf.dccex.daemon.
+            from .dccex.daemon import DaemonStation
+            return DaemonStation(entry.get("socket_path", None))
         else:
             raise ValueError(f"Unknown station type “{type}”")
 
@@ -1,8 +1,10 @@
+import io, re, time, datetime, itertools, threading, contextlib, weakref
+
 from termcolor import colored
 from sqlclasses import sql
 
 from .. import config, sqldebug
-from .object import dbobject
+from .object import dbobject, StreamingResult
 
 class DatabaseConnection(object):
     """
@@ -32,19 +34,187 @@ class CursorDebugWrapper(object):
         return self._cursor.__iter__()
 
 
+class CheckedOut(object):
+    """
+    A connection a thread has checked out of the pool, kept in its
+    thread-local storage. It goes back to the pool on release() or
+    when the thread ends and the storage is cleared.
+    """
+    def __init__(self, ds, putconn):
+        self.ds = ds
+        self.release = weakref.finalize(self, putconn, ds)
+        self.release.atexit = False
+
 class PostgresConnection(DatabaseConnection):
-    def __init__(self, params):
+    """
+    Without “pool_max”, all threads share one connection. With it,
+    each thread checks out a connection of its own from a pool of up
+    to “pool_max” connections, keeping “pool_min” of them open when
+    they are not in use. A thread keeps its connection until release()
+    is called or the thread ends, unless it uses checkout(). Threads
+    wait for a connection when all of them are in use, for up to
+    “pool_timeout” seconds before psycopg2.pool.PoolError is raised.
+
+    Connections that have not been used for “health_check_interval”
+    seconds are checked with “SELECT 1” before they are handed out.
+    Broken ones are replaced, and a statement that fails because the
+    connection broke outside of a transaction is run once more on a
+    new one.
+    """
+    health_check_interval = 30
+
+    def __init__(self, params, pool_min=1, pool_max=None, pool_timeout=30):
         import psycopg2
         self.params = params
         self.backend = sql.Backend(psycopg2, None)
-        self._ds = None
+
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.pool_timeout = pool_timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        if pool_max is not None:
+            self._available = threading.BoundedSemaphore(pool_max)
+
+        self._ds = None # The shared connection without a pool
+        self._local = threading.local()
+        self._last_used = {} # Maps connections to time.monotonic()
+
+    @property
+    def pooled(self):
+        return self.pool_max is not None
+
+    @property
+    def pool(self):
+        from psycopg2.pool import ThreadedConnectionPool
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.pool_min,
+                                                    self.pool_max,
+                                                    **self.params)
+        return self._pool
 
     @property
     def ds(self):
+        """
+        The current thread’s connection.
+        """
+        if not self.pooled:
+            import psycopg2
+            if self._ds is None or self._ds.closed:
+                self._ds = psycopg2.connect(**self.params)
+            return self._ds
+
+        checked_out = getattr(self._local, "checked_out", None)
+        if checked_out is not None and checked_out.ds.closed:
+            self._discard(checked_out.ds)
+            checked_out = None
+
+        if checked_out is None:
+            checked_out = CheckedOut(self._getconn(), self._putconn)
+            self._local.checked_out = checked_out
+
+        return checked_out.ds
+
+    def _getconn(self):
+        if not self._available.acquire(timeout=self.pool_timeout):
+            from psycopg2.pool import PoolError
+            raise PoolError(f"No database connection available within "
+                            f"{self.pool_timeout} seconds.")
+        try:
+            while True:
+                ds = self.pool.getconn()
+                if self._healthy(ds):
+                    return ds
+                self.pool.putconn(ds, close=True)
+        except Exception:
+            self._available.release()
+            raise
+
+    def _putconn(self, ds, close=False):
+        """
+        Return “ds” to the pool and free its slot.
+        """
+        try:
+            # Unless close() has closed them all.
+            if self._pool is not None:
+                self._pool.putconn(ds, close=close)
+        finally:
+            self._available.release()
+
+        # The pool closes the ones it doesn’t keep.
+        if ds.closed:
+            self._last_used.pop(ds, None)
+        else:
+            self._last_used[ds] = time.monotonic()
+
+    def _healthy(self, ds) -> bool:
         import psycopg2
-        if self._ds is None:
-            self._ds = psycopg2.connect(**self.params)
-        return self._ds
+
+        if ds.closed:
+            return False
+
+        last_used = self._last_used.get(ds, None)
+        if last_used is None \
+           or time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with ds.cursor() as cc:
+                cc.execute("SELECT 1")
+            ds.rollback()
+        except ( psycopg2.OperationalError, psycopg2.InterfaceError, ):
+            return False
+        else:
+            return True
+
+    def _discard(self, ds):
+        """
+        Give up on the current thread’s connection “ds” because it is
+        broken.
+        """
+        if self.pooled:
+            self._local.checked_out.release.detach()
+            self._local.checked_out = None
+            self._putconn(ds, close=True)
+        else:
+            self._ds = None
+
+    def release(self):
+        """
+        Return the current thread’s connection to the pool, rolling back
+        whatever has not been committed.
+        """
+        checked_out = getattr(self._local, "checked_out", None)
+        if checked_out is not None:
+            self._local.checked_out = None
+            checked_out.release()
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """
+        Use a connection of the thread’s own in the with block and
+        return it to the pool afterwards (uncommitted changes are
+        rolled back). Does nothing without a pool or if the thread
+        already has a connection.
+        """
+        if not self.pooled \
+           or getattr(self._local, "checked_out", None) is not None:
+            yield
+        else:
+            try:
+                self.ds
+                yield
+            finally:
+                self.release()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+        if self._ds is not None:
+            self._ds.close()
+            self._ds = None
 
     def connect(self):
         # This will call the ds() property method above.
@@ -58,6 +228,34 @@ class PostgresConnection(DatabaseConnection):
         else:
             return cursor
 
+    def _execute(self, command, parameters):
+        """
+        Return a cursor “command” has been executed on. If the
+        connection breaks while no transaction is in progress, it is
+        replaced and “command” executed once more.
+        """
+        import psycopg2
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        ds = self.ds
+        idle = ( ds.info.transaction_status == TRANSACTION_STATUS_IDLE )
+
+        cc = self.cursor()
+        try:
+            cc.execute(command, parameters)
+        except ( psycopg2.OperationalError, psycopg2.InterfaceError, ):
+            if not ds.closed:
+                raise
+
+            self._discard(ds)
+            if not idle:
+                raise
+
+            cc = self.cursor()
+            cc.execute(command, parameters)
+
+        return cc
+
     def execute(self, command, parameters=()):
         if isinstance(command, sql.Part):
             if parameters:
@@ -65,9 +263,7 @@ class PostgresConnection(DatabaseConnection):
                                  "sqlclasses.sql statement.")
             command, parameters = self.backend.rollup(command)
 
-        cc = self.cursor()
-        cc.execute(command, parameters)
-        return cc
+        return self._execute(command, parameters)
 
     def query(self, command, parameters=(), dbobject_class=dbobject):
         if isinstance(command, sql.Part):
@@ -76,10 +272,34 @@ class PostgresConnection(DatabaseConnection):
                                  "sqlclasses.sql statement.")
             command, parameters = self.backend.rollup(command)
 
-        with self.cursor() as cc:
-            cc.execute(command, parameters)
+        with self._execute(command, parameters) as cc:
             return dbobject_class.__result_class__(cc, dbobject_class)
 
+    # Numbers the named cursors stream() creates.
+    _cursor_numbers = itertools.count()
+
+    def stream(self, command, parameters=(), itersize=2000,
+               dbobject_class=None):
+        """
+        Run the query “command” on a named cursor, which keeps the
+        result on the server and fetches it “itersize” rows at a time.
+        Return a StreamingResult, which must be iterated over before
+        the transaction ends.
+        """
+        if isinstance(command, sql.Part):
+            if parameters:
+                raise ValueError("Can’t provide parameters with "
+                                 "sqlclasses.sql statement.")
+            command, parameters = self.backend.rollup(command)
+
+        cc = self.ds.cursor(f"loconf_stream_{next(self._cursor_numbers)}")
+        cc.itersize = itersize
+        if config.sqldebug:
+            cc = CursorDebugWrapper(cc)
+
+        cc.execute(command, parameters)
+        return StreamingResult(cc, dbobject_class)
+
     def select_one(self, command, parameters=(), dbobject_class=dbobject):
         if isinstance(command, sql.Part):
             if parameters:
@@ -87,8 +307,7 @@ class PostgresConnection(DatabaseConnection):
                                  "sqlclasses.sql statement.")
             command, parameters = self.backend.rollup(command)
 
-        with self.cursor() as cc:
-            cc.execute(command, parameters)
+        with self._execute(command, parameters) as cc:
             tpl = cc.fetchone()
             if tpl is None:
                 return None
@@ -102,14 +321,38 @@ class PostgresConnection(DatabaseConnection):
                                  "sqlclasses.sql statement.")
             command, parameters = self.backend.rollup(command)
 
-        with self.cursor() as cc:
-            cc.execute(command, parameters)
+        with self._execute(command, parameters) as cc:
             ret = cc.fetchone()
             if ret is not None and len(ret) == 1:
                 return ret[0]
             else:
                 return ret
 
+    def copy_from(self, relation:str, columns:list[str], rows):
+        """
+        Insert “rows”, tuples of numbers (or None), into “relation”
+        using COPY, which is much faster than INSERT for many rows.
+        """
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join([ r"\N" if value is None else str(value)
+                                     for value in row ]))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        with self.cursor() as cc:
+            cc.copy_expert(f"COPY {relation} ({', '.join(columns)}) "
+                           f"FROM STDIN", buffer)
+
+    def reserve_ids(self, relation:str, count:int) -> list[int]:
+        """
+        Return “count” ids for new rows in “relation” from its id
+        sequence, in ascending order.
+        """
+        cc = self._execute("SELECT nextval(%s) FROM generate_series(1, %s)",
+                           ( f"{relation}_id_seq", count, ))
+        return sorted([ id for id, in cc.fetchall() ])
+
     def commit(self):
         self.ds.commit()
 
@@ -140,3 +383,264 @@ class PostgresConnection(DatabaseConnection):
                 return id
             else:
                 return None
+
+
+# The equivalent of sql/postgres.sql (including current_value) for
+# SQLite, plus an index for looking up a vehicle’s revisions.
+sqlite_schema = """\
+CREATE TABLE IF NOT EXISTS roster
+(
+   nickname TEXT NOT NULL UNIQUE,
+   designation TEXT NOT NULL DEFAULT '',
+   address INTEGER NOT NULL,
+   vehicle_id TEXT NOT NULL,
+
+   PRIMARY KEY (address, vehicle_id)
+);
+
+CREATE TABLE IF NOT EXISTS revision
+(
+   id INTEGER PRIMARY KEY AUTOINCREMENT,
+   address INTEGER NOT NULL,
+   vehicle_id TEXT,
+   comment TEXT NOT NULL DEFAULT '',
+   ctime TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+   FOREIGN KEY (address, vehicle_id) REFERENCES roster
+);
+
+CREATE INDEX IF NOT EXISTS revision_vehicle
+    ON revision (address, vehicle_id);
+
+CREATE TABLE IF NOT EXISTS value
+(
+   revision_id INTEGER REFERENCES revision,
+   cv SMALLINT NOT NULL,
+   value SMALLINT NOT NULL,
+
+   UNIQUE (revision_id, cv)
+);
+
+CREATE TABLE IF NOT EXISTS current_value
+(
+   address INTEGER NOT NULL,
+   vehicle_id TEXT NOT NULL,
+   cv SMALLINT NOT NULL,
+   value SMALLINT NOT NULL,
+   revision_id INTEGER NOT NULL REFERENCES revision,
+
+   PRIMARY KEY (address, vehicle_id, cv),
+   FOREIGN KEY (address, vehicle_id) REFERENCES roster
+) WITHOUT ROWID;
+"""
+
+class SQLiteColumn(object):
+    """
+    The part of a psycopg2 Column that dbobject uses.
+    """
+    def __init__(self, name):
+        self.name = name
+
+class SQLiteCursor(object):
+    """
+    Make a sqlite3 cursor look like a psycopg2 cursor to the rest of
+    loconf: take “%s” placeholders, work as a context manager and have
+    Column objects in its description.
+    """
+    placeholder_re = re.compile(r"%([s%])")
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._cursor.close()
+
+    def __iter__(self):
+        return self._cursor.__iter__()
+
+    @classmethod
+    def translate(cls, query, parameters):
+        if parameters:
+            query = cls.placeholder_re.sub(
+                lambda match: "?" if match.group(1) == "s" else "%", query)
+        return query
+
+    def execute(self, query, parameters=()):
+        if config.sqldebug:
+            print(colored(f"{query} {parameters}", "cyan"))
+        self._cursor.execute(self.translate(query, parameters),
+                             parameters or ())
+        return self
+
+    def executemany(self, query, seq_of_parameters):
+        self._cursor.executemany(self.translate(query, True),
+                                 seq_of_parameters)
+        return self
+
+    @property
+    def description(self):
+        if self._cursor.description is None:
+            return None
+        else:
+            return [ SQLiteColumn(column[0])
+                     for column in self._cursor.description ]
+
+def register_sqlite_timestamps(sqlite3):
+    """
+    Store dates and datetimes as ISO 8601 text and convert TIMESTAMP
+    columns back to datetimes. sqlite3’s default adapters and
+    converters for these are deprecated as of Python 3.12.
+    """
+    sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+    sqlite3.register_adapter(datetime.datetime,
+                             lambda value: value.isoformat(" "))
+    sqlite3.register_converter(
+        "TIMESTAMP",
+        lambda value: datetime.datetime.fromisoformat(value.decode("ascii")))
+
+class SQLiteConnection(DatabaseConnection):
+    """
+    A CV database in an SQLite file at “path”, created with
+    “sqlite_schema” if need be. Each thread uses a connection of its
+    own. The database is in WAL mode, so they can read while one of
+    them writes.
+    """
+    # sqlite3 keeps this many prepared statements per connection.
+    cached_statements = 256
+
+    def __init__(self, path):
+        import sqlite3
+        register_sqlite_timestamps(sqlite3)
+
+        self.path = path
+        self.backend = sql.Backend(sqlite3, None)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_created = False
+
+    @property
+    def ds(self):
+        import sqlite3
+
+        ds = getattr(self._local, "ds", None)
+        if ds is None:
+            ds = sqlite3.connect(str(self.path),
+                                 detect_types=sqlite3.PARSE_DECLTYPES,
+                                 cached_statements=self.cached_statements)
+            ds.execute("PRAGMA journal_mode = WAL")
+            ds.execute("PRAGMA synchronous = NORMAL")
+            ds.execute("PRAGMA foreign_keys = ON")
+
+            with self._schema_lock:
+                if not self._schema_created:
+                    ds.executescript(sqlite_schema)
+                    self._schema_created = True
+
+            self._local.ds = ds
+        return ds
+
+    def connect(self):
+        self.ds
+
+    def release(self):
+        """
+        Close the current thread’s connection.
+        """
+        ds = getattr(self._local, "ds", None)
+        if ds is not None:
+            self._local.ds = None
+            ds.close()
+
+    @contextlib.contextmanager
+    def checkout(self):
+        yield
+
+    def close(self):
+        self.release()
+
+    def cursor(self):
+        return SQLiteCursor(self.ds.cursor())
+
+    def execute(self, command, parameters=()):
+        if isinstance(command, sql.Part):
+            if parameters:
+                raise ValueError("Can’t provide parameters with  "
+                                 "sqlclasses.sql statement.")
+            command, parameters = self.backend.rollup(command)
+
+        return self.cursor().execute(command, parameters)
+
+    def query(self, command, parameters=(), dbobject_class=dbobject):
+        cc = self.execute(command, parameters)
+        return dbobject_class.__result_class__(cc, dbobject_class)
+
+    def stream(self, command, parameters=(), itersize=2000,
+               dbobject_class=None):
+        """
+        See PostgresConnection.stream(). sqlite3 steps through the
+        result as it is iterated over anyway, “itersize” is ignored.
+        """
+        return StreamingResult(self.execute(command, parameters),
+                               dbobject_class)
+
+    def select_one(self, command, parameters=(), dbobject_class=dbobject):
+        cc = self.execute(command, parameters)
+        tpl = cc.fetchone()
+        if tpl is None:
+            return None
+        else:
+            return dbobject_class(cc.description, tpl)
+
+    def query_one(self, command, parameters=()):
+        ret = self.execute(command, parameters).fetchone()
+        if ret is not None and len(ret) == 1:
+            return ret[0]
+        else:
+            return ret
+
+    def copy_from(self, relation:str, columns:list[str], rows):
+        """
+        Insert “rows” into “relation” with executemany(), which runs one
+        prepared statement for all of them.
+        """
+        self.cursor().executemany(
+            f"INSERT INTO {relation} ({', '.join(columns)}) "
+            f"VALUES ({', '.join([ '%s' ] * len(columns))})", rows)
+
+    def reserve_ids(self, relation:str, count:int) -> list[int]:
+        """
+        Return “count” ids for new rows in “relation”, whose id must be
+        AUTOINCREMENT, in ascending order. They are taken by advancing
+        its entry in sqlite_sequence, which starts the write
+        transaction, so no one else gets them.
+        """
+        self.execute("INSERT INTO sqlite_sequence (name, seq) "
+                     "SELECT %s, 0 WHERE NOT EXISTS ("
+                     "    SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                     ( relation, relation, ))
+        last = self.query_one("UPDATE sqlite_sequence SET seq = seq + %s "
+                              " WHERE name = %s RETURNING seq",
+                              ( count, relation, ))
+        return list(range(last - count + 1, last + 1))
+
+    def commit(self):
+        self.ds.commit()
+
+    def rollback(self):
+        self.ds.rollback()
+
+    def insert_from_dict(self, relation, d, retrieve_id=True,
+                         sequence_name=None):
+        command = sql.insert(relation, list(d.keys()), [ d, ])
+        cc = self.execute(command)
+
+        if not "id" in d and ( retrieve_id or sequence_name is not None ):
+            return cc.lastrowid
+        else:
+            return None
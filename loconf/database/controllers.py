@@ -3,24 +3,81 @@ from sqlclasses import sql
 from .. import config
 from ..model import Vehicle, Revision
 
+# Revisions inserted per INSERT statement by store_many_cvs().
+revision_batch_size = 1000
+
 def store_cvs(vehicle:Vehicle,
               cvs:dict[int, int], revision_comment=""):
-    # Remove None values from cvs
-    cvs = dict([ (name, value)
-                 for (name, value) in cvs.items()
-                 if value is not None ])
-    if not cvs:
+    store_many_cvs([ ( vehicle, cvs, revision_comment, ), ])
+
+def store_many_cvs(revisions):
+    """
+    Store a revision for each ( vehicle, cvs, revision_comment, )
+    triple in “revisions” in one transaction, e.g. when importing
+    archived CV dumps. The revisions are created with ids reserved
+    beforehand, their CVs are sent with COPY and then made the
+    vehicles’ current values with a single statement.
+    """
+    revisions = [ ( vehicle,
+                    # Remove None values from cvs
+                    dict([ (name, value)
+                           for (name, value) in cvs.items()
+                           if value is not None ]),
+                    revision_comment, )
+                  for vehicle, cvs, revision_comment in revisions ]
+    revisions = [ tpl for tpl in revisions if tpl[1] ]
+    if not revisions:
         return
 
-    # Create a revision entry.
-    revision = Revision.insert_from_dict( {"address": vehicle.address,
-                                           "vehicle_id": vehicle.vehicle_id,
-                                           "comment": revision_comment, })
-    # Create value entries for each of the CVs.
-    config.dbconn.execute(sql.insert.from_dict(
-        "value", *[ {"revision_id": revision.id, "cv": cv, "value": value}
-                    for ( cv, value ) in cvs.items() ]))
-    config.dbconn.commit()
+    try:
+        # Create the revision entries. The ids ascend in the order of
+        # “revisions”, so the latest revision of a vehicle has the
+        # highest one.
+        ids = config.dbconn.reserve_ids("revision", len(revisions))
+        for start in range(0, len(revisions), revision_batch_size):
+            batch = list(zip(ids[start:start+revision_batch_size],
+                             revisions[start:start+revision_batch_size]))
+            params = []
+            for id, ( vehicle, cvs, revision_comment, ) in batch:
+                params += [ id, vehicle.address, vehicle.vehicle_id,
+                            revision_comment, ]
+            config.dbconn.execute(
+                "INSERT INTO revision (id, address, vehicle_id, comment) "
+                "VALUES " + ", ".join([ "(%s, %s, %s, %s)" ] * len(batch)),
+                params)
+
+        # Create value entries for each of the CVs.
+        config.dbconn.copy_from(
+            "value", ( "revision_id", "cv", "value", ),
+            ( ( id, cv, value, )
+              for id, ( vehicle, cvs, comment, ) in zip(ids, revisions)
+              for cv, value in cvs.items() ))
+
+        # Make the latest of them the vehicles’ current values. Other
+        # revisions whose ids fall in the range are those of other
+        # sessions and may just as well be looked at.
+        config.dbconn.execute(
+            """INSERT INTO current_value
+                      (address, vehicle_id, cv, value, revision_id)
+               SELECT address, vehicle_id, cv, value, revision_id
+                 FROM (SELECT address, vehicle_id, cv, value, revision_id,
+                              ROW_NUMBER() OVER (
+                                  PARTITION BY address, vehicle_id, cv
+                                  ORDER BY revision_id DESC) AS n
+                         FROM value
+                         JOIN revision ON revision_id = revision.id
+                        WHERE revision_id BETWEEN %s AND %s) AS latest
+                WHERE n = 1
+                   ON CONFLICT (address, vehicle_id, cv)
+                   DO UPDATE SET value = EXCLUDED.value,
+                                 revision_id = EXCLUDED.revision_id
+                   WHERE current_value.revision_id < EXCLUDED.revision_id""",
+            ( ids[0], ids[-1], ))
+    except Exception:
+        config.dbconn.rollback()
+        raise
+    else:
+        config.dbconn.commit()
 
 def get_cv(vehicle:Vehicle, cv:int):
     """
@@ -29,34 +86,47 @@ def get_cv(vehicle:Vehicle, cv:int):
     result = get_all_cvs(vehicle, cv)
     return result.get(cv, None)
 
-def get_all_cvs(vehicle:Vehicle, cv:int|None=None):
+def get_all_cvs(vehicle:Vehicle, cv:int|None=None, cvs=None):
     """
     Return the latest known CV settings on “vehicle” as a dict
-    (optinally limit the query to “cv”.)
+    (optinally limit the query to “cv” or the CV numbers in “cvs”.)
     """
     query = """\
-            WITH latest AS (
-                SELECT cv, address, vehicle_id, MAX(revision_id) AS revision_id
-                  FROM value
-                  LEFT JOIN revision ON revision_id = revision.id
-                  GROUP BY cv, address, vehicle_id
-            )
-            SELECT latest.cv, value
-              FROM latest
-              LEFT JOIN value
-                     ON latest.cv = value.cv
-                    AND latest.revision_id = value.revision_id
-             WHERE address = %s AND vehicle_id = %s
-             ORDER BY cv"""
+            SELECT cv, value
+              FROM current_value
+             WHERE address = %s AND vehicle_id = %s"""
     params = ( vehicle.address, vehicle.vehicle_id, )
 
     if cv is not None:
         query += " AND cv = %s"
         params += ( cv, )
 
+    if cvs is not None:
+        cvs = tuple(cvs)
+        if not cvs:
+            return {}
+        query += " AND cv IN (" + ", ".join([ "%s", ] * len(cvs)) + ")"
+        params += cvs
+
+    query += " ORDER BY cv"
+
     cursor = config.dbconn.execute(query, params)
     return dict(cursor.fetchall())
 
+def iter_history(vehicle:Vehicle, itersize=2000):
+    """
+    Yield the CV values stored for “vehicle” as rows with revision_id,
+    ctime, comment, cv and value columns, ordered by revision and CV,
+    fetching them from the database “itersize” at a time.
+    """
+    return config.dbconn.stream(
+        """SELECT revision.id AS revision_id, ctime, comment, cv, value
+             FROM revision
+             JOIN value ON revision_id = revision.id
+            WHERE address = %s AND vehicle_id = %s
+            ORDER BY revision.id, cv""",
+        ( vehicle.address, vehicle.vehicle_id, ), itersize=itersize)
+
 def get_revision(vehicle:Vehicle, revision_id:int):
     """
     Retrieve the latest know CV settings for “vehicle” at the
@@ -90,7 +160,7 @@ def get_revisions(vehicle:Vehicle):
                    " WHERE address = %s AND vehicle_id = %s"
                    " ORDER BY id ASC", ( vehicle.address,
                                          vehicle.vehicle_id, ))
-    return [ Revision(*tpl) for tpl in cursor.fetchall() ]
+    return [ Revision(cursor.description, tpl) for tpl in cursor.fetchall() ]
 
 def vehicle_by_address(cab:int, vehicle_id:str):
     result = query_vehicles(sql.where("address = %i " % cab,
@@ -1,5 +1,5 @@
 import os.path as op, datetime
-import datetime, types
+import datetime, types, functools, collections
 
 from termcolor import colored
 from sqlclasses import sql
@@ -20,16 +20,14 @@ class Result(list):
                     self.where = clause
                     break
 
-        def generator():
-            for tpl in cursor:
-                yield dbobject_class(cursor.description, tpl)
-        list.__init__(self, generator())
+        description = cursor.description
+        list.__init__(self, ( dbobject_class(description, tpl)
+                              for tpl in cursor ))
 
     def __getitem__(self, key):
         if isinstance(key, slice):
             ret = self.__class__([], self.dbobject_class, [self.where])
-            for a in super().__getitem__(key):
-                ret.append(a)
+            list.extend(ret, super().__getitem__(key))
             return ret
         else:
             return super().__getitem__(key)
@@ -49,6 +47,46 @@ class Result(list):
             raise DbUsageException(
                 "No WHERE clause provided with this result.")
 
+@functools.lru_cache(maxsize=256)
+def row_class(column_names:tuple[str]):
+    """
+    Return the class for rows with “column_names”: a tuple subclass
+    without a __dict__ with a property per column (a namedtuple). All
+    rows with the same columns share it and so the column names.
+    """
+    return collections.namedtuple("Row", column_names, rename=True)
+
+class StreamingResult(object):
+    """
+    The rows of a query, built as they are iterated over from what the
+    cursor fetches (see DatabaseConnection.stream()), rather than all
+    at once like a Result. Rows are compact row_class() tuples or, if
+    “dbobject_class” is given, instances of it. Can be iterated over
+    once.
+    """
+    def __init__(self, cursor, dbobject_class=None):
+        self.cursor = cursor
+        self.dbobject_class = dbobject_class
+
+    def __iter__(self):
+        try:
+            make_row = None
+            for tpl in self.cursor:
+                if make_row is None:
+                    # Named cursors only know their description once
+                    # they have fetched rows.
+                    description = self.cursor.description
+                    if self.dbobject_class is None:
+                        make_row = row_class(tuple( column.name
+                                                    for column
+                                                    in description ))._make
+                    else:
+                        make_row = functools.partial(self.dbobject_class,
+                                                     description)
+                yield make_row(tpl)
+        finally:
+            self.cursor.close()
+
 class SQLRepresentation(type):
     def __new__(cls, name, bases, dct):
         ret = super().__new__(cls, name, bases, dct)
@@ -182,6 +220,15 @@ class dbobject(object, metaclass=SQLRepresentation):
             c.execute(query, params)
             return cls.__result_class__(c, cls, clauses)
 
+    @classmethod
+    def stream(cls, *clauses, itersize=2000):
+        """
+        Like select() but return a StreamingResult, fetching the rows
+        “itersize” at a time.
+        """
+        return config.dbconn.stream(cls.select_query(*clauses),
+                                    itersize=itersize, dbobject_class=cls)
+
     @classmethod
     def select_by_primary_key(cls, value):
         return cls.select_one(cls.primary_key_where(value))
@@ -0,0 +1,196 @@
+"""
+An asyncio driver for DCC-EX command stations, so many of them can
+be run from one event loop next to other asyncio code.
+"""
+
+import asyncio, urllib.parse
+import serial
+
+from .. import debug, comdebug
+from . import responses
+from .reader import Dispatcher
+from .station import StationError, StationTimeout, ReadFailed
+
+class SerialWriter(object):
+    """
+    The part of asyncio.StreamWriter’s interface AsyncDCCEX_Station
+    uses, for a serial port.
+    """
+    def __init__(self, serial_port, loop):
+        self.serial_port = serial_port
+        self.loop = loop
+
+    def write(self, data:bytes):
+        self.serial_port.write(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.loop.remove_reader(self.serial_port.fileno())
+        self.serial_port.close()
+
+    async def wait_closed(self):
+        pass
+
+async def open_connection(port_url:str, boudrate=115200):
+    """
+    Return a ( reader, writer, ) pair for “port_url”, which is either
+    a “socket://host:port” URL or the path of a serial device or pty.
+    """
+    url = urllib.parse.urlsplit(port_url)
+    if url.scheme == "socket":
+        return await asyncio.open_connection(url.hostname, url.port)
+
+    loop = asyncio.get_running_loop()
+    serial_port = serial.serial_for_url(port_url, boudrate, timeout=0)
+    reader = asyncio.StreamReader()
+
+    def data_received():
+        data = serial_port.read(max(1, serial_port.in_waiting))
+        if data:
+            reader.feed_data(data)
+
+    loop.add_reader(serial_port.fileno(), data_received)
+    return reader, SerialWriter(serial_port, loop)
+
+class AsyncDCCEX_Station(object):
+    """
+    Use connect() to create. Like DCCEX_Station, but its methods are
+    coroutines.
+    """
+    def __init__(self, reader, writer, default_line_timeout=1):
+        self.reader = reader
+        self.writer = writer
+        self.line_timeout = default_line_timeout
+        self.dispatcher = Dispatcher()
+        self._reader_task = None
+
+    @classmethod
+    async def connect(cls, port_url, boudrate=115200, default_line_timeout=1,
+                      settle_time=1):
+        """
+        Connect to the station at “port_url” and wait for it to be
+        quiet for “settle_time” seconds after printing its state info.
+        """
+        debug(f"Connecting to station on {port_url}…", end=" ")
+        reader, writer = await open_connection(port_url, boudrate)
+
+        station = cls(reader, writer, default_line_timeout)
+        station._reader_task = asyncio.create_task(station._read_lines())
+
+        while station.dispatcher.quiet_for() < settle_time:
+            await asyncio.sleep(settle_time - station.dispatcher.quiet_for())
+
+        debug(f"Command station ready on {port_url}.", color="green")
+        return station
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    async def _read_lines(self):
+        while True:
+            line = await self.reader.readline()
+            if not line: # EOF
+                break
+            self.dispatcher.handle_line(
+                line.decode("ascii", errors="replace").rstrip())
+
+    async def print(self, command:str):
+        self.writer.write(command.encode("ascii") + b"\n")
+        await self.writer.drain()
+
+    async def broadcasts(self):
+        """
+        Iterate over the Responses nobody is waiting for, like
+        broadcasts from the station.
+        """
+        queue = asyncio.Queue()
+        self.dispatcher.subscribe(queue.put_nowait)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.dispatcher.unsubscribe(queue.put_nowait)
+
+    async def communicate(self, command:str,
+                          wanted_responses:tuple[type(responses.Response)],
+                          line_timeout=None, is_reply=None):
+        """
+        See DCCEX_Station.communicate().
+        """
+        if isinstance(wanted_responses, type):
+            wanted_responses = ( wanted_responses, )
+        else:
+            wanted_responses = tuple(wanted_responses)
+
+        if line_timeout is None:
+            line_timeout = self.line_timeout
+
+        future = asyncio.get_running_loop().create_future()
+        def resolve(response):
+            if not future.done():
+                future.set_result(response)
+
+        def accepted(response):
+            if isinstance(response, responses.Error):
+                return True
+            elif isinstance(response, wanted_responses):
+                return is_reply is None or is_reply(response)
+            else:
+                return False
+
+        route = self.dispatcher.route(accepted, resolve, once=True)
+
+        if command:
+            comdebug(command)
+            await self.print(command)
+
+        try:
+            response = await asyncio.wait_for(future, line_timeout)
+        except asyncio.TimeoutError:
+            self.dispatcher.unroute(route)
+            raise StationTimeout(command)
+
+        if isinstance(response, responses.Error) \
+           and not responses.Error in wanted_responses:
+            raise StationError(command)
+        else:
+            return response
+
+    async def readcab(self) -> int:
+        response = await self.communicate("<R>", responses.ReadAddress)
+        if response.address == -1:
+            raise ReadFailed("Failed to read cab address from decoder.")
+        return response.address
+
+    async def writecab(self, cab:int) -> int:
+        assert cab > 1, "Cab address must be > 1."
+
+        response = await self.communicate(
+            "<W %i>" % cab, responses.WriteAddress,
+            is_reply=lambda response: response.address in ( cab, -1, ))
+        if response.address == -1 or response.address != cab:
+            raise ReadFailed(f"Failed to write cab address from decoder "
+                             f"({response.address}).")
+        return response.address
+
+    async def readcv(self, cv:int) -> int:
+        response = await self.communicate(
+            "<R %i>" % cv, responses.ReadCV,
+            is_reply=lambda response: response.cv == cv)
+        if response.value == -1:
+            raise ReadFailed("Failed to read CV #%i value from decoder." % cv)
+        return response.value
+
+    async def writecv(self, cv:int, value:int) -> responses.Response:
+        response = await self.communicate(
+            "<W %i %i>" % ( cv, value, ), responses.WriteCV,
+            is_reply=lambda response: response.cv == cv)
+        if response.value == -1:
+            raise ReadFailed("Failed to write CV #%i value %i to decoder." % (
+                cv, value,))
+        return response
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+
+"""
+loconf-stationd: Keep the connection to a DCC-EX command station open
+and let the tools use it through a Unix socket, so they don’t pay for
+the port being reset and the station’s start up on every invocation.
+
+    python -m loconf.dccex.daemon /dev/ttyUSB0
+
+To have the tools use the daemon, configure the station in
+~/.loconfrc.toml as
+
+    [station]
+    type = "stationd"
+    port_url = "/dev/ttyUSB0" # Used by the daemon if given no port.
+
+Requests and replies are JSON objects, one per line:
+
+    → {"id": 1, "method": "readcv", "params": [29]}
+    ← {"id": 1, "result": 6}
+    ← {"id": 1, "error": {"type": "ReadFailed", "message": "…"}}
+
+Requests that aren’t JSON objects naming a known method are answered
+with a “ProtocolError” (and an id of null if they have none). Other
+errors are reported with the name of their exception class.
+
+readcvs_many and verifycvs_many send an {"id": …, "item": [cv, value]}
+message per CV before their result. After a “subscribe” request,
+unsolicited responses from the station are sent on that connection as
+{"broadcast": {"type": …, …}}.
+"""
+
+import os, json, pathlib, threading, collections, argparse
+import socket, socketserver
+
+from .. import config, debug
+from ..station import Station, StationException
+from . import responses
+from .station import DCCEX_Station, StationError, StationTimeout, ReadFailed
+
+def default_socket_path() -> pathlib.Path:
+    rundir = os.environ.get("XDG_RUNTIME_DIR", None)
+    if rundir:
+        return pathlib.Path(rundir, "loconf-stationd.sock")
+    else:
+        return pathlib.Path("/tmp", f"loconf-stationd-{os.getuid()}.sock")
+
+class ProtocolError(StationException):
+    """
+    loconf-stationd can’t make sense of a request.
+    """
+
+exceptions = dict([ (cls.__name__, cls)
+                    for cls in ( StationException, StationError,
+                                 StationTimeout, ReadFailed,
+                                 ProtocolError, ) ])
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle the requests on one connection, one at a time.
+    """
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.subscribed = False
+
+        self.methods = { "readcv": self.station.readcv,
+                         "writecv": self.writecv,
+                         "readcab": self.station.readcab,
+                         "writecab": self.station.writecab,
+                         "readcvs_many": self.readcvs_many,
+                         "verifycvs_many": self.verifycvs_many,
+                         "command": self.command,
+                         "subscribe": self.subscribe, }
+
+    @property
+    def station(self):
+        return self.server.station
+
+    def send(self, message:dict):
+        data = json.dumps(message).encode("utf-8") + b"\n"
+        with self.write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                self.id = None
+                try:
+                    method, params = self.parse_request(line)
+                    result = method(*params)
+                except StationException as error:
+                    self.send({ "id": self.id,
+                                "error": { "type": error.__class__.__name__,
+                                           "message": str(error.command), }, })
+                except (KeyError, TypeError, ValueError) as error:
+                    self.send({ "id": self.id,
+                                "error": { "type": error.__class__.__name__,
+                                           "message": repr(error), }, })
+                else:
+                    self.send({ "id": self.id, "result": result, })
+        except OSError: # The client has gone away.
+            pass
+        finally:
+            if self.subscribed:
+                self.station.reader.unsubscribe(self.broadcast)
+
+    def parse_request(self, line:bytes):
+        """
+        Return the method “line” requests and its parameters, setting
+        self.id to the request’s id. Raise ProtocolError if it isn’t a
+        valid request.
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            raise ProtocolError(f"Malformed request: {error}")
+
+        if not isinstance(request, dict):
+            raise ProtocolError("Requests must be JSON objects.")
+        self.id = request.get("id", None)
+
+        name = request.get("method", None)
+        if not isinstance(name, str) or name not in self.methods:
+            raise ProtocolError(f"Unknown method: {name!r}")
+
+        params = request.get("params", [])
+        if not isinstance(params, list):
+            raise ProtocolError("“params” must be an array.")
+
+        return self.methods[name], params
+
+    def writecv(self, cv:int, value:int):
+        return self.station.writecv(cv, value).value
+
+    def readcvs_many(self, cvs:list):
+        for cv, value in self.station.readcvs_many(cvs):
+            self.send({ "id": self.id, "item": [ cv, value, ], })
+
+    def verifycvs_many(self, cvs:list):
+        # JSON objects have str keys, so they come as ( cv, value, ) pairs.
+        for cv, value in self.station.verifycvs_many(dict(cvs)):
+            self.send({ "id": self.id, "item": [ cv, value, ], })
+
+    def command(self, command:str, wanted_responses:list=[]):
+        """
+        Send “command” to the station. If “wanted_responses” names
+        response classes, wait for the first of them and return it.
+        """
+        if not wanted_responses:
+            self.station.print(command)
+            return None
+
+        wanted = [ responses.classes_by_name[name]
+                   for name in wanted_responses ]
+        return self.station.communicate(command, wanted).as_dict()
+
+    def broadcast(self, response:responses.Response):
+        try:
+            self.send({ "broadcast": response.as_dict(), })
+        except OSError:
+            pass
+
+    def subscribe(self):
+        if not self.subscribed:
+            self.station.reader.subscribe(self.broadcast)
+            self.subscribed = True
+
+class StationServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path:pathlib.Path, station:DCCEX_Station):
+        self.station = station
+        self.socket_path = pathlib.Path(socket_path)
+
+        # A socket file left behind by a daemon that has died.
+        if self.socket_path.is_socket():
+            self.socket_path.unlink()
+
+        super().__init__(str(self.socket_path), RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+class DaemonStation(Station):
+    """
+    A station run by loconf-stationd. Several threads may use it at
+    once: whichever of them reads from the socket files the messages
+    for the others’ requests by id.
+    """
+    def __init__(self, socket_path=None):
+        if socket_path is None:
+            socket_path = default_socket_path()
+
+        self.socket_path = socket_path
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(str(socket_path))
+        self.file = self.socket.makefile("rwb")
+
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._next_id = 1
+
+        # Maps the ids of requests in progress to the messages received
+        # for them and not processed yet.
+        self._pending = {}
+
+    @property
+    def ready(self):
+        return True
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def _send(self, method, params) -> int:
+        """
+        Send a request and return its id. The caller must remove it
+        from self._pending when done with it.
+        """
+        with self._write_lock:
+            id = self._next_id
+            self._next_id += 1
+            self._pending[id] = collections.deque()
+
+            request = { "id": id, "method": method, "params": params, }
+            self.file.write(json.dumps(request).encode("utf-8") + b"\n")
+            self.file.flush()
+
+        return id
+
+    def _receive(self, id:int) -> dict:
+        """
+        Return the next message for request “id”. Messages for requests
+        no one is waiting for anymore, like the rest of a readcvs_many()
+        that was abandoned, are dropped.
+        """
+        with self._read_lock:
+            pending = self._pending[id]
+            while not pending:
+                line = self.file.readline()
+                if not line:
+                    raise StationException(
+                        "Connection to loconf-stationd lost.")
+
+                message = json.loads(line)
+                if message.get("id", None) in self._pending:
+                    self._pending[message["id"]].append(message)
+
+            message = pending.popleft()
+
+        if "error" in message:
+            error = message["error"]
+            raise exceptions.get(error["type"], StationException)(
+                error["message"])
+        else:
+            return message
+
+    def call(self, method:str, *params):
+        id = self._send(method, params)
+        try:
+            while True:
+                message = self._receive(id)
+                if "result" in message:
+                    return message["result"]
+        finally:
+            del self._pending[id]
+
+    def _items(self, method:str, *params):
+        id = self._send(method, params)
+        try:
+            while True:
+                message = self._receive(id)
+                if "item" in message:
+                    yield tuple(message["item"])
+                elif "result" in message:
+                    return
+        finally:
+            del self._pending[id]
+
+    def readcv(self, cv:int) -> int:
+        return self.call("readcv", cv)
+
+    def writecv(self, cv:int, value:int) -> int:
+        return self.call("writecv", cv, value)
+
+    def readcab(self) -> int:
+        return self.call("readcab")
+
+    def writecab(self, cab:int) -> int:
+        return self.call("writecab", cab)
+
+    def readcvs_many(self, cvs):
+        return self._items("readcvs_many", list(cvs))
+
+    def verifycvs_many(self, cvs:dict):
+        return self._items("verifycvs_many", list(cvs.items()))
+
+    def communicate(self, command:str, wanted_responses):
+        if isinstance(wanted_responses, type):
+            wanted_responses = ( wanted_responses, )
+
+        result = self.call("command", command,
+                           [ cls.__name__ for cls in wanted_responses ])
+        if result is None:
+            return None
+        else:
+            return responses.Response.from_dict(result)
+
+    def print(self, command:str):
+        self.call("command", command)
+
+    def subscribe(self, callback):
+        """
+        Call “callback” with every unsolicited Response from the station
+        in a background thread. Uses a connection of its own.
+        """
+        connection = DaemonStation(self.socket_path)
+        connection.call("subscribe")
+
+        def run():
+            for line in connection.file:
+                message = json.loads(line)
+                if "broadcast" in message:
+                    callback(responses.Response.from_dict(
+                        message["broadcast"]))
+
+        threading.Thread(target=run, daemon=True).start()
+
+def main():
+    from ..tools import common_args
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("port_url", nargs="?", default=None,
+                        help="Serial port or pyserial URL of the command "
+                        "station. Defaults to “port_url” from the station "
+                        "configuration.")
+    parser.add_argument("-s", "--socket", type=pathlib.Path,
+                        default=None, help="Path of the Unix socket to "
+                        "listen on. Defaults to “socket_path” from the "
+                        "station configuration or "
+                        f"{default_socket_path()}.")
+    parser.add_argument("-b", "--boudrate", type=int, default=115200)
+    common_args.add_debug(parser, sql=False)
+    args = parser.parse_args()
+    common_args.set_debug_config(args)
+
+    entry = config.confdata.get("station", {})
+    port_url = args.port_url or entry.get("port_url", None)
+    if port_url is None:
+        parser.error("No port given and none configured.")
+
+    socket_path = args.socket or entry.get("socket_path", None) \
+        or default_socket_path()
+
+    station = DCCEX_Station(port_url, args.boudrate)
+    with StationServer(socket_path, station) as server:
+        debug(f"Listening on {socket_path}.", color="green")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            station.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Parse the command station’s output line by line into
+responses.Response objects and route them to whoever is waiting for
+them. Used by a reader thread in DCCEX_Station and by a reader task
+in AsyncDCCEX_Station.
+"""
+
+import sys, os, io, select, threading, time, traceback, dataclasses
+import concurrent.futures
+
+from .. import comdebug
+from . import responses
+
+@dataclasses.dataclass(eq=False)
+class Route(object):
+    predicate: callable
+    callback: callable
+    once: bool
+
+class Dispatcher(object):
+    """
+    Each Response is offered to the routes in the order they were
+    added. The first one whose predicate returns True gets it, one-shot
+    routes are removed after that. Responses no route takes are
+    unsolicited (broadcasts, comments, …) and passed to all
+    subscribers. Exceptions raised by the callbacks are printed to
+    stderr, so they don’t stop whoever is reading the station’s output.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = []
+        self._subscribers = []
+
+        self.last_line_time = time.monotonic()
+
+    def route(self, predicate, callback, once=False) -> Route:
+        route = Route(predicate, callback, once)
+        with self._lock:
+            self._routes.append(route)
+        return route
+
+    def unroute(self, route:Route):
+        with self._lock:
+            if route in self._routes:
+                self._routes.remove(route)
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def quiet_for(self) -> float:
+        """
+        Seconds since the last line was received.
+        """
+        return time.monotonic() - self.last_line_time
+
+    def handle_line(self, line:str):
+        self.last_line_time = time.monotonic()
+
+        try:
+            response = responses.Response.from_line(line)
+        except ValueError:
+            comdebug(line, color="red")
+        else:
+            self.dispatch(line, response)
+
+    def dispatch(self, line:str, response:responses.Response):
+        with self._lock:
+            for route in self._routes:
+                if route.predicate(response):
+                    if route.once:
+                        self._routes.remove(route)
+                    break
+            else:
+                route = None
+            subscribers = list(self._subscribers)
+
+        if route is None:
+            comdebug(line)
+            for callback in subscribers:
+                self._call(callback, response)
+        else:
+            if isinstance(response, responses.Error):
+                comdebug(line, color="cyan")
+            else:
+                comdebug(line, color="green")
+            self._call(route.callback, response)
+
+    def _call(self, callback, response:responses.Response):
+        try:
+            callback(response)
+        except Exception:
+            print(f"Exception handling {response!r}:", file=sys.stderr)
+            traceback.print_exc()
+
+class ResponseReader(Dispatcher, threading.Thread):
+    """
+    Read from “serial_port” (a pyserial port whose read() returns what
+    has arrived after a short timeout) and dispatch the lines until
+    stop() is called. Lines are split off the bytes received here,
+    rather than by a TextIOWrapper, so a reply is dispatched as soon as
+    its newline arrives.
+    """
+    def __init__(self, serial_port):
+        Dispatcher.__init__(self)
+        threading.Thread.__init__(self, name="DCC-EX reader", daemon=True)
+        self.serial_port = serial_port
+        self._stop_requested = threading.Event()
+
+    def expect(self, predicate) -> concurrent.futures.Future:
+        """
+        Return a Future that will be set to the next Response for
+        which “predicate” is true.
+        """
+        future = concurrent.futures.Future()
+
+        def resolve(response):
+            # The Future may have been cancelled after the route was
+            # taken, but before we got here.
+            if future.set_running_or_notify_cancel():
+                future.set_result(response)
+
+        future.route = self.route(predicate, resolve, once=True)
+        return future
+
+    def cancel(self, future:concurrent.futures.Future):
+        self.unroute(future.route)
+        future.cancel()
+
+    def wait_for_quiet(self, period:float):
+        """
+        Return once no line has been received for “period” seconds.
+        """
+        while True:
+            remaining = period - self.quiet_for()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def stop(self):
+        self._stop_requested.set()
+
+    def read(self) -> bytes|None:
+        """
+        Return the bytes that have arrived, waiting up to the port’s
+        timeout for the first one, b"" on timeout or None if the port
+        has been closed on the other end.
+        """
+        # pyserial’s read() waits for as many bytes as asked for, and
+        # “in_waiting” is only ever 0 or 1 for a “socket://” port. So
+        # read from the port’s file descriptor where there is one.
+        try:
+            fd = self.serial_port.fileno()
+        except io.UnsupportedOperation:
+            return self.serial_port.read(max(1, self.serial_port.in_waiting))
+
+        readable, _, _ = select.select([ fd, ], [], [],
+                                       self.serial_port.timeout)
+        if not readable:
+            return b""
+        return os.read(fd, 4096) or None
+
+    def run(self):
+        buffer = bytearray()
+        while not self._stop_requested.is_set():
+            data = self.read()
+            if data is None:
+                break
+            elif data:
+                buffer += data
+            elif buffer.endswith(b">"):
+                # Timeout. A station that doesn’t end its lines with a
+                # newline has said all it’s going to say for now.
+                buffer += b"\n"
+            else:
+                continue
+
+            # Decode and split all complete lines at once.
+            end = buffer.rfind(b"\n")
+            if end == -1:
+                continue
+            lines = buffer[:end].decode("ascii", errors="replace")
+            del buffer[:end+1]
+
+            for line in lines.split("\n"):
+                line = line.strip()
+                if line:
+                    self.handle_line(line)
@@ -1,39 +1,101 @@
 import re, typing, types
 
-class Response(object):
-    def __init__(self, groupdict):
-        annotations = typing.get_type_hints(self.__class__)
-        for name, value in groupdict.items():
-            target_type = annotations[name]
-
-            if isinstance(target_type, types.UnionType):
-                for t in typing.get_args(target_type):
-                    if t is type(None):
-                        value = None
-                        break
-
-                    try:
-                        value = t(value)
-                    except (ValueError, TypeError):
-                        pass
-                    else:
-                        break
+def converter(target_type):
+    """
+    Return a function converting a matched group (a str or None) to
+    “target_type”. For unions, the first of the types that accepts the
+    value wins, None if the group didn’t match and None is allowed.
+    """
+    if isinstance(target_type, types.UnionType):
+        args = typing.get_args(target_type)
+        nullable = type(None) in args
+        candidates = [ t for t in args if t is not type(None) ]
+
+        def convert(value):
+            if value is None and nullable:
+                return None
+
+            for t in candidates:
+                try:
+                    return t(value)
+                except (ValueError, TypeError):
+                    pass
+
+            if nullable:
+                return None
             else:
-                value = target_type(value)
+                raise ValueError(f"Can’t convert {repr(value)} to "
+                                 f"{target_type}.")
 
-            setattr(self, name, value)
+        return convert
+    else:
+        return target_type
+
+class ResponseMeta(type):
+    """
+    Give Response classes __slots__ for their annotated fields and
+    work out the converters for them once, when the class is created.
+    """
+    def __new__(cls, name, bases, namespace):
+        annotations = namespace.get("__annotations__", {})
+        namespace["__slots__"] = tuple(annotations.keys())
+        Response = super().__new__(cls, name, bases, namespace)
+
+        Response._converters = tuple( (name, converter(t))
+                                      for name, t in typing.get_type_hints(
+                                              Response).items() )
+        return Response
+
+    @property
+    def opcode(Response) -> str|None:
+        """
+        The character after the “<” all lines of this response start
+        with, taken from its regex.
+        """
+        regex = getattr(Response, "regex", None)
+        if regex is None:
+            return None
+
+        pattern = regex.pattern
+        assert pattern[0] == "<", "Response regexes must start with “<”."
+        if pattern[1] == "\\":
+            return pattern[2]
+        else:
+            return pattern[1]
+
+class Response(object, metaclass=ResponseMeta):
+    def __init__(self, groupdict):
+        for name, convert in self._converters:
+            setattr(self, name, convert(groupdict[name]))
 
     def __repr__(self):
         info = [ "%s=%s" % ( name, repr(getattr(self, name),) )
-                 for name in typing.get_type_hints(self.__class__).keys() ]
+                 for name, convert in self._converters ]
         return f"<{self.__class__.__name__} {' '.join(info)}>"
 
+    def as_dict(self) -> dict:
+        """
+        The class name as “type” and the fields.
+        """
+        ret = { "type": self.__class__.__name__, }
+        for name, convert in self._converters:
+            ret[name] = getattr(self, name)
+        return ret
+
+    @staticmethod
+    def from_dict(data:dict):
+        data = dict(data)
+        Response = classes_by_name[data.pop("type")]
+        return Response(data)
+
     @classmethod
     def from_line(cls, line:str):
-        for Response in response_classes:
-            match = Response.regex.match(line.rstrip())
-            if match is not None:
-                return Response(match.groupdict())
+        line = line.rstrip()
+        if line.startswith("<"):
+            for Response in parsers.get(line[1:2], ()):
+                match = Response.regex.match(line)
+                if match is not None:
+                    return Response(match.groupdict())
 
         raise ValueError("Don’t know how to handle station "
                          "response " + repr(line))
@@ -67,11 +129,16 @@ class TrackManagement(Response):
 
 class TrackPower(Response):
     """
-    <p0|1 track_letter>
+    <p0|1|2 track_letter> or <p0|1 MAIN|PROG|JOIN>
+
+    • state: 2 is on with the programming track joined to the main.
     """
-    regex = re.compile(r"<p(?P<state>0|1)( (?P<trackletter>[A-H]))?>")
+    regex = re.compile(r"<p(?P<state>0|1|2)"
+                       r"( (?P<trackletter>[A-H])"
+                       r"| (?P<track>MAIN|PROG|JOIN))?>")
     state: int
-    trackletter: str
+    trackletter: str|None
+    track: str|None
 
     @property
     def on(self):
@@ -115,8 +182,8 @@ class WriteAddress(Response):
 
 class ReadCVplus(Response):
     """
-    <R cv callbacknum callbacksum>: Request value of “CV” echoing arbitrary
-    “callbacknum” and “callbacksum” integers back to the caller.
+    <R cv callbacknum callbacksub>: Request value of “CV” echoing arbitrary
+    “callbacknum” and “callbacksub” integers back to the caller.
     """
     regex = re.compile(r"<r "
                        r"(?P<callbacknum>\d+)\|"
@@ -126,7 +193,26 @@ class ReadCVplus(Response):
     cv: int
     value: int
     callbacknum: int
-    callbacksum: int
+    callbacksub: int
+
+class Ok(Response):
+    """
+    <O>: The station is happy with a definition, like a turnout’s.
+    """
+    regex = re.compile(r"<O>")
+
+class TurnoutState(Response):
+    """
+    <H id state>: Turnout “id” is thrown (1) or closed (0), the reply
+    to <T id state> and broadcast whenever a turnout changes.
+    """
+    regex = re.compile(r"<H (?P<id>\d+) (?P<state>0|1)>")
+    id: int
+    state: int
+
+    @property
+    def thrown(self):
+        return bool(self.state)
 
 
 response_classes = [ cls
@@ -134,3 +220,12 @@ response_classes = [ cls
                      if isinstance(cls, type) \
                          and issubclass(cls, Response) \
                          and cls is not Response ]
+
+classes_by_name = dict([ (cls.__name__, cls) for cls in response_classes ])
+
+# Maps the character after the “<” to the Response classes that may
+# parse the line, in the order of response_classes.
+parsers = {}
+for cls in response_classes:
+    parsers.setdefault(cls.opcode, []).append(cls)
+
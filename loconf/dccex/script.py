@@ -0,0 +1,234 @@
+"""
+Run .cmds scripts like doc/testall.cmds: DCC-EX commands without the
+angle brackets, one per line, “# comments” and “sleep seconds” meta
+commands.
+
+Commands whose replies we know are sent back to back, up to “window”
+of them in a single write, and their replies are matched to them in
+order as they come in. As the station answers in order, a reply to a
+command means the ones before it won’t be answered. A sleep waits for
+the replies to everything sent before it and then until “seconds”
+after it was sent, so the time the station takes to reply doesn’t add
+to it. Commands we don’t know are sent on their own, once everything
+before them has been answered, and the first reply that isn’t a
+comment is taken as theirs.
+"""
+
+import re, time, threading, collections, dataclasses
+
+from .. import comdebug
+from . import responses
+
+sleep_re = re.compile(r"sleep\s+(?P<seconds>[0-9]+|[0-9]*\.[0-9]+)$")
+
+@dataclasses.dataclass
+class Command(object):
+    text: str
+
+    @property
+    def opcode(self) -> str:
+        return self.text[:1]
+
+    def expects(self):
+        """
+        Return a predicate for the Response the station replies to this
+        command with, None if it doesn’t reply or raise KeyError if we
+        don’t know.
+        """
+        args = self.text[1:].split()
+
+        if self.opcode in ( "0", "1", ):
+            return lambda response: isinstance(response, responses.TrackPower)
+        elif self.opcode == "!":
+            return None
+        elif self.opcode == "T" and len(args) == 2 \
+             and args[0].isdigit() and args[1] in ( "0", "1", ):
+            id = int(args[0])
+            return lambda response: ( isinstance(response,
+                                                 responses.TurnoutState)
+                                      and response.id == id )
+        elif self.opcode == "T" and len(args) >= 3:
+            return lambda response: isinstance(response, responses.Ok)
+        else:
+            raise KeyError(self.opcode)
+
+@dataclasses.dataclass
+class Sleep(object):
+    seconds: float
+
+@dataclasses.dataclass
+class Remark(object):
+    """
+    A comment or an empty line, shown as the script is run.
+    """
+    text: str
+
+def parse_line(line:str) -> list:
+    """
+    Return the Command, Sleep and Remark objects on “line”.
+    """
+    if line.strip() == "":
+        return [ Remark(""), ]
+
+    ret = []
+    parts = line.split("#", 1)
+    line = parts[0].strip()
+
+    if line != "":
+        match = sleep_re.match(line)
+        if match is None:
+            ret.append(Command(line))
+        else:
+            ret.append(Sleep(float(match.group("seconds"))))
+
+    if len(parts) > 1:
+        ret.append(Remark("# " + parts[1].strip()))
+
+    return ret
+
+def parse(lines) -> list:
+    return [ item for line in lines for item in parse_line(line) ]
+
+class ScriptRunner(object):
+    """
+    Run scripts on a DCCEX_Station. If the station doesn’t reply for
+    “timeout” seconds, the replies still outstanding are given up on.
+    """
+    def __init__(self, station, window=16, timeout=2):
+        self.station = station
+        self.window = window
+        self.timeout = timeout
+
+        # ( command, predicate, ) pairs in the order the commands were
+        # sent.
+        self._outstanding = collections.deque()
+        self._condition = threading.Condition()
+        self._route = station.reader.route(self._is_reply, self._reply)
+
+        self.errors = [] # Commands the station replied “<X>” to.
+        self._last_sent = time.monotonic()
+
+    def close(self):
+        self.station.reader.unroute(self._route)
+
+    def _match(self, response) -> int|None:
+        """
+        Return the index of the outstanding command “response” is the
+        reply to: the first one it fits. “<X>” goes to the first one.
+        """
+        if isinstance(response, responses.Error) and self._outstanding:
+            return 0
+
+        for index, ( command, predicate, ) in enumerate(self._outstanding):
+            if predicate(response):
+                return index
+
+        return None
+
+    def _is_reply(self, response):
+        with self._condition:
+            return self._match(response) is not None
+
+    def _reply(self, response):
+        with self._condition:
+            index = self._match(response)
+            if index is None: # wait() has given up on it meanwhile.
+                return
+
+            for i in range(index):
+                command, predicate = self._outstanding.popleft()
+                comdebug(f"No reply to “{command}”.", color="red")
+
+            command, predicate = self._outstanding.popleft()
+            if isinstance(response, responses.Error):
+                self.errors.append(command)
+            self._condition.notify_all()
+
+    def wait(self):
+        """
+        Wait for the replies to everything sent. If none arrives for
+        “timeout” seconds, the first command outstanding is given up
+        on, all of them if the station has gone quiet.
+        """
+        with self._condition:
+            while self._outstanding:
+                count = len(self._outstanding)
+                self._condition.wait_for(
+                    lambda: len(self._outstanding) < count, self.timeout)
+
+                if len(self._outstanding) == count:
+                    if self.station.reader.quiet_for() >= self.timeout:
+                        given_up = list(self._outstanding)
+                        self._outstanding.clear()
+                    else:
+                        given_up = [ self._outstanding.popleft(), ]
+
+                    for command, predicate in given_up:
+                        comdebug(f"No reply to “{command}”.", color="red")
+
+    def send(self, commands:list[Command]):
+        """
+        Send “commands” in a single write.
+        """
+        if not commands:
+            return
+
+        with self._condition:
+            for command in commands:
+                comdebug(f"<{command.text}>", color="black")
+                predicate = command.expects()
+                if predicate is not None:
+                    self._outstanding.append(( command.text, predicate, ))
+
+        self.station.write(b"".join(f"<{command.text}>\n".encode("ascii")
+                                    for command in commands))
+        self._last_sent = time.monotonic()
+
+    def run(self, items:list):
+        """
+        Run the Command, Sleep and Remark objects in “items”, e.g. from
+        parse().
+        """
+        batch = []
+        def flush():
+            self.send(batch)
+            batch.clear()
+
+        for item in items:
+            if isinstance(item, Remark):
+                if item.text:
+                    comdebug(item.text, color="blue")
+                else:
+                    comdebug()
+            elif isinstance(item, Sleep):
+                flush()
+                self.wait()
+
+                self._last_sent += item.seconds
+                delay = self._last_sent - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                try:
+                    item.expects()
+                except KeyError:
+                    flush()
+                    self.wait()
+
+                    with self._condition:
+                        self._outstanding.append(
+                            ( item.text, lambda response: not isinstance(
+                                response, responses.Comment), ))
+                    comdebug(f"<{item.text}>", color="black")
+                    self.station.print(f"<{item.text}>")
+                    self._last_sent = time.monotonic()
+
+                    self.wait()
+                else:
+                    batch.append(item)
+                    if len(batch) >= self.window:
+                        flush()
+                        self.wait()
+
+        flush()
+        self.wait()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+"""
+A simulated DCC-EX command station with a decoder on its programming
+track, for tests and benchmarks without hardware. It speaks the part
+of the protocol in responses.py and is reachable through a pyserial
+“socket://” URL or a pty. To run the tools against it, start it with
+
+    python -m loconf.dccex.simulator --tcp 2560 --latency .2
+
+and configure the station in ~/.loconfrc.toml as
+
+    [station]
+    type = "dccex"
+    port_url = "socket://127.0.0.1:2560"
+"""
+
+import sys, os, re, time, random, socket, threading, dataclasses
+import argparse, pathlib, tty
+
+# What an NMRA decoder out of the box might say.
+default_cvs = { 1: 3, 7: 1, 8: 13, 29: 6, }
+
+@dataclasses.dataclass
+class Decoder(object):
+    cvs: dict = dataclasses.field(default_factory=lambda: dict(default_cvs))
+
+    def read(self, cv:int) -> int:
+        return self.cvs.get(cv, 0)
+
+    def write(self, cv:int, value:int):
+        self.cvs[cv] = value
+
+    @property
+    def address(self) -> int:
+        if self.read(29) & 32:
+            return ((self.read(17) - 192) << 8) + self.read(18)
+        else:
+            return self.read(1)
+
+    @address.setter
+    def address(self, address:int):
+        if address > 127:
+            self.write(17, 192 + (address >> 8))
+            self.write(18, address & 0xff)
+            self.write(29, self.read(29) | 32)
+        else:
+            self.write(1, address)
+            self.write(29, self.read(29) & ~32)
+
+command_re = re.compile(rb"<([^<>]*)>")
+
+class Simulator(object):
+    """
+    Programming track commands take “latency” seconds plus up to
+    “jitter” seconds and fail (the decoder doesn’t acknowledge) with
+    probability “failure_rate”. Commands are processed one at a time,
+    like a real station would, even with several connections.
+    """
+    version = "<iDCC-EX V-5.0.0 / loconf simulator>"
+
+    def __init__(self, decoder:Decoder=None, latency=0.0, jitter=0.0,
+                 failure_rate=0.0, seed=None):
+        if decoder is None:
+            decoder = Decoder()
+        self.decoder = decoder
+
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+        self.power = False
+        self.turnouts = {} # Maps ids to states.
+        self.commands_handled = 0
+        self._lock = threading.Lock()
+
+        self.handlers = { "R": self.read,
+                          "W": self.write,
+                          "V": self.verify,
+                          "T": self.turnout,
+                          "0": self.power_off,
+                          "1": self.power_on,
+                          "=": self.track_management,
+                          "s": self.status,
+                          "!": self.emergency_stop, }
+
+    def banner(self) -> list[str]:
+        return [ "<* loconf DCC-EX simulator *>", self.version, ]
+
+    def handle(self, command:str) -> list[str]:
+        """
+        Process “command” (without the angle brackets) and return the
+        lines the station replies with.
+        """
+        with self._lock:
+            self.commands_handled += 1
+
+            parts = command.split()
+            if not parts or parts[0] not in self.handlers:
+                return [ "<X>", ]
+
+            args = [ int(arg) if arg.lstrip("-").isdigit() else arg
+                     for arg in parts[1:] ]
+
+            try:
+                return self.handlers[parts[0]](*args)
+            except TypeError: # Wrong number or kind of arguments.
+                return [ "<X>", ]
+
+    def program(self) -> bool:
+        """
+        Wait for the decoder and return whether it acknowledged.
+        """
+        time.sleep(self.latency + self.random.uniform(0, self.jitter))
+        return self.random.random() >= self.failure_rate
+
+    def read(self, cv=None, callbacknum=None, callbacksub=None):
+        if cv is None:
+            address = self.decoder.address if self.program() else -1
+            return [ f"<r {address}>", ]
+
+        if not 1 <= cv <= 1024:
+            return [ "<X>", ]
+
+        value = self.decoder.read(cv) if self.program() else -1
+        if callbacknum is None:
+            return [ f"<v {cv} {value}>", ]
+        elif callbacksub is None:
+            return [ "<X>", ]
+        else:
+            return [ f"<r {callbacknum}|{callbacksub}|{cv} {value}>", ]
+
+    def write(self, cv, value=None):
+        if value is None:
+            address = cv
+            if not 1 <= address <= 10239:
+                return [ "<X>", ]
+            elif self.program():
+                self.decoder.address = address
+            else:
+                address = -1
+            return [ f"<w {address}>", ]
+
+        if not 1 <= cv <= 1024 or not 0 <= value <= 255:
+            return [ "<X>", ]
+        elif self.program():
+            self.decoder.write(cv, value)
+        else:
+            value = -1
+        return [ f"<r {cv} {value}>", ]
+
+    def verify(self, cv, value):
+        if not 1 <= cv <= 1024:
+            return [ "<X>", ]
+        elif self.program():
+            return [ f"<v {cv} {self.decoder.read(cv)}>", ]
+        else:
+            return [ f"<v {cv} -1>", ]
+
+    def turnout(self, id, *args):
+        if len(args) == 1 and args[0] in ( 0, 1, ):
+            if id not in self.turnouts:
+                return [ "<X>", ]
+            self.turnouts[id] = args[0]
+            return [ f"<H {id} {args[0]}>", ]
+        elif len(args) >= 2 and args[0] == "DCC":
+            self.turnouts.setdefault(id, 0)
+            return [ "<O>", ]
+        else:
+            return [ "<X>", ]
+
+    def power_on(self, track=None):
+        self.power = True
+        if track is None:
+            return [ "<p1>", ]
+        else:
+            return [ f"<p1 {track}>", ]
+
+    def power_off(self, track=None):
+        self.power = False
+        if track is None:
+            return [ "<p0>", ]
+        else:
+            return [ f"<p0 {track}>", ]
+
+    def track_management(self):
+        return [ "<= A MAIN>", "<= B PROG>", ]
+
+    def status(self):
+        return [ f"<p{int(self.power)}>", self.version, ]
+
+    def emergency_stop(self):
+        return []
+
+    def serve(self, read, write):
+        """
+        Talk to a client using the “read” and “write” functions on
+        bytes until “read” returns b"".
+        """
+        for line in self.banner():
+            write(line.encode("ascii") + b"\n")
+
+        buffer = b""
+        while data := read(1024):
+            buffer += data
+            end = 0
+            for match in command_re.finditer(buffer):
+                command = match.group(1).decode("ascii", errors="replace")
+                reply = self.handle(command)
+                if reply:
+                    write("".join(line + "\n" for line in reply)
+                          .encode("ascii"))
+                end = match.end()
+            buffer = buffer[end:]
+
+    def serve_tcp(self, host="127.0.0.1", port=0) -> str:
+        """
+        Accept connections on “host” and “port” (0 for any free one) in
+        a background thread and return the “socket://” URL to use.
+        """
+        server = socket.create_server((host, port))
+
+        def accept():
+            while True:
+                connection, address = server.accept()
+                threading.Thread(target=self.serve_connection,
+                                 args=(connection,), daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        host, port = server.getsockname()[:2]
+        return f"socket://{host}:{port}"
+
+    def serve_connection(self, connection):
+        with connection:
+            try:
+                self.serve(connection.recv, connection.sendall)
+            except OSError:
+                pass
+
+    def serve_pty(self) -> str:
+        """
+        Serve a pty in a background thread and return the path of its
+        terminal device to use as port URL.
+        """
+        master, slave = os.openpty()
+        tty.setraw(slave)
+
+        def read(n):
+            try:
+                return os.read(master, n)
+            except OSError: # All clients have closed the terminal.
+                return b""
+
+        def write(data):
+            while data:
+                data = data[os.write(master, data):]
+
+        threading.Thread(target=self.serve, args=(read, write,),
+                         daemon=True).start()
+
+        # Keep the slave end open, so the pty survives clients closing it.
+        self._pty_slave = slave
+        return os.ttyname(slave)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--tcp", type=int, default=None, metavar="PORT",
+                       help="Listen on this TCP port.")
+    where.add_argument("--pty", default=False, action="store_true",
+                       help="Serve a pty (the default).")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on with --tcp. "
+                        "Defaults to 127.0.0.1.")
+    parser.add_argument("-l", "--latency", type=float, default=0.0,
+                        help="Seconds each programming track command takes.")
+    parser.add_argument("-j", "--jitter", type=float, default=0.0,
+                        help="Random extra seconds added to the latency.")
+    parser.add_argument("-f", "--failure-rate", type=float, default=0.0,
+                        help="Probability of the decoder not acknowledging "
+                        "a read or write.")
+    parser.add_argument("-d", "--decoder", type=pathlib.Path, default=None,
+                        help="A .loconf file with the decoder’s CVs.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    decoder = Decoder()
+    if args.decoder is not None:
+        from ..language.parser import Parser
+        with args.decoder.open() as infile:
+            decoder.cvs.update(dict( (cv, value) for (cv, value)
+                                     in Parser().parse(infile).items()
+                                     if value is not None ))
+
+    simulator = Simulator(decoder, args.latency, args.jitter,
+                          args.failure_rate, args.seed)
+
+    if args.tcp is None:
+        url = simulator.serve_pty()
+    else:
+        url = simulator.serve_tcp(args.host, args.tcp)
+
+    print(url, flush=True)
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(f"{simulator.commands_handled} commands handled.",
+              file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
-import io, serial, types
+import serial, threading, time, types, collections, queue, concurrent.futures
 
 from .. import debug, comdebug
 from ..station import Station, StationException
 from . import responses
+from .reader import ResponseReader
+from .timing import TimingPolicy
 
 class StationError(StationException):
     """
@@ -20,21 +22,47 @@ class ReadFailed(StationException):
     """
 
 class DCCEX_Station(Station):
-    def __init__(self, port_url, boudrate=115200, default_line_timeout=1):
+    # How often the reader thread checks whether it should stop.
+    poll_interval = 0.1
+
+    # Seconds of silence after connecting that tell us the station
+    # has finished printing its state info.
+    settle_time = 1
+
+    def __init__(self, port_url, boudrate=115200, default_line_timeout=1,
+                 pipeline_depth=4, retries=2, backoff=0.1):
+        """
+        “pipeline_depth” is the number of CV reads readcvs_many() keeps
+        in flight. The station’s serial input buffer must be able to
+        hold as many “<R cv callbacknum callbacksub>” commands.
+
+        Programming track commands the decoder doesn’t acknowledge or
+        that time out are tried again “retries” times, see
+        timing.TimingPolicy, which also adapts their timeouts to the
+        decoder. “default_line_timeout” is used until it has timed
+        some of them and for all other commands.
+        """
         self._ready = False
         debug(f"Connecting to station on {port_url}…", end=" ")
-        self.serial_port = serial.serial_for_url(port_url, boudrate)
-        self.port = io.TextIOWrapper(io.BufferedRWPair(self.serial_port,
-                                                       self.serial_port))
+        self.serial_port = serial.serial_for_url(port_url, boudrate,
+                                                 timeout=self.poll_interval)
+        self._write_lock = threading.Lock()
 
         self.default_line_timeout = default_line_timeout
         self.line_timeout = default_line_timeout
 
-        # Read the station’s state info and copyright.
-        try:
-            self.communicate(None, [], line_timeout=1)
-        except StationTimeout:
-            pass
+        self.pipeline_depth = pipeline_depth
+        self._callbacksub = 0
+        self._callbacksub_lock = threading.Lock()
+
+        self.timing = TimingPolicy(default_line_timeout, retries, backoff)
+
+        # The reader thread is the only one reading from the port.
+        self.reader = ResponseReader(self.serial_port)
+        self.reader.start()
+
+        # Let the station finish printing its state info and copyright.
+        self.reader.wait_for_quiet(self.settle_time)
 
         debug(f"Command station ready on {port_url}.", color="green")
         self._ready = True
@@ -45,60 +73,109 @@ class DCCEX_Station(Station):
 
     @property
     def line_timeout(self):
-        return self.serial_port.timeout
+        """
+        Seconds to wait for a response to a command.
+        """
+        return self._line_timeout
 
     @line_timeout.setter
     def line_timeout(self, line_timeout):
         if line_timeout is None:
-            self.serial_port.timeout = self.default_line_timeout
+            self._line_timeout = self.default_line_timeout
         else:
-            self.serial_port.timeout = line_timeout
+            self._line_timeout = line_timeout
+
+    def close(self):
+        self.reader.stop()
+        self.reader.join()
+        self.serial_port.close()
 
-    def print(self, *args, **kw):
+    def print(self, *args, sep=" ", end="\n"):
         """
         Like print() but communicate the output to the command station.
         """
-        print(*args, **kw, file=self.port)
-        self.port.flush()
+        self.write((sep.join(str(arg) for arg in args) + end).encode("ascii"))
+
+    def write(self, data:bytes):
+        """
+        Send “data” to the command station in one piece, even with
+        several threads writing.
+        """
+        with self._write_lock:
+            self.serial_port.write(data)
+
+    def subscribe(self, callback):
+        """
+        Call “callback” with every Response nobody is waiting for, like
+        broadcasts from the station.
+        """
+        self.reader.subscribe(callback)
 
     def communicate(self, command:str,
                     wanted_responses:tuple[type(responses.Response)],
-                    line_timeout=None):
+                    line_timeout=None, kind=None, is_reply=None):
         """
-        Print “command” to the Command Station and read lines until
-        the first of the “expected_responses” is found. Return it.
-        Ignore all other lines.
+        Print “command” to the Command Station and wait for the first of
+        the “wanted_responses” to arrive. Return it. Other lines go to
+        whoever else is waiting for them or to the subscribers.
+        May be called from several threads at once.
+
+        If given, “is_reply” must return True for a wanted response, so
+        late replies to earlier commands (say, for another CV after a
+        timeout) are not taken for the reply to this one.
 
         • Will raise StationError if the station replies “<X>” unless
           responses.Error is a “wanted_response”.
-        • Will raise StationTimeout when waiting for the next line.
+        • Will raise StationTimeout if no response arrives within
+          “line_timeout” seconds (default: the “line_timeout” property
+          or, if a “kind” of programming track command is given, the
+          timeout self.timing has for it).
         """
-        if type(wanted_responses) is type(type):
+        if isinstance(wanted_responses, type):
             wanted_responses = ( wanted_responses, )
         else:
             wanted_responses = tuple(wanted_responses)
 
-        self.line_timeout = line_timeout
+        if line_timeout is None:
+            if kind is None:
+                line_timeout = self.line_timeout
+            else:
+                line_timeout = self.timing.timeout(kind)
+
+        def accepted(response):
+            if isinstance(response, responses.Error):
+                return True
+            elif isinstance(response, wanted_responses):
+                return is_reply is None or is_reply(response)
+            else:
+                return False
+
+        future = self.reader.expect(accepted)
 
         if command:
             comdebug(command)
-            self.print(command)
+            self.write(command.encode("ascii") + b"\n")
+        start = time.monotonic()
 
-        while True:
-            line = self.port.readline().rstrip()
-
-            if line == "": # Timeout
-                raise StationTimeout(command)
-
-            response = responses.Response.from_line(line)
-            if isinstance(response, wanted_responses):
-                comdebug(line, color="green")
-                return response
-            elif isinstance(response, responses.Error):
-                comdebug(line, color="cyan")
-                raise StationError(command)
-            else:
-                comdebug(line)
+        try:
+            response = future.result(line_timeout)
+        except concurrent.futures.TimeoutError:
+            self.reader.cancel(future)
+            if kind is not None:
+                self.timing.record(kind, line_timeout)
+            raise StationTimeout(command)
+
+        if kind is not None:
+            self.timing.record(kind, time.monotonic() - start)
+
+        if isinstance(response, responses.Error) \
+           and not responses.Error in wanted_responses:
+            raise StationError(command)
+        else:
+            return response
+
+    def _retrying(self, function):
+        return self.timing.retrying(function, ( ReadFailed, StationTimeout, ))
 
     def readcab(self) -> int|None:
         """
@@ -106,10 +183,14 @@ class DCCEX_Station(Station):
         programming track using “<R>”. Returns the address as an
         integer or None on error.
         """
-        response = self.communicate("<R>", responses.ReadAddress)
-        if response.address == -1:
-            raise ReadFailed("Failed to read cab address from decoder.")
-        return response.address
+        def read():
+            response = self.communicate("<R>", responses.ReadAddress,
+                                        kind="address")
+            if response.address == -1:
+                raise ReadFailed("Failed to read cab address from decoder.")
+            return response.address
+
+        return self._retrying(read)
 
     def writecab(self, cab:int) -> int|None:
         """
@@ -119,70 +200,226 @@ class DCCEX_Station(Station):
         """
         assert cab > 1, "Cab address must be > 1."
 
-        response = self.communicate("<W %i>" % cab, responses.WriteAddress)
-
-        if response.address == -1 or response.address != cab:
-            raise ReadFailed(f"Failed to write cab address from decoder "
-                             f"({response.address}).")
-        return response.address
+        def write():
+            response = self.communicate(
+                "<W %i>" % cab, responses.WriteAddress, kind="address",
+                is_reply=lambda response: response.address in ( cab, -1, ))
+            if response.address == -1 or response.address != cab:
+                raise ReadFailed(f"Failed to write cab address from decoder "
+                                 f"({response.address}).")
+            return response.address
 
+        return self._retrying(write)
 
     def readcv(self, cv:int) -> int|None:
         """
         Read a Configuration Variable from the locomotive
         currently on the programming track.
         """
-        response = self.communicate("<R %i>" % cv, responses.ReadCV)
-        if response.value == -1:
-            raise ReadFailed("Failed to read CV #%i value from decoder." % cv)
-        return response.value
+        def read():
+            response = self.communicate(
+                "<R %i>" % cv, responses.ReadCV, kind="read",
+                is_reply=lambda response: response.cv == cv)
+            if response.value == -1:
+                raise ReadFailed("Failed to read CV #%i value from decoder."
+                                 % cv)
+            return response.value
+
+        return self._retrying(read)
+
+    def readcvs_many(self, cvs, depth:int=None):
+        """
+        Read the CVs in “cvs” from the locomotive currently on the
+        programming track and yield ( cv, value, ) pairs as the
+        replies come in. Up to “depth” (default: “pipeline_depth”)
+        “<R cv callbacknum callbacksub>” requests are kept in flight
+        and matched to the replies by callback number, so the station
+        never waits for the host between CVs.
+
+        If the station can’t keep up (it replies “<X>” or goes quiet),
+        replies are read until it is quiet and the requests still
+        outstanding are sent again one at a time. From then on, errors
+        and timeouts are raised as by readcv().
+        """
+        # Tells replies to this call’s requests from stale ones and
+        # from other threads’.
+        with self._callbacksub_lock:
+            self._callbacksub = (self._callbacksub + 1) % 0x8000
+            callbacksub = self._callbacksub
 
-    def writecv(self, cv:int, value:int) -> responses.Response:
-        response = self.communicate("<W %i %i>" % ( cv, value, ),
-                                    responses.WriteCV)
-        if response.value == -1:
-            raise ReadFailed("Failed to write CV #%i value %i to decoder." % (
-                cv, value,))
-        return response
+        def is_reply(response):
+            return ( isinstance(response, responses.ReadCVplus)
+                     and response.callbacksub == callbacksub )
 
-if __name__ == "__main__":
-    import sys, argparse, time, threading, signal, re
+        requests = [ ( callbacknum, cv,
+                       "<R %i %i %i>" % ( cv, callbacknum, callbacksub, ), )
+                     for callbacknum, cv in enumerate(cvs) ]
 
-    from .. import config, debug, comdebug
+        return self._pipeline(requests, is_reply,
+                              lambda response: response.callbacknum,
+                              "read", depth)
 
-    config.update({"debug": True, "comdebug": True})
+    def verifycvs_many(self, cvs:dict, depth:int=None):
+        """
+        Check the CVs on the locomotive currently on the programming
+        track against the values in “cvs” (mapping CV numbers to
+        values) using “<V cv value>” and yield ( cv, actual value, )
+        pairs. The station verifies the whole byte at once and only
+        reads the CV bit by bit if it doesn’t match, which makes this
+        much faster than reading CVs that are likely to be correct.
+
+        Requests are pipelined like in readcvs_many(). Replies are
+        matched by CV number. If the station rejects “<V>” before any
+        CV has been verified, the CVs are read instead.
+        """
+        def is_reply(response):
+            return isinstance(response, responses.ReadCV)
+
+        requests = [ ( cv, cv, "<V %i %i>" % ( cv, value, ), )
+                     for cv, value in cvs.items() ]
+
+        verified = set()
+        try:
+            for cv, value in self._pipeline(requests, is_reply,
+                                            lambda response: response.cv,
+                                            "verify", depth):
+                verified.add(cv)
+                yield cv, value
+        except StationError:
+            # Stations that don’t know “<V>” say “<X>” to the first one.
+            # Later, it is an error about that CV.
+            if verified:
+                raise
+            debug("Station can’t verify CVs, reading them instead.",
+                  color="yellow")
+            yield from self.readcvs_many(list(cvs.keys()), depth)
+
+    def _pipeline(self, requests, is_reply, key_of, kind, depth=None):
+        """
+        Send the commands in “requests”, a list of ( key, cv, command, )
+        triples, keeping up to “depth” of them in flight. Yield
+        ( cv, value, ) for each reply “is_reply” accepts as soon as it
+        arrives. “key_of” returns the key of the request a reply
+        belongs to, replies to requests not in flight are left to the
+        reader’s other subscribers. Replies are timed as commands of
+        “kind”.
+
+        If the station can’t keep up (it replies “<X>” or goes quiet),
+        replies are read until it is quiet and the requests still
+        outstanding are sent again one at a time. From then on, errors
+        are raised as by communicate(). Requests the decoder doesn’t
+        acknowledge or that time out are retried as self.timing says
+        before ReadFailed or StationTimeout is raised.
+        """
+        if depth is None:
+            depth = self.pipeline_depth
+
+        waiting = collections.deque(requests)
+        in_flight = {} # Maps keys to requests.
+
+        replies = queue.Queue()
+        route = self.reader.route(
+            lambda response: ( isinstance(response, responses.Error)
+                               or ( is_reply(response)
+                                    and key_of(response) in in_flight ) ),
+            replies.put)
+
+        draining = False
+
+        attempts = collections.Counter() # Failed ones by key
+        def retry(key, error):
+            if self.timing.retry(attempts[key], error):
+                attempts[key] += 1
+                return True
+            else:
+                return False
+
+        sent = {} # Maps keys to when they were sent.
+        last_reply = time.monotonic()
 
-    class ReaderThread(threading.Thread):
-        def __init__(self):
-            super().__init__()
-            self.user_has_canceled = False
-
-        def run(self):
-            self.last_response = self.last_cmd_response = 0
-
-            while not self.user_has_canceled:
-                line = config.station.port.readline().rstrip()
-                self.last_response += 1
-
-                if line == "": # Timeout
-                    time.sleep(.02)
-                else:
-                    self.last_response = self.last_response
-                    if line == "<X>":
-                        color = "red"
-                        self.last_cmd_response = self.last_response
-                    elif line.startswith("<*"):
-                        color = "light_grey"
+        try:
+            command = None
+            while waiting or in_flight:
+                while waiting and len(in_flight) < depth and not draining:
+                    request = waiting.popleft()
+                    key, cv, command = request
+                    in_flight[key] = request
+
+                    comdebug(command)
+                    self.write(command.encode("ascii") + b"\n")
+                    sent[key] = time.monotonic()
+
+                timeout = self.timing.timeout(kind)
+                try:
+                    response = replies.get(timeout=timeout)
+                except queue.Empty:
+                    self.timing.record(kind, timeout)
+
+                    if depth == 1 and not draining:
+                        key, cv, command = request = in_flight.pop(
+                            next(iter(in_flight)))
+                        if retry(key, StationTimeout(command)):
+                            waiting.appendleft(request)
+                            continue
+                        else:
+                            raise StationTimeout(command)
+
+                    # The station is quiet now. Whatever is in flight
+                    # won’t be answered.
+                    depth, draining = 1, False
+                    waiting.extendleft(reversed(list(in_flight.values())))
+                    in_flight.clear()
+                    continue
+
+                if isinstance(response, responses.Error):
+                    if depth == 1 and not draining:
+                        raise StationError(command)
+                    elif not draining:
+                        debug("Station can’t keep up with pipelined "
+                              "requests, falling back to one at a time.",
+                              color="yellow")
+                        draining = True
+                elif key_of(response) in in_flight:
+                    key, cv, command = request = in_flight.pop(
+                        key_of(response))
+
+                    # The time the station took for this one, as opposed
+                    # to the time it spent with the ones before it.
+                    now = time.monotonic()
+                    self.timing.record(kind, now - max(sent[key], last_reply))
+                    last_reply = now
+
+                    if response.value == -1:
+                        error = ReadFailed("Failed to read CV #%i value from "
+                                           "decoder." % cv)
+                        if retry(key, error):
+                            waiting.appendleft(request)
+                        else:
+                            raise error
                     else:
-                        color = "green"
-                        self.last_cmd_response = self.last_response
+                        yield cv, response.value
+        finally:
+            self.reader.unroute(route)
 
-                    comdebug(line, color=color)
+    def writecv(self, cv:int, value:int) -> responses.Response:
+        def write():
+            response = self.communicate(
+                "<W %i %i>" % ( cv, value, ), responses.WriteCV, kind="write",
+                is_reply=lambda response: response.cv == cv)
+            if response.value == -1:
+                raise ReadFailed("Failed to write CV #%i value %i to "
+                                 "decoder." % ( cv, value,))
+            return response
+
+        return self._retrying(write)
+
+if __name__ == "__main__":
+    import sys, argparse, signal
 
-        def cancel(self):
-            self.user_has_canceled = True
+    from .. import config
+    from .script import ScriptRunner, parse, parse_line
 
-    cmd_re = re.compile(r"sleep (?P<sleep>[0-9]+|[0-9]*\.[0-9]+)")
+    config.update({"debug": True, "comdebug": True})
 
     def main():
         parser = argparse.ArgumentParser()
@@ -190,64 +427,21 @@ if __name__ == "__main__":
                             nargs="*")
         args = parser.parse_args()
 
-        config.station.line_timeout = .03
-
-        reader_thread = ReaderThread()
-        reader_thread.start()
+        runner = ScriptRunner(config.station)
 
         def terminate():
             config.station.print("<!>") # Emergency stop.
             config.station.print("<0>") # Cut power to all tracks.
 
-            reader_thread.cancel()
-            reader_thread.join()
+            config.station.close()
             sys.exit(0)
 
         def SIGINT_handler(sig, frame):
             terminate()
         signal.signal(signal.SIGINT, SIGINT_handler)
 
-        # Wait for the station’s chatter before work.
-        while not config.station.ready:
-            time.sleep(.1)
-
-        def process_line(line):
-            if line.strip() == "":
-                print()
-
-            parts = line.split("#", 1)
-            line = parts[0].strip()
-            if len(parts) > 1:
-                cmt = parts[1].strip()
-                comdebug("# " + cmt, color="blue")
-
-            if line != "":
-                match = cmd_re.match(line)
-                if match is None:
-                    # A line to be sent to the command station.
-                    cmd = f"<{line}>"
-                    comdebug(cmd, color="black")
-
-                    last_cmd_response = reader_thread.last_cmd_response
-                    config.station.print(cmd)
-
-                    counter = 0
-                    while last_cmd_response == reader_thread.last_cmd_response:
-                        time.sleep(.1)
-                        counter += 1
-                        if counter > 20:
-                            break
-                else:
-                    # A meta command.
-                    groups = match.groupdict()
-                    if "sleep" in groups:
-                        t = float(groups["sleep"])
-                        time.sleep(t)
-
-
         for infile in args.infiles:
-            for line in infile.readlines():
-                process_line(line)
+            runner.run(parse(infile))
 
         while True:
             print("=>", end=" ")
@@ -257,6 +451,6 @@ if __name__ == "__main__":
                 print()
                 terminate()
 
-            process_line(line)
+            runner.run(parse_line(line))
 
     main()
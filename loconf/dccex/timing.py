@@ -0,0 +1,174 @@
+"""
+How long to wait for the command station and how often to try again.
+
+Programming track commands take anything from a few ten milliseconds
+to several seconds, depending on the decoder and on how many bits of a
+CV the station has to read one by one. Rather than waiting the worst
+case for every line, TimingPolicy times the replies to each kind of
+command (“read”, “write”, “verify”, “address”) and waits a multiple of
+a high percentile of what it has seen.
+"""
+
+import time, collections, pathlib, tomllib, json
+
+from .. import debug
+
+class LatencyStats(object):
+    """
+    The latest “window” response times of one kind of command.
+    """
+    def __init__(self, window=64):
+        self.samples = collections.deque(maxlen=window)
+
+    def record(self, seconds:float):
+        self.samples.append(seconds)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentile(self, p:float) -> float|None:
+        if not self.samples:
+            return None
+
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered)-1, int(p * len(ordered)))]
+
+class TimingPolicy(object):
+    """
+    Until “min_samples” replies to a kind of command have been timed,
+    its timeout comes from the latency profile loaded (if any) or is
+    “default_timeout”. After that it is “factor” times the “percentile”
+    of the times seen, but within “min_timeout” and “max_timeout”.
+    A timeout counts as a sample of its own, so the timeouts grow if
+    they are too tight.
+
+    Commands the decoder doesn’t acknowledge (the station reports -1)
+    or that time out are tried again up to “retries” times, waiting
+    “backoff” seconds before the first retry and twice as long before
+    each one after that.
+    """
+    def __init__(self, default_timeout=1, retries=2, backoff=0.1,
+                 percentile=0.95, factor=3, min_samples=5,
+                 min_timeout=0.25, max_timeout=10):
+        self.default_timeout = default_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.percentile = percentile
+        self.factor = factor
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+        self.stats = collections.defaultdict(LatencyStats)
+        self.profile = {}
+
+    def load_profile(self, profile:dict|None):
+        """
+        Use “profile”, as returned by learned_profile(), for kinds of
+        commands not timed often enough yet.
+        """
+        self.profile = dict(profile or {})
+
+    def learned_profile(self) -> dict:
+        """
+        Return a dict mapping kinds of commands to the “percentile” of
+        their response times, for those timed at least “min_samples”
+        times, on top of the profile loaded.
+        """
+        ret = dict(self.profile)
+        for kind, stats in self.stats.items():
+            if len(stats) >= self.min_samples:
+                ret[kind] = round(stats.percentile(self.percentile), 3)
+        return ret
+
+    def estimate(self, kind:str) -> float|None:
+        stats = self.stats[kind]
+        if len(stats) >= self.min_samples:
+            return stats.percentile(self.percentile)
+        else:
+            return self.profile.get(kind, None)
+
+    def timeout(self, kind:str) -> float:
+        estimate = self.estimate(kind)
+        if estimate is None:
+            return self.default_timeout
+        else:
+            return min(self.max_timeout,
+                       max(self.min_timeout, estimate * self.factor))
+
+    def record(self, kind:str, seconds:float):
+        self.stats[kind].record(seconds)
+
+    def retry(self, attempt:int, error:Exception) -> bool:
+        """
+        Called after “attempt” (counting from 0) has failed with “error”.
+        Wait and return True if another attempt is due.
+        """
+        if attempt >= self.retries:
+            return False
+
+        delay = self.backoff * 2**attempt
+        debug(f"{error.__class__.__name__} on “{error.command}”, "
+              f"retrying in {delay:.2f}s.", color="yellow")
+        time.sleep(delay)
+        return True
+
+    def retrying(self, function, errors:tuple[type(Exception)]):
+        """
+        Call “function” and return its result, calling it again as long
+        as it raises one of the “errors” and retry() says so.
+        """
+        attempt = 0
+        while True:
+            try:
+                return function()
+            except errors as error:
+                if not self.retry(attempt, error):
+                    raise
+                attempt += 1
+
+class LatencyProfiles(object):
+    """
+    Latency profiles by decoder. They come from the “latency_profiles”
+    table in the configuration, which has one sub-table per decoder
+    (see utils.identify_decoder()) mapping kinds of commands to seconds:
+
+        [latency_profiles."151/255"]
+        read = 0.35
+        write = 0.12
+
+    Profiles learned by the tools are kept in “path” and take
+    precedence over the configured ones.
+    """
+    def __init__(self, configured:dict, path:pathlib.Path|None):
+        self.configured = configured
+        self.path = path
+
+        if path is not None and path.exists():
+            with path.open("rb") as fp:
+                self.learned = tomllib.load(fp)
+        else:
+            self.learned = {}
+
+    def get(self, decoder:str) -> dict:
+        ret = dict(self.configured.get(decoder, {}))
+        ret.update(self.learned.get(decoder, {}))
+        return ret
+
+    def learn(self, decoder:str, profile:dict):
+        if not profile or self.get(decoder) == profile:
+            return
+
+        self.learned[decoder] = dict(profile)
+        if self.path is not None:
+            self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("w") as fp:
+            for decoder, profile in sorted(self.learned.items()):
+                # JSON strings are valid TOML basic strings.
+                print(f"[{json.dumps(decoder)}]", file=fp)
+                for kind, seconds in sorted(profile.items()):
+                    print(f"{kind} = {float(seconds)!r}", file=fp)
+                print(file=fp)
@@ -0,0 +1,94 @@
+import dataclasses, hashlib, pathlib, pickle
+
+def file_digest(path:pathlib.Path) -> str|None:
+    # Don’t read from pipes.
+    if not path.is_file():
+        return None
+
+    try:
+        with path.open("rb") as fp:
+            return hashlib.sha1(fp.read()).hexdigest()
+    except OSError:
+        return None
+
+@dataclasses.dataclass
+class ParsedFile:
+    """
+    The result of parsing a .loconf file on its own: The names it
+    defines, their SymbolIndex and the CV settings it makes, including
+    those of the files it includes. “digests” maps every file read in
+    the process to the SHA-1 hash of its contents.
+
+    If the file can’t be parsed on its own, “error” is the LoconfError
+    that says why and the other fields are None.
+    """
+    path: pathlib.Path
+    digests: dict
+    variables: dict
+    settings: dict
+    symbols: object
+    error: Exception|None = None
+
+    def is_current(self) -> bool:
+        for path, digest in self.digests.items():
+            if file_digest(path) != digest:
+                return False
+        return True
+
+class IncludeCache(object):
+    """
+    Keep ParsedFile objects for .loconf files so that include
+    statements for files that have not changed may be resolved without
+    tokenizing them again. Entries are keyed on the absolute path of
+    the file and the include path used to resolve nested includes and
+    validated against the content hashes of all files involved.
+
+    If “cachedir” is set, entries are also pickled there and survive
+    the process.
+    """
+    def __init__(self, cachedir:pathlib.Path|None=None):
+        self.cachedir = cachedir
+        self._entries = {}
+
+    def key(self, path:pathlib.Path, include_paths) -> tuple:
+        return ( str(path), tuple(str(p) for p in include_paths), )
+
+    def _picklepath(self, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return pathlib.Path(self.cachedir, name + ".pickle")
+
+    def get(self, path:pathlib.Path, include_paths) -> ParsedFile|None:
+        key = self.key(path, include_paths)
+        parsed = self._entries.get(key, None)
+
+        if parsed is None and self.cachedir is not None:
+            try:
+                with self._picklepath(key).open("rb") as fp:
+                    parsed = pickle.load(fp)
+            except Exception:
+                parsed = None
+
+        if parsed is not None and parsed.is_current():
+            self._entries[key] = parsed
+            return parsed
+        else:
+            self._entries.pop(key, None)
+            return None
+
+    def put(self, parsed:ParsedFile, include_paths):
+        key = self.key(parsed.path, include_paths)
+        self._entries[key] = parsed
+
+        if self.cachedir is not None:
+            picklepath = self._picklepath(key)
+            try:
+                self.cachedir.mkdir(parents=True, exist_ok=True)
+                tmppath = picklepath.with_suffix(".tmp")
+                with tmppath.open("wb") as fp:
+                    pickle.dump(parsed, fp)
+                tmppath.replace(picklepath)
+            except OSError:
+                pass
+
+    def clear(self):
+        self._entries.clear()
@@ -1,4 +1,4 @@
-import dataclasses, io, pathlib
+import dataclasses, io, pathlib, re, bisect
 import ply.lex
 
 @dataclasses.dataclass
@@ -7,11 +7,21 @@ class Location:
     looking_at: str
     filepath: pathlib.Path = None
 
+    def __eq__(self, other):
+        # Lazy and materialized Locations compare equal.
+        if isinstance(other, Location):
+            return ( (self.lineno, self.looking_at, self.filepath,)
+                     == (other.lineno, other.looking_at, other.filepath,) )
+        else:
+            return NotImplemented
+
+    def materialize(self):
+        return self
+
     @classmethod
     def from_lexdatapos(Location, lexdata, lexpos, filepath=None):
-        lineno = lexdata[:lexpos].count("\n") + 1
-        remainder = lexdata[lexpos:]
-        return Location( lineno, remainder[:40], filepath )
+        lineno = lexdata.count("\n", 0, lexpos) + 1
+        return Location( lineno, lexdata[lexpos:lexpos+40], filepath )
 
 
     @classmethod
@@ -24,6 +34,49 @@ class Location:
     def from_baselexer(Location, lexer, filepath=None):
         return Location.from_lexdatapos(lexer.lexdata, lexer.lexpos, filepath)
 
+class LineIndex(object):
+    """
+    The offsets of the line starts in a source text, so line numbers
+    may be looked up in O(log n) rather than counting newlines.
+    """
+    def __init__(self, lexdata:str, first_lineno:int=1, filepath=None):
+        self.lexdata = lexdata
+        self.first_lineno = first_lineno
+        self.filepath = filepath
+        self.line_starts = [ 0, ]
+        self.line_starts.extend(m.end() for m in re.finditer("\n", lexdata))
+
+    def lineno(self, lexpos:int) -> int:
+        return bisect.bisect_right(self.line_starts, lexpos) \
+            + self.first_lineno - 1
+
+    def location(self, lexpos:int):
+        return LazyLocation(self, lexpos, self.filepath)
+
+class LazyLocation(Location):
+    """
+    A Location that determines its line number and context only when
+    asked. Pickles as a plain Location.
+    """
+    def __init__(self, line_index:LineIndex, lexpos:int, filepath=None):
+        self._line_index = line_index
+        self._lexpos = lexpos
+        self.filepath = filepath
+
+    @property
+    def lineno(self):
+        return self._line_index.lineno(self._lexpos)
+
+    @property
+    def looking_at(self):
+        return self._line_index.lexdata[self._lexpos:self._lexpos+40]
+
+    def materialize(self) -> Location:
+        return Location(self.lineno, self.looking_at, self.filepath)
+
+    def __reduce__(self):
+        return ( Location, ( self.lineno, self.looking_at, self.filepath, ), )
+
 class LoconfError(Exception):
     """
 	General-purpose exception raised when errors occur during lexing and
@@ -0,0 +1,157 @@
+"""
+A compact binary representation of the CVs set by a .loconf file,
+so they may be used again without parsing as long as the sources have
+not changed. The layout is fixed:
+
+    header          magic, version, number of sources, sources offset
+    presence bitmap 1024 bits, one per CV 1…1024
+    NULL bitmap     1024 bits, set for CVs set to NULL
+    values          1024 unsigned 16 bit little endian integers
+    sources         per source file: SHA-1 digest, path length, path
+"""
+
+import sys, struct, mmap, pathlib
+
+from .cache import file_digest
+
+MAGIC = b"LOCONFCV"
+VERSION = 1
+CV_COUNT = 1024
+
+header = struct.Struct("<8sHHI")
+source_header = struct.Struct("<20sH")
+
+bitmap_size = CV_COUNT // 8
+presence_offset = header.size
+null_offset = presence_offset + bitmap_size
+values_offset = null_offset + bitmap_size
+values_size = CV_COUNT * 2
+sources_offset = values_offset + values_size
+
+def image_path(path:pathlib.Path) -> pathlib.Path:
+    return path.with_suffix(".cvimg")
+
+def write_image(cvs:dict, digests:dict, fp):
+    """
+    Write “cvs” (mapping CV numbers to values or None) and the
+    SHA-1 “digests” of the source files to binary file “fp”.
+    """
+    presence = bytearray(bitmap_size)
+    nulls = bytearray(bitmap_size)
+    values = bytearray(values_size)
+
+    for cv, value in cvs.items():
+        if not isinstance(cv, int) or cv < 1 or cv > CV_COUNT:
+            raise ValueError(f"Can’t store CV “{cv}” in an image.")
+
+        index = cv - 1
+        presence[index // 8] |= 1 << (index % 8)
+        if value is None:
+            nulls[index // 8] |= 1 << (index % 8)
+        elif value < 0 or value > 0xffff:
+            raise ValueError(f"Can’t store value {value} for CV {cv} "
+                             f"in an image.")
+        else:
+            struct.pack_into("<H", values, index * 2, value)
+
+    sources = [ (path, digest)
+                for path, digest in digests.items()
+                if digest is not None ]
+
+    fp.write(header.pack(MAGIC, VERSION, len(sources), sources_offset))
+    fp.write(presence)
+    fp.write(nulls)
+    fp.write(values)
+    for path, digest in sources:
+        path = str(path).encode("utf-8")
+        fp.write(source_header.pack(bytes.fromhex(digest), len(path)))
+        fp.write(path)
+
+class CVImage(object):
+    """
+    Read-only view of an image in a buffer, typically an mmap.
+    """
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+
+        magic, version, self._source_count, self._sources_offset = \
+            header.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a loconf CV image (or unknown version).")
+
+        self._presence = self.buffer[presence_offset:null_offset]
+        self._nulls = self.buffer[null_offset:values_offset]
+
+        values = self.buffer[values_offset:sources_offset]
+        if sys.byteorder == "little":
+            self._values = values.cast("H")
+        else:
+            self._values = [ v for (v,) in struct.iter_unpack("<H", values) ]
+
+    @classmethod
+    def load(cls, path:pathlib.Path):
+        with path.open("rb") as fp:
+            return cls(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _bit(self, bitmap, cv):
+        index = cv - 1
+        return bool(bitmap[index // 8] & (1 << (index % 8)))
+
+    def __contains__(self, cv:int):
+        return 1 <= cv <= CV_COUNT and self._bit(self._presence, cv)
+
+    def __getitem__(self, cv:int) -> int|None:
+        if cv not in self:
+            raise KeyError(cv)
+        elif self._bit(self._nulls, cv):
+            return None
+        else:
+            return self._values[cv-1]
+
+    def get(self, cv:int, default=None):
+        if cv in self:
+            return self[cv]
+        else:
+            return default
+
+    def items(self):
+        for cv in range(1, CV_COUNT+1):
+            if cv in self:
+                yield cv, self[cv]
+
+    def as_dict(self) -> dict:
+        return dict(self.items())
+
+    @property
+    def digests(self) -> dict:
+        ret = {}
+        offset = self._sources_offset
+        for i in range(self._source_count):
+            digest, length = source_header.unpack_from(self.buffer, offset)
+            offset += source_header.size
+            path = bytes(self.buffer[offset:offset+length]).decode("utf-8")
+            offset += length
+            ret[pathlib.Path(path)] = digest.hex()
+        return ret
+
+    def is_current(self) -> bool:
+        for path, digest in self.digests.items():
+            if file_digest(path) != digest:
+                return False
+        return True
+
+def load_current(path:pathlib.Path) -> dict|None:
+    """
+    Return the CVs from the image compiled from the .loconf file at
+    “path” if there is one and none of its sources has changed since.
+    Otherwise return None.
+    """
+    try:
+        image = CVImage.load(image_path(path))
+    except (OSError, ValueError):
+        return None
+
+    if image.is_current():
+        return image.as_dict()
+    else:
+        return None
@@ -1,51 +1,106 @@
-import copy, dataclasses, pathlib, itertools
+import copy, dataclasses, pathlib, itertools, functools
 import ply.lex
 
-from . import lextokens
-from .exceptions import Location, SyntaxError, ParseError
+from .. import config
+from . import lextokens, scanner
+from .scanner import Token
+from .exceptions import (Location, LineIndex, LoconfError,
+                         SyntaxError, ParseError)
+from .cache import ParsedFile, file_digest
+from .symbols import SymbolIndex
+
+_lexer_template = None
+def lexer_template() -> ply.lex.Lexer:
+    """
+    Return the process-wide ply lexer built from the rules in
+    lextokens. Building ply’s master regex and reflecting on the
+    module is expensive, so this is done only once. Callers must
+    clone() the template before feeding it input.
+
+    If the “optimize_lexer” configuration option is set, ply will
+    persist its tables as “loconf.language.lextab” and load them from
+    there on subsequent runs.
+    """
+    global _lexer_template
+    if _lexer_template is None:
+        if config.optimize_lexer:
+            _lexer_template = ply.lex.lex(module=lextokens,
+                                          reflags=0,
+                                          optimize=True,
+                                          lextab="lextab")
+        else:
+            _lexer_template = ply.lex.lex(module=lextokens,
+                                          reflags=0,
+                                          optimize=False,
+                                          lextab=None)
+    return _lexer_template
+
+def infile_name(infile) -> str|None:
+    """
+    Return the name of “infile” if it is a path. Files opened from
+    file descriptors (pipes, sockets) have an int name.
+    """
+    name = getattr(infile, "name", None)
+    if isinstance(name, str):
+        return name
+    else:
+        return None
 
 class LexerWrapper(object):
     """
     Prettify some of ply.lex.lex()’s functionality.
     """
     def __init__(self, lexer:ply.lex.Lexer, infile):
-        self.base = copy.copy(lexer)
+        self.base = lexer.clone()
         self.infile = infile
-        self._current_token = None
+
+        # If set to a list, scanning errors are appended to it and the
+        # offending character skipped rather than raising SyntaxError.
+        self.errors = None
 
     def tokenize(self):
-        source = self.infile.read()
-        self.base.input(source.lstrip())
+        source = self.infile.read().lstrip()
+        return self._tokenize(source, LineIndex(source, 1, self.infilepath))
+
+    def tokenize_lines(self, first_lineno=1):
+        """
+        Like tokenize(), but read the input file one line at a time
+        and yield each line’s tokens as soon as it is available. Tokens
+        may not span lines in this mode.
+        """
+        for lineno, line in enumerate(self.infile, first_lineno):
+            yield from self._tokenize(line,
+                                      LineIndex(line, lineno, self.infilepath))
+
+    def _tokenize(self, source:str, line_index:LineIndex):
+        self.base.input(source)
 
         while True:
             try:
                 token = self.base.token()
             except ply.lex.LexError as e:
-                raise SyntaxError(
-                    str(e), location=Location.from_baselexer(
-                        self.base, self.infilepath))
+                error = SyntaxError(
+                    str(e), location=line_index.location(self.base.lexpos))
+                if self.errors is None:
+                    raise error
+                else:
+                    self.errors.append(error)
+                    self.base.skip(1)
+                    continue
 
             if not token:
                 break
             else:
-                self._current_token = token
-                token.get_location = self.get_location
-                yield token
+                yield Token(token.type, token.value, token.lexpos, line_index)
 
-    @property
+    @functools.cached_property
     def infilepath(self):
-        if hasattr(self.infile, "name"):
-            return pathlib.Path(self.infile.name)
+        name = infile_name(self.infile)
+        if name is not None:
+            return pathlib.Path(name)
         else:
             return None
 
-    def get_location(self):
-        if (self._current_token is not None
-            and hasattr(self._current_token, "lexer")):
-            return Location.from_lextoken(self._current_token, self.infilepath)
-        else:
-            return Location.from_baselexer(self.base, self.infilepath)
-
     @property
     def remainder(self) -> str:
         return get_remainder(self.base)
@@ -66,6 +121,20 @@ class LexerWrapper(object):
     def lexmatch(self):
         return self.base.lexmatch
 
+class ScannerWrapper(LexerWrapper):
+    """
+    A LexerWrapper that tokenizes using the scanner module rather
+    than ply.
+    """
+    def __init__(self, infile):
+        self.infile = infile
+        self.errors = None
+
+    def _tokenize(self, source:str, line_index:LineIndex):
+        return scanner.scan(source, line_index, self.errors)
+
+backends = { "ply": lambda infile: LexerWrapper(lexer_template(), infile),
+             "fast": ScannerWrapper, }
 
 @dataclasses.dataclass
 class Setting:
@@ -73,45 +142,219 @@ class Setting:
     location: Location
 
 class Parser(object):
-    def __init__(self, include_paths=[]):
+    def __init__(self, include_paths=[], backend=None):
+        """
+        “backend” is either “ply” or “fast”, which uses the scanner
+        module. Both produce identical results. Defaults to the
+        “parser_backend” configuration option.
+        """
         self.include_paths = include_paths
         self.variables = {}
 
+        # Maps names to the Location they were defined at.
+        self.definitions = {}
+
+        if backend is None:
+            backend = config.parser_backend
+        if backend not in backends:
+            raise ValueError(f"Unknown parser backend “{backend}”")
+        self.backend = backend
+
+        # Maps the absolute paths of all files read to their SHA-1 digest.
+        self.digests = {}
+
     def parse(self, infile):
+        return dict([(cv, setting.value)
+                     for cv, setting in self.parse_settings(infile).items()])
+
+    @property
+    def symbols(self) -> SymbolIndex:
+        return SymbolIndex.from_definitions(self.variables, self.definitions)
+
+    def parse_cached(self, path:pathlib.Path, include_paths=None) \
+            -> ParsedFile:
+        """
+        Parse the file at “path” with a fresh Parser or retrieve the
+        result from the include cache if the file and the files it
+        includes have not changed since. Will raise LoconfError, which
+        is cached, too, so includes that need the names of the file
+        including them aren’t tried on their own every time.
+        """
+        path = pathlib.Path(path).absolute()
+        if include_paths is None:
+            include_paths = self.include_paths
+
+        parsed = config.include_cache.get(path, include_paths)
+        if parsed is None:
+            parser = Parser(include_paths, self.backend)
+            try:
+                with path.open() as infile:
+                    settings = parser.parse_settings(infile)
+            except LoconfError as error:
+                parsed = ParsedFile(path, parser.digests,
+                                    None, None, None, error)
+            else:
+                parsed = ParsedFile(path, parser.digests,
+                                    parser.variables, settings,
+                                    parser.symbols)
+            config.include_cache.put(parsed, include_paths)
+
+        if parsed.error is not None:
+            raise parsed.error
+
+        return parsed
+
+    def parse_recovering(self, infile) -> tuple[dict, list]:
+        """
+        Parse “infile” without stopping at the first error. Returns
+        the CVs that could be parsed and a list of all the LoconfErrors
+        found.
+        """
+        errors = []
+        cvs = dict([(cv, setting.value)
+                    for cv, setting in self.iter_settings(infile,
+                                                          errors=errors)])
+        return cvs, errors
+
+    def parse_settings(self, infile) -> dict:
+        """
+        Parse “infile” and return a dict mapping CV numbers to
+        Setting objects.
+        """
+        return dict(self.iter_settings(infile))
+
+    def iter_settings(self, infile, streaming=False, cvs=None,
+                      first_lineno=1, errors=None, statement_start=None):
+        """
+        Parse “infile” and yield pairs of CV number and Setting object
+        as each assignment is parsed. If “streaming” is set, “infile” is
+        read one line at a time, so settings become available while the
+        rest of the input (say, from a pipe) is still on its way.
+
+        To resume parsing a file after a statement boundary, pass the
+        CV Settings so far in “cvs” (which will be updated in place)
+        and the line number “infile” starts at in streaming mode. The
+        Parser’s variables, definitions and digests (sans the one of
+        “infile” itself) must be the ones from that point.
+
+        If “errors” is a list, LoconfErrors are appended to it rather
+        than raised and parsing continues at the next statement: a name
+        or include keyword or a CV number followed by “:=”.
+
+        “statement_start”, if given, is called with the first token of
+        each statement that follows one parsed without an error. The
+        parser’s state at that point is one parsing may be resumed from.
+
+        If “infile” has a “digest” attribute, it is recorded for the
+        file rather than reading the file by its name to hash it.
+        """
         include_paths = copy.copy(self.include_paths)
         include_paths.append(pathlib.Path(".").absolute())
 
-        filepath = getattr(infile, "name", None)
+        filepath = infile_name(infile)
         if filepath is not None:
             include_paths.insert(0, pathlib.Path(filepath).absolute().parent)
 
-        cvs = {} # Maps number:int to Setting
+        if cvs is None:
+            cvs = {} # Maps number:int to Setting
 
-        infilepaths = set()
-        def tokens_from(infile):
-            infilepath = getattr(infile, "name", None)
+        def check_inclusion(infilepath):
+            if infilepath in self.digests:
+                raise ParseError(f"Multiple inclusions of {infilepath}.")
+
+        def tokens_from(infile, streaming=False, first_lineno=1):
+            infilepath = infile_name(infile)
             if infilepath is None:
                 infilepath = "<no filename>"
+                digest = None
             else:
                 infilepath = pathlib.Path(infilepath).absolute()
+                if hasattr(infile, "digest"):
+                    digest = infile.digest
+                else:
+                    digest = file_digest(infilepath)
 
-            if infilepath in infilepaths:
-                raise ParseError("Multiple inclusions of {infilepath}.")
-            else:
-                infilepaths.add(infilepath)
-
-            lexer = LexerWrapper(ply.lex.lex(module=lextokens,
-                                             reflags=0,
-                                             optimize=False,
-                                             lextab=None), infile)
-
-            return lexer.tokenize()
+            check_inclusion(infilepath)
+            self.digests[infilepath] = digest
 
-        tokens = tokens_from(infile)
+            lexer = backends[self.backend](infile)
+            lexer.errors = errors
 
+            if streaming:
+                return lexer.tokenize_lines(first_lineno)
+            else:
+                return lexer.tokenize()
+
+        def set_cv(cv, setting):
+            if cv in cvs:
+                raise ParseError(f"CV {cv} already set to "
+                                 f"{cvs[cv].value} at "
+                                 f"{cvs[cv].location.materialize()}",
+                                 location=setting.location)
+            else:
+                cvs[cv] = setting
+                return cv, setting
+
+        def include(inpath):
+            """
+            Merge the names from the file at “inpath” using the include
+            cache and return its ParsedFile. Returns None if the file
+            can’t be parsed on its own (say, because it uses a name
+            defined by the including file) and needs to be tokenized in
+            place.
+            """
+            try:
+                parsed = self.parse_cached(inpath, include_paths)
+            except LoconfError:
+                return None
+
+            for path in parsed.digests.keys():
+                check_inclusion(path)
+            self.digests.update(parsed.digests)
+
+            for identifyer, number in parsed.variables.items():
+                if identifyer in self.variables:
+                    raise ParseError(
+                        f"Identifyer already defined: {identifyer}")
+                else:
+                    self.variables[identifyer] = number
+            self.definitions.update(parsed.symbols.locations)
+
+            return parsed
+
+        tokens = tokens_from(infile, streaming, first_lineno)
+
+        # The token consumed last and the first one of the current
+        # statement, so recovery knows where to continue.
+        last = None
+        statement = None
+
+        def next_token():
+            nonlocal last
+            last = next(tokens)
+            return last
+
+        def resynchronize():
+            # Skip tokens up to the start of the next statement. The
+            # token the error occured at may start it, unless it is the
+            # one the failed statement started with.
+            nonlocal tokens
+            if last is not None and last is not statement:
+                tokens = itertools.chain([ last, ], tokens)
+
+            previous = None
+            for token in tokens:
+                if token.type in { "name_keyword", "include_keyword", }:
+                    tokens = itertools.chain([ token, ], tokens)
+                    return
+                elif token.type == "walrus" and previous is not None \
+                     and previous.type in { "identifyer", "number_literal", }:
+                    tokens = itertools.chain([ previous, token, ], tokens)
+                    return
+                previous = token
 
         def expect(*types):
-            token = next(tokens)
+            token = next_token()
             if token.type not in types:
                 if len(types) == 1:
                     type = types[0]
@@ -123,7 +366,7 @@ class Parser(object):
             return token
 
         def expect_number():
-            return parse_number(next(tokens))
+            return parse_number(next_token())
 
         def parse_number(token):
             # A number could either be:
@@ -146,7 +389,8 @@ class Parser(object):
                     return parse_bits()
                 case _:
                     raise ParseError(f"Expected number, identifyer or "
-                                     f"expression, found {token.type}.")
+                                     f"expression, found {token.type}.",
+                                     location=token.get_location())
 
 
         def parse_sum():
@@ -156,7 +400,7 @@ class Parser(object):
                 n = expect_number()
                 if n not in { 0, 1, 2, 4, 8, 16, 32, 64, 128, }:
                     raise SyntaxError("Components in a sum must be powers "
-                                      "of two.")
+                                      "of two.", location=last.get_location())
                 ret += n
                 token = expect("plus", "close_paren")
                 if token.type == "close_paren":
@@ -170,7 +414,8 @@ class Parser(object):
             while True:
                 n = expect_number()
                 if n < 0 or n > 7:
-                    raise SyntaxError("Bit number must be 0 <= n <= 7.")
+                    raise SyntaxError("Bit number must be 0 <= n <= 7.",
+                                      location=last.get_location())
                 ret += 2 ** n
                 token = expect("comma", "close_bracket")
                 if token.type == "close_bracket":
@@ -178,61 +423,100 @@ class Parser(object):
 
             return ret
 
+        # Set when the current statement was found by resynchronize(),
+        # whose search may have touched the tokens before it.
+        resynchronized = False
+
         while True:
             try:
-                token = next(tokens)
+                token = next_token()
             except StopIteration:
                 break
 
-            match token.type:
-                # case "line_comment" | "inline_comment" | "whitespace":
-                # These are handled by returning None in lextokens functions.
-
-                case "name_keyword":
-                    number = expect_number()
-                    identifyer = expect("identifyer").value
+            statement = token
+            if statement_start is not None and not resynchronized:
+                statement_start(token)
+            resynchronized = False
 
-                    if identifyer in self.variables:
-                        raise ParseError(
-                            f"Identifyer already defined: {identifyer}")
-                    else:
-                        self.variables[identifyer] = number
-
-                case "include_keyword":
-                    path = pathlib.Path(expect("string_literal").value)
+            try:
+                match token.type:
+                    # case "line_comment" | "inline_comment" | "whitespace":
+                    # These are handled by returning None in lextokens
+                    # functions.
 
-                    if path.is_absolute():
-                        inpath = path
-                    else: # Check for path relative to the current input file.
+                    case "name_keyword":
                         location = token.get_location()
-                        inpath = pathlib.Path(location.filepath.parent, path)
-                        if not inpath.exists():
-                            # Try to find the file to be included along the
-                            # input path.
-                            for ip in include_paths:
-                                inpath = pathlib.Path(ip, path)
-                                if inpath.exists:
-                                    break
-
-                    tokens = itertools.chain(tokens_from(inpath.open()), tokens)
-
-                case "identifyer" | "number_literal":
-                    cv = parse_number(token)
-                    expect("walrus")
-                    value = expect_number()
-
-                    if cv in cvs:
-                        setting = cvs[cv]
-                        raise ParseError(f"CV {cv} already set to "
-                                         f"{setting.value} at "
-                                         f"{setting.location}")
-                    else:
-                        cvs[cv] = Setting(value, token.get_location())
-
-                case _:
-                    ic(token)
-
-        return dict([(cv, setting.value) for cv, setting in cvs.items()])
+                        number = expect_number()
+                        identifyer = expect("identifyer").value
+
+                        if identifyer in self.variables:
+                            raise ParseError(
+                                f"Identifyer already defined: {identifyer}",
+                                location=location)
+                        else:
+                            self.variables[identifyer] = number
+                            self.definitions[identifyer] = location
+
+                    case "include_keyword":
+                        path = pathlib.Path(expect("string_literal").value)
+
+                        if path.is_absolute():
+                            inpath = path
+                        else:
+                            # Check for path relative to the current input
+                            # file.
+                            location = token.get_location()
+                            if location.filepath is None:
+                                inpath = None
+                            else:
+                                inpath = pathlib.Path(location.filepath.parent,
+                                                      path)
+
+                            if inpath is None or not inpath.exists():
+                                # Try to find the file to be included along the
+                                # input path.
+                                for ip in include_paths:
+                                    inpath = pathlib.Path(ip, path)
+                                    if inpath.exists():
+                                        break
+
+                        if not inpath.is_file():
+                            raise ParseError(f"Can’t find included file "
+                                             f"“{path}”.",
+                                             location=token.get_location())
+
+                        parsed = include(inpath)
+                        if parsed is None:
+                            tokens = itertools.chain(
+                                tokens_from(inpath.open()), tokens)
+                        else:
+                            for cv, setting in parsed.settings.items():
+                                yield set_cv(cv, setting)
+
+                    case "identifyer" | "number_literal":
+                        cv = parse_number(token)
+                        expect("walrus")
+                        value = expect_number()
+
+                        yield set_cv(cv, Setting(value, token.get_location()))
+
+                    case _:
+                        ic(token)
+            except StopIteration:
+                error = ParseError("Unexpected end of input.",
+                                   location=last.get_location())
+                if errors is None:
+                    raise error
+                else:
+                    errors.append(error)
+                    break
+            except LoconfError as error:
+                if errors is None:
+                    raise
+                else:
+                    errors.append(error)
+                    resynchronize()
+                    resynchronized = True
 
 def parse_file(fp):
     parser = Parser()
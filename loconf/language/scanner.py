@@ -0,0 +1,122 @@
+"""
+A tokenizer for .loconf files that does without ply. It compiles the
+rules from lextokens into a single regular expression in the order
+ply would try them and converts matches using a table keyed on the
+token type. Used by the parser’s “fast” backend.
+"""
+
+import re, types, collections
+
+from . import lextokens
+from .exceptions import LineIndex, SyntaxError
+
+class Token(collections.namedtuple("Token", ("type", "value", "lexpos",
+                                             "line_index",))):
+    """
+    The parser’s view of a token, produced by both of its backends.
+    """
+    __slots__ = ()
+
+    def get_location(self):
+        return self.line_index.location(self.lexpos)
+
+def rules():
+    """
+    Return (token type, regex) pairs in the order ply tries them:
+    function rules by line number, then string rules by decreasing
+    length of their regular expression.
+    """
+    functions, strings = [], []
+    for name in dir(lextokens):
+        if not name.startswith("t_") or name == "t_error":
+            continue
+
+        rule = getattr(lextokens, name)
+        if isinstance(rule, types.FunctionType):
+            functions.append( (rule.__code__.co_firstlineno,
+                               name[2:], rule.__doc__,) )
+        else:
+            strings.append( (name[2:], rule,) )
+
+    functions.sort()
+    strings.sort(key=lambda rule: len(rule[1]), reverse=True)
+
+    return [ (name, regex,) for (lineno, name, regex) in functions ] + strings
+
+master_re = re.compile("|".join([ f"(?P<{name}>{regex})"
+                                  for (name, regex) in rules() ]))
+
+keywords = { "name": ( "name_keyword", "name", ),
+             "include": ( "include_keyword", "include", ),
+             "NULL": ( "number_literal", None, ), }
+
+def identifyer(match):
+    value = match.group()
+    return keywords.get(value, ( "identifyer", value, ))
+
+def number_literal(match):
+    NULL, HEX, OCT, BIN, DEC = match.group("NULL", "HEX", "OCT", "BIN", "DEC")
+    if NULL is not None:
+        value = None
+    elif HEX is not None:
+        value = int(HEX, 16)
+    elif OCT is not None:
+        value = int(OCT, 8)
+    elif BIN is not None:
+        value = int(BIN, 2)
+    else:
+        value = int(DEC)
+
+    return ( "number_literal", value, )
+
+def string_literal(match):
+    return ( "string_literal",
+             match.group("double_quoted_string")
+             or match.group("single_quoted_string"), )
+
+# Maps token types to functions returning a ( type, value, ) pair from
+# a match. Tokens mapped to None are skipped, the ones not in here
+# are returned with the matched text as value.
+converters = { "identifyer": identifyer,
+               "number_literal": number_literal,
+               "string_literal": string_literal,
+               "line_comment": None,
+               "inline_comment": None,
+               "whitespace": None, }
+
+def scan(source:str, line_index:LineIndex=None, errors:list=None):
+    """
+    Yield Tokens for “source”. Raises SyntaxError for characters no
+    rule matches, with the same message ply would use. If “errors” is
+    a list, the SyntaxError is appended to it instead and the
+    character skipped.
+    """
+    if line_index is None:
+        line_index = LineIndex(source)
+
+    match = master_re.match
+    new = tuple.__new__
+    end = len(source)
+    lexpos = 0
+    while lexpos < end:
+        m = match(source, lexpos)
+        if m is None:
+            error = SyntaxError(f"Scanning error. Illegal character "
+                                f"'{source[lexpos]}'",
+                                location=line_index.location(lexpos))
+            if errors is None:
+                raise error
+            else:
+                errors.append(error)
+                lexpos += 1
+                continue
+
+        type = m.lastgroup
+        if type in converters:
+            convert = converters[type]
+            if convert is not None:
+                yield new(Token, convert(m) + ( lexpos, line_index, ))
+        else:
+            yield new(Token, ( type, m.group(), lexpos, line_index, ))
+
+        lexpos = m.end()
@@ -0,0 +1,53 @@
+import dataclasses
+
+from .exceptions import Location
+
+@dataclasses.dataclass
+class SymbolIndex:
+    """
+    The names defined by a .loconf file and the files it includes,
+    indexed for lookups in both directions. Several names may be
+    defined for one value (say, “name NULL None” and “name NULL NaN”).
+
+    • values: name → value
+    • names: value → list of names in order of definition
+    • locations: name → Location of the “name” statement
+    """
+    values: dict
+    names: dict
+    locations: dict
+
+    @classmethod
+    def from_definitions(cls, values:dict, locations:dict):
+        names = {}
+        for name, value in values.items():
+            names.setdefault(value, []).append(name)
+
+        return cls(dict(values), names, dict(locations))
+
+    def value(self, name:str) -> int|None:
+        return self.values[name]
+
+    def names_for(self, value:int|None) -> list:
+        return self.names.get(value, [])
+
+    def location(self, name:str) -> Location|None:
+        return self.locations.get(name, None)
+
+    def as_dict(self) -> dict:
+        """
+        Return a JSON serializable representation.
+        """
+        def location(location):
+            if location is None:
+                return None
+            else:
+                if location.filepath is None:
+                    filepath = None
+                else:
+                    filepath = str(location.filepath)
+                return { "file": filepath, "lineno": location.lineno, }
+
+        return { name: { "value": value,
+                         "location": location(self.location(name)), }
+                 for name, value in self.values.items() }
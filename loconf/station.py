@@ -3,4 +3,22 @@ class StationException(Exception):
         self.command = command
 
 class Station(object):
-    pass
+    # A dccex.timing.TimingPolicy for stations that time their commands.
+    timing = None
+
+    def readcvs_many(self, cvs):
+        """
+        Read the CVs in “cvs” and yield ( cv, value, ) pairs. Stations
+        that can have several reads in flight override this.
+        """
+        for cv in cvs:
+            yield cv, self.readcv(cv)
+
+    def verifycvs_many(self, cvs:dict):
+        """
+        Check the CVs on the decoder against the values in “cvs”
+        (mapping CV numbers to values) and yield ( cv, actual value, )
+        pairs. Stations that can verify faster than they read override
+        this.
+        """
+        return self.readcvs_many(cvs.keys())
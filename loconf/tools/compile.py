@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+Parse a number of .loconf files and output the resulting CV values
+and any errors found as JSON or CSV. Optionally write a binary CV
+image next to each file for writecvs to use.
+"""
+
+import sys, os, argparse, pathlib, json, csv, glob, functools
+import concurrent.futures
+
+from ..language.parser import Parser
+from ..language.exceptions import LoconfError
+from ..language.image import write_image, image_path
+from . import common_args
+
+def find_infiles(specs):
+    """
+    Yield the .loconf files in the directories or matching the glob
+    patterns in “specs”.
+    """
+    for spec in specs:
+        path = pathlib.Path(spec)
+        if path.is_dir():
+            yield from sorted(path.glob("**/*.loconf"))
+        elif path.is_file():
+            yield path
+        else:
+            for s in sorted(glob.glob(spec, recursive=True)):
+                yield pathlib.Path(s)
+
+def error_info(error:Exception):
+    if isinstance(error, LoconfError):
+        location = error.location
+        return { "message": error.message,
+                 "file": str(location.filepath) \
+                     if location and location.filepath else None,
+                 "lineno": error.lineno,
+                 "looking_at": error.looking_at, }
+    else:
+        return { "message": str(error),
+                 "file": None,
+                 "lineno": None,
+                 "looking_at": None, }
+
+def compile_file(path:pathlib.Path, include_paths=[], binary=False,
+                 all_errors=False):
+    """
+    Parse the file at “path” and return a pair of the CV dict (None
+    on error) and a list of dicts describing the errors. With
+    “all_errors” set, parsing continues after errors and the CVs that
+    could be parsed are returned along with all of them. If “binary”
+    is set, also write the CVs to a binary image file if there are no
+    errors. Run in the worker processes, which keep their own include
+    cache so that shared include files are parsed only once per worker.
+    """
+    try:
+        parser = Parser(include_paths)
+        with path.open() as infile:
+            if all_errors:
+                cvs, errors = parser.parse_recovering(infile)
+            else:
+                cvs, errors = parser.parse(infile), []
+
+        if binary and not errors:
+            with image_path(path).open("wb") as fp:
+                write_image(cvs, parser.digests, fp)
+
+        return cvs, [ error_info(error) for error in errors ]
+    except (LoconfError, OSError, ValueError) as error:
+        return None, [ error_info(error), ]
+
+def compile_files(paths, include_paths=[], jobs=None, binary=False,
+                  all_errors=False):
+    """
+    Parse the .loconf files in “paths” in a pool of “jobs” worker
+    processes, looking for included files along “include_paths”.
+    If “binary” is set, write a CV image next to each file. If
+    “all_errors” is set, report all errors in each file rather than
+    just the first one. Returns a pair of dicts mapping the file paths
+    to their CV dicts and lists of error information, respectively.
+    """
+    cvs, errors = {}, {}
+
+    paths = list(paths)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (jobs * 4))
+
+    compile = functools.partial(compile_file, include_paths=include_paths,
+                                binary=binary, all_errors=all_errors)
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        results = executor.map(compile, paths, chunksize=chunksize)
+        for path, (result, file_errors) in zip(paths, results):
+            if result is not None:
+                cvs[str(path)] = result
+            if file_errors:
+                errors[str(path)] = file_errors
+
+    return cvs, errors
+
+def write_json(cvs, errors, outfile):
+    json.dump({ "cvs": cvs, "errors": errors, }, outfile, indent=2)
+    print(file=outfile)
+
+def write_csv(cvs, errors, outfile):
+    writer = csv.writer(outfile)
+    writer.writerow(["file", "cv", "value", "error", "lineno"])
+    for path, settings in cvs.items():
+        for cv, value in sorted(settings.items()):
+            writer.writerow([path, cv, value, "", ""])
+    for path, file_errors in errors.items():
+        for error in file_errors:
+            writer.writerow([path, "", "", error["message"], error["lineno"]])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common_args.add_debug(parser, com=False, sql=False)
+    parser.add_argument("-I", "--include-path", type=pathlib.Path,
+                        action="append", default=[], dest="include_paths",
+                        help="Look for included files in this directory. "
+                        "May be used multiple times.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of worker processes. Defaults to the "
+                        "number of CPUs.")
+    parser.add_argument("-f", "--format", choices=["json", "csv"],
+                        default="json", help="Output format. "
+                        "Defaults to json.")
+    parser.add_argument("-o", "--outfile", type=argparse.FileType('w'),
+                        default=sys.stdout, help="Output file. "
+                        "Defaults to stdout.")
+    parser.add_argument("-b", "--binary", default=False, action="store_true",
+                        help="Write a binary CV image (.cvimg) next to "
+                        "each file parsed successfully. writecvs will use "
+                        "it as long as none of the sources changes.")
+    parser.add_argument("-a", "--all-errors", default=False,
+                        action="store_true",
+                        help="Don’t stop at the first error in a file but "
+                        "continue with the next statement and report all "
+                        "errors along with the CVs that could be parsed.")
+    parser.add_argument("infiles", nargs="+",
+                        help="Directories (searched recursively) or glob "
+                        "patterns of .loconf files to compile.")
+
+    args = parser.parse_args()
+    common_args.set_debug_config(args)
+
+    paths = list(find_infiles(args.infiles))
+    if not paths:
+        parser.error("No .loconf files found.")
+
+    include_paths = [ p.absolute() for p in args.include_paths ]
+    cvs, errors = compile_files(paths, include_paths, args.jobs,
+                                args.binary, args.all_errors)
+
+    if args.format == "json":
+        write_json(cvs, errors, args.outfile)
+    else:
+        write_csv(cvs, errors, args.outfile)
+
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,18 @@
 Read CVs from the locomotive currently on the programming track.
 """
 
-import sys, argparse, datetime, re
+import sys, argparse, datetime, re, pathlib
 
 from sqlclasses import sql
 from tabulate import tabulate
 
 from .. import config, debug
 from ..utils import ( VehicleIdentifyer, print_vehicle_table,
-                      verify_vehicle, CabAddressMismatch, )
+                      verify_vehicle, CabAddressMismatch, read_names_file,
+                      latency_profile, )
 from ..language import parse_file as parse_loconf_file
+from ..language.parser import Parser
+from ..language import image
 from ..station import StationException
 from ..database.controllers import store_cvs, get_all_cvs, query_vehicles
 from ..model import Vehicle
@@ -58,20 +61,20 @@ def readcvs(args):
 
     to_be_stored = {}
     try:
-        for cv in cvs:
-            debug("Reading CV", cv, end=" ")
-            value = config.station.readcv(cv)
+        with latency_profile(args.vehicle):
+            for cv, value in config.station.readcvs_many(cvs):
+                debug("Read CV", cv, end=" ")
 
-            if cv in names:
-                left_hand = names[cv]
-            else:
-                left_hand = cv
+                if cv in names:
+                    left_hand = names[cv]
+                else:
+                    left_hand = cv
 
-            debug(left_hand, ":=", value, color="light_grey")
+                debug(left_hand, ":=", value, color="light_grey")
 
-            print(left_hand, ":=", value, file=args.outfile)
+                print(left_hand, ":=", value, file=args.outfile)
 
-            to_be_stored[cv] = value
+                to_be_stored[cv] = value
     except StationException:
         raise
     finally:
@@ -81,8 +84,16 @@ def readcvs(args):
                       args.revision_comment)
 
 def writecvs(args):
-    # Get the CV revision to be written from the input file.
-    file_cvs = parse_loconf_file(args.infile)
+    if args.stream:
+        return writecvs_streaming(args)
+
+    # Get the CV revision to be written from the input file or from
+    # an up to date image compiled from it.
+    file_cvs = image.load_current(pathlib.Path(args.infile.name))
+    if file_cvs is None:
+        file_cvs = parse_loconf_file(args.infile)
+    else:
+        debug(f"Using {image.image_path(pathlib.Path(args.infile.name))}.")
 
     # Retrieve the current set of CVs from the database.
     if args.all:
@@ -102,6 +113,9 @@ def writecvs(args):
                        for cv, value in write_cvs.items()
                        if value is not None ])
 
+    if args.sync:
+        return writecvs_sync(args, file_cvs, db_cvs, len(write_cvs))
+
     if len(write_cvs) == 0:
         print("No changed CVs found. Input file is identical to latest "
               "database revision.", file=sys.stderr)
@@ -110,18 +124,112 @@ def writecvs(args):
 
         # Write phase.
         to_be_stored = {}
+        try:
+            with latency_profile(args.vehicle):
+                for cv, value in write_cvs.items():
+                    debug(cv, ":=", value, color="light_grey")
+                    config.station.writecv(cv, value)
+                    to_be_stored[cv] = value
+        except StationException:
+            raise
+        finally:
+            if not args.dont_update:
+                store_cvs(args.vehicle, to_be_stored,
+                          args.revision_comment)
+
+
+def writecvs_sync(args, file_cvs, db_cvs, db_diff_count):
+    """
+    Like writecvs() but check the CVs on the decoder rather than
+    trusting the database and only write those that differ from the
+    input file, verifying each write. “db_diff_count” is the number
+    of writes the database would have called for.
+    """
+    wanted = dict([ (cv, value)
+                    for cv, value in file_cvs.items()
+                    if value is not None ])
+
+    verify_vehicle(args.vehicle)
+
+    with latency_profile(args.vehicle):
+        debug(f"Checking {len(wanted)} CVs on the decoder…")
+        decoder_cvs = dict(config.station.verifycvs_many(wanted))
+
+        write_cvs = dict([ (cv, value)
+                           for cv, value in wanted.items()
+                           if decoder_cvs[cv] != value ])
+
+        failed = []
         try:
             for cv, value in write_cvs.items():
                 debug(cv, ":=", value, color="light_grey")
                 config.station.writecv(cv, value)
-                to_be_stored[cv] = value
+                decoder_cvs[cv] = value
+
+            for cv, value in config.station.verifycvs_many(write_cvs):
+                decoder_cvs[cv] = value
+                if value != write_cvs[cv]:
+                    failed.append(cv)
         except StationException:
             raise
         finally:
+            # Bring the database up to date with what is on the decoder.
             if not args.dont_update:
-                store_cvs(args.vehicle, to_be_stored,
+                store_cvs(args.vehicle,
+                          dict([ (cv, value)
+                                 for cv, value in decoder_cvs.items()
+                                 if db_cvs.get(cv, None) != value ]),
                           args.revision_comment)
 
+    # The decoder may have drifted from the database either way.
+    saved = db_diff_count - len(write_cvs)
+    if saved >= 0:
+        compared = f"{saved} writes saved compared to the database"
+    else:
+        compared = f"{-saved} more than the database predicted"
+    print(f"{len(wanted)} CVs checked, {len(write_cvs)} written, "
+          f"{compared}.", file=sys.stderr)
+
+    for cv in failed:
+        print(f"CV {cv} is {decoder_cvs[cv]} after writing "
+              f"{write_cvs[cv]}.", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+def writecvs_streaming(args):
+    """
+    Like writecvs() but write each CV as soon as its assignment has
+    been read from the input file, which may be a pipe.
+    """
+    if args.all:
+        db_cvs = {}
+    else:
+        db_cvs = get_all_cvs(args.vehicle)
+
+    verify_vehicle(args.vehicle)
+
+    to_be_stored = {}
+    try:
+        with latency_profile(args.vehicle):
+            for cv, setting in Parser().iter_settings(args.infile,
+                                                      streaming=True):
+                value = setting.value
+                if value is None or db_cvs.get(cv, None) == value:
+                    continue
+
+                debug(cv, ":=", value, color="light_grey")
+                config.station.writecv(cv, value)
+                to_be_stored[cv] = value
+    except StationException:
+        raise
+    finally:
+        if not args.dont_update:
+            store_cvs(args.vehicle, to_be_stored,
+                      args.revision_comment)
+
+    if len(to_be_stored) == 0:
+        print("No changed CVs found. Input file is identical to latest "
+              "database revision.", file=sys.stderr)
 
 def listrevs(args):
     pass
@@ -207,6 +315,16 @@ def main():
                     help="Write all values from the loconf file to the "
                     "decoder even if they are identical to the ones in the "
                     "database.")
+    mode = cp.add_mutually_exclusive_group()
+    mode.add_argument("-S", "--stream", default=False, action="store_true",
+                      help="Write each CV as soon as it has been read from "
+                      "the input file rather than parsing all of it first. "
+                      "Useful when reading from a pipe.")
+    mode.add_argument("--sync", default=False, action="store_true",
+                      help="Check the CVs on the decoder and only write "
+                      "the ones that differ from the input file, verifying "
+                      "each write. Useful if the database may be out of "
+                      "date.")
 
     cp = subparsers.add_parser("readcab",
                                help="Read the decoder (“cab”) address or the "
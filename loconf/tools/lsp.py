@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+"""
+A Language Server Protocol server for .loconf files on stdin/stdout,
+providing diagnostics, hover, completion and go-to-definition.
+"""
+
+import sys, re, json, pathlib, dataclasses, argparse
+import urllib.parse
+
+from ..language.parser import Parser
+from ..language.exceptions import LoconfError
+from . import common_args
+
+def read_message(fp):
+    """
+    Read one JSON-RPC message from binary file “fp”. Returns None
+    at EOF.
+    """
+    headers = {}
+    while True:
+        line = fp.readline()
+        if not line:
+            return None
+
+        line = line.decode("ascii").strip()
+        if line == "":
+            break
+
+        name, value = line.split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers["content-length"])
+    return json.loads(fp.read(length).decode("utf-8"))
+
+def write_message(fp, message:dict):
+    body = json.dumps(message).encode("utf-8")
+    fp.write(b"Content-Length: %i\r\n\r\n" % len(body))
+    fp.write(body)
+    fp.flush()
+
+def path_from_uri(uri:str) -> pathlib.Path:
+    return pathlib.Path(urllib.parse.unquote(urllib.parse.urlparse(uri).path))
+
+identifyer_re = re.compile(r"[^\d\W]\w*")
+def identifyer_at(line:str, character:int) -> str|None:
+    for match in identifyer_re.finditer(line):
+        if match.start() <= character <= match.end():
+            return match.group()
+    return None
+
+class Lines(object):
+    """
+    A named iterable of lines the parser reads in streaming mode. The
+    editor’s buffer isn’t what is on disk, so the parser doesn’t hash
+    the file by that name.
+    """
+    digest = None
+
+    def __init__(self, lines, name):
+        self._lines = lines
+        self.name = name
+
+    def __iter__(self):
+        return self._lines
+
+@dataclasses.dataclass
+class Checkpoint:
+    """
+    The parser’s state before a line that starts with a statement.
+    """
+    variables: dict
+    definitions: dict
+    digests: dict
+    cvs: dict
+    errors: list
+
+class Document(object):
+    """
+    A .loconf file open in the editor. The parser’s state is saved at
+    the statement boundaries it reports, at lines starting with a
+    statement at least “checkpoint_distance” lines apart, so that
+    after an edit only the statements from the last checkpoint before
+    the change need to be parsed again. Included files come from the
+    include cache.
+    """
+    checkpoint_distance = 32
+
+    def __init__(self, uri:str, text:str, include_paths=[]):
+        self.uri = uri
+        self.path = path_from_uri(uri)
+        self.include_paths = include_paths
+        self.lines = text.splitlines(keepends=True)
+
+        self.checkpoints = {}
+        self.cvs = {}
+        self.symbols = None
+        self.errors = []
+
+        self.parse(0)
+
+    def apply_change(self, change:dict) -> int:
+        """
+        Apply a TextDocumentContentChangeEvent and return the index of
+        the first line affected.
+        """
+        if "range" not in change:
+            self.lines = change["text"].splitlines(keepends=True)
+            return 0
+
+        start, end = change["range"]["start"], change["range"]["end"]
+        before = "".join(self.lines[start["line"]:start["line"]+1])
+        after = "".join(self.lines[end["line"]:end["line"]+1])
+
+        text = ( before[:start["character"]]
+                 + change["text"]
+                 + after[end["character"]:] )
+
+        self.lines[start["line"]:end["line"]+1] = \
+            text.splitlines(keepends=True)
+
+        return start["line"]
+
+    def parse(self, changed_line:int):
+        start = max([ b for b in self.checkpoints.keys()
+                      if b <= changed_line ], default=0)
+        self.checkpoints = dict([ (b, c) for (b, c) in self.checkpoints.items()
+                                  if b <= start ])
+
+        checkpoint = self.checkpoints.get(start, None)
+        if checkpoint is None:
+            start = 0
+            checkpoint = Checkpoint({}, {}, {}, {}, [])
+
+        parser = Parser(self.include_paths, backend="fast")
+        parser.variables = dict(checkpoint.variables)
+        parser.definitions = dict(checkpoint.definitions)
+        parser.digests = dict([ (path, digest)
+                                for (path, digest)
+                                in checkpoint.digests.items()
+                                if path != self.path ])
+        cvs = dict(checkpoint.cvs)
+        self.errors = list(checkpoint.errors)
+
+        last = start
+        def statement_start(token):
+            nonlocal last
+
+            location = token.get_location()
+            if location.filepath != self.path:
+                return # In an included file
+
+            index = location.lineno - 1
+            if index - last >= self.checkpoint_distance \
+               and self.lines[index][:token.lexpos].strip() == "":
+                self.checkpoints[index] = Checkpoint(
+                    dict(parser.variables), dict(parser.definitions),
+                    dict(parser.digests), dict(cvs), list(self.errors))
+                last = index
+
+        source = Lines(iter(self.lines[start:]), str(self.path))
+
+        try:
+            for cv, setting in parser.iter_settings(
+                    source, streaming=True, cvs=cvs, first_lineno=start+1,
+                    errors=self.errors, statement_start=statement_start):
+                pass
+        except (LoconfError, OSError, ValueError) as error:
+            self.errors.append(error)
+
+        self.cvs = cvs
+        self.symbols = parser.symbols
+
+    def update(self, changes:list):
+        changed_line = min([ self.apply_change(change)
+                             for change in changes ], default=0)
+        self.parse(changed_line)
+
+    def diagnostics(self) -> list:
+        ret = []
+        for error in self.errors:
+            if isinstance(error, LoconfError):
+                message = error.message
+                location = error.location
+            else:
+                message = str(error)
+                location = None
+
+            if location is not None \
+               and (location.filepath is None
+                    or location.filepath.absolute() == self.path):
+                line = location.lineno - 1
+            else:
+                line = 0
+                if location is not None:
+                    message += f" (In {location.filepath.name}:" \
+                        f"{location.lineno})"
+
+            ret.append({ "range": { "start": { "line": line,
+                                               "character": 0, },
+                                    "end": { "line": line + 1,
+                                             "character": 0, }, },
+                         "severity": 1,
+                         "source": "loconf",
+                         "message": message, })
+        return ret
+
+    def identifyer_at(self, position:dict) -> str|None:
+        if position["line"] >= len(self.lines):
+            return None
+        return identifyer_at(self.lines[position["line"]],
+                             position["character"])
+
+class LanguageServer(object):
+    def __init__(self, infile, outfile, include_paths=[]):
+        self.infile = infile
+        self.outfile = outfile
+        self.include_paths = include_paths
+        self.documents = {}
+        self.shutdown_requested = False
+
+        self.handlers = {
+            "initialize": self.initialize,
+            "initialized": None,
+            "shutdown": self.shutdown,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didClose": self.did_close,
+            "textDocument/hover": self.hover,
+            "textDocument/completion": self.completion,
+            "textDocument/definition": self.definition, }
+
+    def run(self) -> int:
+        while True:
+            message = read_message(self.infile)
+            if message is None or message.get("method") == "exit":
+                return 0 if self.shutdown_requested else 1
+
+            self.dispatch(message)
+
+    def dispatch(self, message:dict):
+        method = message.get("method", None)
+        id = message.get("id", None)
+
+        if method not in self.handlers:
+            if id is not None:
+                self.send({ "id": id,
+                            "error": { "code": -32601,
+                                       "message": f"Unknown method "
+                                       f"“{method}”", }, })
+            return
+
+        handler = self.handlers[method]
+        result = None
+        if handler is not None:
+            result = handler(message.get("params", {}))
+
+        if id is not None:
+            self.send({ "id": id, "result": result, })
+
+    def send(self, message:dict):
+        message["jsonrpc"] = "2.0"
+        write_message(self.outfile, message)
+
+    def publish_diagnostics(self, document:Document):
+        self.send({ "method": "textDocument/publishDiagnostics",
+                    "params": { "uri": document.uri,
+                                "diagnostics": document.diagnostics(), }, })
+
+    def initialize(self, params):
+        return { "capabilities": { "textDocumentSync": 2, # Incremental
+                                   "hoverProvider": True,
+                                   "completionProvider": {},
+                                   "definitionProvider": True, },
+                 "serverInfo": { "name": "loconf-lsp", }, }
+
+    def shutdown(self, params):
+        self.shutdown_requested = True
+        return None
+
+    def did_open(self, params):
+        item = params["textDocument"]
+        document = Document(item["uri"], item["text"], self.include_paths)
+        self.documents[item["uri"]] = document
+        self.publish_diagnostics(document)
+
+    def did_change(self, params):
+        document = self.documents[params["textDocument"]["uri"]]
+        document.update(params["contentChanges"])
+        self.publish_diagnostics(document)
+
+    def did_close(self, params):
+        self.documents.pop(params["textDocument"]["uri"], None)
+
+    def hover(self, params):
+        document = self.documents[params["textDocument"]["uri"]]
+        name = document.identifyer_at(params["position"])
+        if name is None or name not in document.symbols.values:
+            return None
+
+        value = document.symbols.value(name)
+        text = f"**{name}** = {value}"
+        if value in document.cvs:
+            text += f"\n\nCV {value} := {document.cvs[value].value}"
+
+        return { "contents": { "kind": "markdown", "value": text, }, }
+
+    def completion(self, params):
+        document = self.documents[params["textDocument"]["uri"]]
+        return [ { "label": name,
+                   "kind": 21, # Constant
+                   "detail": str(value), }
+                 for name, value in document.symbols.values.items() ]
+
+    def definition(self, params):
+        document = self.documents[params["textDocument"]["uri"]]
+        name = document.identifyer_at(params["position"])
+        if name is None:
+            return None
+
+        location = document.symbols.location(name)
+        if location is None or location.filepath is None:
+            return None
+
+        line = location.lineno - 1
+        return { "uri": location.filepath.resolve().as_uri(),
+                 "range": { "start": { "line": line, "character": 0, },
+                            "end": { "line": line + 1, "character": 0, }, }, }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common_args.add_debug(parser, com=False, sql=False)
+    parser.add_argument("-I", "--include-path", type=pathlib.Path,
+                        action="append", default=[], dest="include_paths",
+                        help="Look for included files in this directory. "
+                        "May be used multiple times.")
+    args = parser.parse_args()
+    common_args.set_debug_config(args)
+
+    include_paths = [ p.absolute() for p in args.include_paths ]
+    server = LanguageServer(sys.stdin.buffer, sys.stdout.buffer, include_paths)
+    sys.exit(server.run())
+
+if __name__ == "__main__":
+    main()
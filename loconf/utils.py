@@ -1,14 +1,25 @@
-import re
+import re, pathlib, contextlib
 from tabulate import tabulate
 
 from . import config, debug
+from .station import StationException
 from .language.parser import Parser
 
 def read_names_file(fp):
+    """
+    Return a dict mapping values to the last name defined for them in
+    the .loconf file “fp”.
+    """
     parser = Parser()
-    parser.parse(fp)
-    return dict( [(value, name,)
-                  for (name, value) in parser.variables.items()] )
+    path = pathlib.Path(getattr(fp, "name", ""))
+    if path.is_file():
+        symbols = parser.parse_cached(path).symbols
+    else:
+        parser.parse(fp)
+        symbols = parser.symbols
+
+    return dict( [(value, names[-1],)
+                  for (value, names) in symbols.names.items()] )
 
 class VehicleIdentifyerParseError(Exception):
     pass
@@ -92,3 +103,48 @@ def verify_vehicle(vehicle):
                                  f"address {found_cab}!")
     else:
         debug("verified!", color="green")
+
+def identify_decoder(vehicle) -> str|None:
+    """
+    Return “manufacturer/version” (CV 8 and CV 7) of the decoder of
+    “vehicle”, which is on the programming track. The values are taken
+    from the database and only read from the decoder if they aren’t
+    known. Return None if reading them fails.
+    """
+    from .database.controllers import get_all_cvs
+
+    cvs = get_all_cvs(vehicle, cvs=( 7, 8, ))
+    try:
+        for cv in ( 8, 7, ):
+            if cvs.get(cv, None) is None:
+                cvs[cv] = config.station.readcv(cv)
+    except StationException as error:
+        debug(f"Can’t identify the decoder ({error.__class__.__name__}).",
+              color="yellow")
+        return None
+
+    return f"{cvs[8]}/{cvs[7]}"
+
+@contextlib.contextmanager
+def latency_profile(vehicle):
+    """
+    Have the station use the latency profile of the decoder of
+    “vehicle”, which is on the programming track, and store what it
+    has learned about the decoder on exit. Without a decoder known,
+    the station starts from its default timeouts.
+    """
+    timing = config.station.timing
+    if timing is None:
+        yield
+        return
+
+    decoder = identify_decoder(vehicle)
+    if decoder is None:
+        yield
+        return
+
+    timing.load_profile(config.latency_profiles.get(decoder))
+    try:
+        yield
+    finally:
+        config.latency_profiles.learn(decoder, timing.learned_profile())
@@ -0,0 +1,28 @@
+-- Add the current_value table to a database created before it was
+-- part of postgres.sql and fill it with the latest value of each CV
+-- from the revision history.
+--
+--   psql -f sql/migrate_current_value.sql <database>
+
+BEGIN;
+
+CREATE TABLE current_value
+(
+   address INTEGER NOT NULL,
+   vehicle_id TEXT NOT NULL,
+   cv SMALLINT NOT NULL,
+   value SMALLINT NOT NULL,
+   revision_id INTEGER NOT NULL REFERENCES revision,
+
+   PRIMARY KEY (address, vehicle_id, cv),
+   FOREIGN KEY (address, vehicle_id) REFERENCES roster
+);
+
+INSERT INTO current_value (address, vehicle_id, cv, value, revision_id)
+SELECT DISTINCT ON (address, vehicle_id, cv)
+       address, vehicle_id, cv, value, revision_id
+  FROM value
+  JOIN revision ON revision_id = revision.id
+ ORDER BY address, vehicle_id, cv, revision_id DESC;
+
+COMMIT;
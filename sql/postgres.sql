@@ -39,4 +39,20 @@ CREATE TABLE value
    UNIQUE (revision_id, cv)
 );
 
+-- The latest value of each CV on each vehicle, kept up to date by
+-- store_cvs() so looking them up doesn’t have to go through all of
+-- the history. Databases created before it existed are brought up to
+-- date by sql/migrate_current_value.sql.
+CREATE TABLE current_value
+(
+   address INTEGER NOT NULL,
+   vehicle_id TEXT NOT NULL,
+   cv SMALLINT NOT NULL,
+   value SMALLINT NOT NULL,
+   revision_id INTEGER NOT NULL REFERENCES revision,
+
+   PRIMARY KEY (address, vehicle_id, cv),
+   FOREIGN KEY (address, vehicle_id) REFERENCES roster
+);
+
 COMMIT;
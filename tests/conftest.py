@@ -0,0 +1,72 @@
+"""
+A fresh include cache for every test, an SQLite database and a
+simulated command station with a DCCEX_Station talking to it. Tests
+configure the latter with markers:
+
+    @pytest.mark.simulator(cvs={ 1: 3, 29: 6, }, latency=0.002)
+    @pytest.mark.station(retries=10)
+
+“cvs” are the decoder’s CVs, the other arguments are passed on to
+Simulator() and DCCEX_Station(). The station is connected through
+“socket://” unless the “station” fixture is parametrized indirectly
+with "pty".
+"""
+
+import pytest
+
+import loconf
+from loconf.database.connection import SQLiteConnection
+from loconf.language.cache import IncludeCache
+from loconf.dccex.simulator import Simulator, Decoder
+from loconf.dccex.station import DCCEX_Station
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "simulator(cvs=None, **kwargs): "
+                            "arguments for the simulated station")
+    config.addinivalue_line("markers", "station(**kwargs): "
+                            "arguments for DCCEX_Station")
+
+def marker_kwargs(request, name) -> dict:
+    marker = request.node.get_closest_marker(name)
+    if marker is None:
+        return {}
+    else:
+        return dict(marker.kwargs)
+
+@pytest.fixture(autouse=True)
+def include_cache(monkeypatch):
+    # Neither entries from other tests nor pickles from ~/.cache.
+    include_cache = IncludeCache()
+    monkeypatch.setitem(loconf.config.__dict__, "include_cache",
+                        include_cache)
+    return include_cache
+
+@pytest.fixture
+def dbconn(tmp_path, monkeypatch):
+    dbconn = SQLiteConnection(tmp_path / "loconf.sqlite")
+    monkeypatch.setitem(loconf.config.__dict__, "dbconn", dbconn)
+    yield dbconn
+    dbconn.close()
+
+@pytest.fixture
+def simulator(request):
+    kwargs = marker_kwargs(request, "simulator")
+    cvs = kwargs.pop("cvs", None)
+    if cvs is None:
+        decoder = None
+    else:
+        decoder = Decoder(dict(cvs))
+    return Simulator(decoder, **kwargs)
+
+@pytest.fixture
+def station(request, simulator, monkeypatch):
+    monkeypatch.setattr(DCCEX_Station, "settle_time", 0.05)
+
+    if getattr(request, "param", "tcp") == "pty":
+        url = simulator.serve_pty()
+    else:
+        url = simulator.serve_tcp()
+
+    station = DCCEX_Station(url, **marker_kwargs(request, "station"))
+    yield station
+    station.close()
@@ -0,0 +1,76 @@
+import asyncio, re
+import pytest
+
+from loconf.dccex import responses
+from loconf.dccex.async_station import AsyncDCCEX_Station
+from loconf.dccex.station import StationError
+
+async def stand_in(reader, writer):
+    """
+    Answer <R cv> and <W cv value> for a decoder whose CVs are all
+    equal to their number, with a power broadcast before each answer.
+    """
+    cvs = {}
+    writer.write(b"<iDCC-EX V-5.0.0 / STANDALONE>\n")
+    while line := await reader.readline():
+        line = line.decode("ascii").strip()
+        if match := re.fullmatch(r"<R (\d+)>", line):
+            cv = int(match.group(1))
+            await asyncio.sleep(0.01)
+            writer.write(b"<p1>\n")
+            writer.write(b"<v %i %i>\n" % ( cv, cvs.get(cv, cv), ))
+        elif match := re.fullmatch(r"<W (\d+) (\d+)>", line):
+            cv, value = int(match.group(1)), int(match.group(2))
+            cvs[cv] = value
+            writer.write(b"<r %i %i>\n" % ( cv, value, ))
+        else:
+            writer.write(b"<X>\n")
+    writer.close()
+
+async def run(test):
+    servers = [ await asyncio.start_server(stand_in, "127.0.0.1", 0)
+                for i in range(3) ]
+    stations = [ await AsyncDCCEX_Station.connect(
+        "socket://127.0.0.1:%i" % server.sockets[0].getsockname()[1],
+        settle_time=0.05)
+                 for server in servers ]
+    try:
+        await test(stations)
+    finally:
+        for station in stations:
+            await station.close()
+        for server in servers:
+            server.close()
+
+def test_many_stations_on_one_loop():
+    async def test(stations):
+        values = await asyncio.gather(*[ station.readcv(cv)
+                                         for station in stations
+                                         for cv in (1, 2, 3) ])
+        assert values == [ 1, 2, 3, ] * 3
+
+        await stations[0].writecv(3, 42)
+        assert await stations[0].readcv(3) == 42
+        assert await stations[1].readcv(3) == 3
+
+        with pytest.raises(StationError):
+            await stations[2].communicate("<Q>", responses.ReadCV)
+
+    asyncio.run(run(test))
+
+def test_broadcasts():
+    async def test(stations):
+        station = stations[0]
+
+        async def first_broadcast():
+            async for response in station.broadcasts():
+                return response
+
+        task = asyncio.create_task(first_broadcast())
+        await asyncio.sleep(0)
+        await station.readcv(1)
+        response = await task
+        assert isinstance(response, responses.TrackPower)
+        assert response.on
+
+    asyncio.run(run(test))
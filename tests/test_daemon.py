@@ -0,0 +1,116 @@
+import json, socket, threading, time
+from unittest.mock import ANY
+import pytest
+
+from loconf.dccex import responses
+from loconf.dccex.station import ReadFailed
+from loconf.dccex.daemon import StationServer, DaemonStation, ProtocolError
+
+pytestmark = pytest.mark.simulator(cvs={ 1: 3, 2: 10, 29: 6, })
+
+@pytest.fixture
+def daemon(station, tmp_path):
+    server = StationServer(tmp_path / "stationd.sock", station)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+def test_commands(daemon, simulator):
+    station = DaemonStation(daemon.socket_path)
+
+    assert station.readcab() == 3
+    assert station.writecv(2, 11) == 11
+    assert station.readcv(2) == 11
+    assert list(station.readcvs_many([ 1, 2, ])) == [ (1, 3), (2, 11), ]
+    assert dict(station.verifycvs_many({ 2: 11, 29: 0, })) \
+        == { 2: 11, 29: 6, }
+
+    response = station.communicate("<R 29>", responses.ReadCV)
+    assert isinstance(response, responses.ReadCV)
+    assert response.value == 6
+
+    # A second client at the same time.
+    assert DaemonStation(daemon.socket_path).readcv(29) == 6
+
+    simulator.failure_rate = 1.0
+    with pytest.raises(ReadFailed):
+        station.readcv(1)
+
+def test_broadcasts(daemon):
+    station = DaemonStation(daemon.socket_path)
+
+    received = []
+    station.subscribe(received.append)
+    time.sleep(0.05)
+    station.print("<1>")
+
+    for i in range(50):
+        power = [ response for response in received
+                  if isinstance(response, responses.TrackPower) ]
+        if power:
+            break
+        time.sleep(0.01)
+
+    assert power and power[0].on
+
+def test_abandoned_items(daemon):
+    station = DaemonStation(daemon.socket_path)
+
+    items = station.readcvs_many([ 1, 2, 29, ])
+    assert next(items) == (1, 3)
+    del items
+
+    assert station.readcv(29) == 6
+    assert station.readcab() == 3
+
+def test_threads(daemon):
+    station = DaemonStation(daemon.socket_path)
+
+    results = {}
+    def read(cv):
+        results[cv] = [ station.readcv(cv) for i in range(10) ]
+    threads = [ threading.Thread(target=read, args=(cv,))
+                for cv in ( 1, 2, 29, ) ]
+    for thread in threads:
+        thread.start()
+    items = list(station.readcvs_many([ 1, 2, 29, ]))
+    for thread in threads:
+        thread.join()
+
+    assert items == [ (1, 3), (2, 10), (29, 6), ]
+    assert results == { 1: [ 3, ] * 10, 2: [ 10, ] * 10, 29: [ 6, ] * 10, }
+
+def test_bad_requests(daemon):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(str(daemon.socket_path))
+    file = connection.makefile("rwb")
+
+    def request(line:bytes):
+        file.write(line + b"\n")
+        file.flush()
+        return json.loads(file.readline())
+
+    try:
+        for line in ( b"{not json", b"[1, 2]", b"17", ):
+            assert request(line) == { "id": None, "error": {
+                "type": "ProtocolError", "message": ANY, }, }
+
+        reply = request(b'{"id": 1, "method": "nope"}')
+        assert ( reply["id"], reply["error"]["type"], ) \
+            == ( 1, "ProtocolError", )
+
+        reply = request(b'{"id": 2, "method": "readcv", "params": [1, 2]}')
+        assert ( reply["id"], reply["error"]["type"], ) == ( 2, "TypeError", )
+
+        # The connection is still usable.
+        assert request(b'{"id": 3, "method": "readcv", "params": [29]}') \
+            == { "id": 3, "result": 6, }
+    finally:
+        file.close()
+        connection.close()
+
+    with pytest.raises(ProtocolError):
+        DaemonStation(daemon.socket_path).call("nope")
@@ -0,0 +1,173 @@
+import time, datetime, threading
+import pytest
+from psycopg2.pool import PoolError
+
+from loconf.database.connection import PostgresConnection
+from loconf.database.controllers import (
+    create_roster_entry, query_vehicles, vehicle_by_address,
+    vehicle_count_by_address, store_cvs, store_many_cvs, get_all_cvs,
+    get_cv, get_revisions, iter_history, )
+from sqlclasses import sql
+
+@pytest.fixture
+def vehicles(dbconn):
+    create_roster_entry("br01", 3, "", "BR 01")
+    create_roster_entry("wagon1", 5, "a", "Wagon 1")
+    create_roster_entry("wagon2", 5, "b", "Wagon 2")
+    return query_vehicles(sql.where("true"))
+
+def test_roster(vehicles):
+    assert [ vehicle.nickname for vehicle in vehicles ] == [
+        "br01", "wagon1", "wagon2", ]
+    assert vehicle_count_by_address(5) == 2
+    assert vehicle_by_address(5, "b").designation == "Wagon 2"
+
+def test_current_values(vehicles):
+    br01, wagon1, wagon2 = vehicles
+
+    store_cvs(br01, { 1: 3, 2: 10, 3: None, }, "Read")
+    store_cvs(wagon1, { 1: 5, }, "Read")
+    store_cvs(br01, { 2: 11, 29: 6, }, "Changed")
+
+    assert get_all_cvs(br01) == { 1: 3, 2: 11, 29: 6, }
+    assert get_all_cvs(wagon1) == { 1: 5, }
+    assert get_all_cvs(wagon2) == {}
+    assert get_cv(br01, 2) == 11
+    assert get_cv(br01, 3) is None
+
+    assert [ revision.comment for revision in get_revisions(br01) ] == [
+        "Read", "Changed", ]
+
+def test_store_many(vehicles):
+    br01, wagon1, wagon2 = vehicles
+
+    store_many_cvs([ ( br01, { 1: 3, 2: 1, }, "", ),
+                     ( wagon1, { 1: 5, }, "", ),
+                     ( br01, { 2: 2, }, "", ),
+                     ( wagon2, {}, "", ),
+                     ( br01, { 2: 3, 3: 1, }, "", ), ])
+
+    assert get_all_cvs(br01) == { 1: 3, 2: 3, 3: 1, }
+    assert get_all_cvs(wagon1) == { 1: 5, }
+    assert len(get_revisions(br01)) == 3
+    assert len(get_revisions(wagon2)) == 0
+
+def test_revision_ids(dbconn, vehicles):
+    br01, wagon1, wagon2 = vehicles
+
+    assert dbconn.reserve_ids("revision", 3) == [ 1, 2, 3, ]
+    dbconn.rollback()
+
+    store_cvs(br01, { 1: 3, }, "First")
+    store_many_cvs([ ( vehicle, { 2: n, }, f"Dump {n}", )
+                     for n, vehicle in enumerate(vehicles * 3) ])
+
+    revisions = get_revisions(br01)
+    assert [ revision.comment for revision in revisions ] == [
+        "First", "Dump 0", "Dump 3", "Dump 6", ]
+    assert [ revision.id for revision in revisions ] == sorted(
+        [ revision.id for revision in revisions ])
+    assert [ ( row.comment, row.value, )
+             for row in iter_history(wagon2) ] == [
+        ( "Dump 2", 2, ), ( "Dump 5", 5, ), ( "Dump 8", 8, ), ]
+    assert get_all_cvs(wagon1) == { 2: 7, }
+
+def test_failed_store_is_rolled_back(vehicles, dbconn):
+    unknown = vehicles[0].__class__.from_dict({ "address": 99,
+                                                "vehicle_id": "", })
+    with pytest.raises(Exception):
+        store_cvs(unknown, { 1: 99, })
+
+    assert dbconn.query_one("SELECT COUNT(*) FROM value") == 0
+
+def test_streaming(vehicles):
+    br01, wagon1, wagon2 = vehicles
+    store_cvs(br01, { 1: 3, 2: 10, }, "Read")
+    store_cvs(br01, { 2: 11, }, "Changed")
+
+    rows = list(iter_history(br01))
+    assert [ ( row.comment, row.cv, row.value, ) for row in rows ] == [
+        ( "Read", 1, 3, ), ( "Read", 2, 10, ), ( "Changed", 2, 11, ), ]
+    assert isinstance(rows[0], tuple)
+    assert not hasattr(rows[0], "__dict__")
+    assert type(rows[0]) is type(rows[-1])
+
+    streamed = list(br01.__class__.stream(sql.where("address = 5"),
+                                          itersize=1))
+    assert [ vehicle.nickname for vehicle in streamed ] == [
+        "wagon1", "wagon2", ]
+
+def test_timestamps(vehicles, dbconn):
+    br01, wagon1, wagon2 = vehicles
+    store_cvs(br01, { 1: 3, }, "Read")
+
+    ctime = datetime.datetime(2024, 5, 1, 12, 30, 15, 250000)
+    dbconn.execute("INSERT INTO revision (address, vehicle_id, ctime) "
+                   "VALUES (%s, %s, %s)", ( 5, "a", ctime, ))
+    dbconn.commit()
+
+    assert isinstance(get_revisions(br01)[0].ctime, datetime.datetime)
+    assert get_revisions(wagon1)[0].ctime == ctime
+
+class StandInConnection(object):
+    closed = 0
+
+class StandInPool(object):
+    def __init__(self):
+        self.in_use = set()
+
+    def getconn(self):
+        ds = StandInConnection()
+        self.in_use.add(ds)
+        return ds
+
+    def putconn(self, ds, close=False):
+        self.in_use.remove(ds)
+
+@pytest.fixture
+def pooled():
+    dbconn = PostgresConnection({}, pool_max=2, pool_timeout=0.2)
+    dbconn._pool = StandInPool()
+    return dbconn
+
+def test_pool_slots_are_freed_by_threads(pooled):
+    def use():
+        pooled.ds
+    for i in range(5):
+        thread = threading.Thread(target=use)
+        thread.start()
+        thread.join()
+
+    assert pooled._pool.in_use == set()
+
+    pooled.ds
+    with pooled.checkout():
+        pass
+    pooled.release()
+    assert pooled._pool.in_use == set()
+
+def test_pool_timeout(pooled):
+    def hold(event):
+        pooled.ds
+        event.wait()
+
+    events = [ threading.Event(), threading.Event(), ]
+    threads = [ threading.Thread(target=hold, args=(event,))
+                for event in events ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        time.sleep(0.05)
+        with pytest.raises(PoolError):
+            pooled.ds
+
+        events[0].set()
+        threads[0].join()
+        with pooled.checkout():
+            assert len(pooled._pool.in_use) == 2
+    finally:
+        for event in events:
+            event.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,31 @@
+import io, pathlib
+import pytest
+
+from loconf.language.parser import Parser
+from loconf.language import image
+
+def test_image_round_trip(tmp_path):
+    names = tmp_path / "names.loconf"
+    names.write_text("name 29 config\nname NULL null\n")
+    source = tmp_path / "loco.loconf"
+    source.write_text('include "names.loconf"\n'
+                      "config := 6\n1 := 3\n8 := null\n1024 := 0xffff\n")
+
+    parser = Parser()
+    with source.open() as fp:
+        cvs = parser.parse(fp)
+
+    with image.image_path(source).open("wb") as fp:
+        image.write_image(cvs, parser.digests, fp)
+
+    assert image.load_current(source) == cvs
+    assert set(image.CVImage.load(image.image_path(source)).digests) \
+        == { source, names, }
+
+    names.write_text("name 28 config\nname NULL null\n")
+    assert image.load_current(source) is None
+
+def test_image_rejects_cvs_out_of_range():
+    for cvs in ( { 0: 1 }, { 1025: 1 }, { 1: 0x10000 }, ):
+        with pytest.raises(ValueError):
+            image.write_image(cvs, {}, io.BytesIO())
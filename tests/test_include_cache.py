@@ -0,0 +1,109 @@
+import pathlib
+import pytest
+
+from loconf.language.parser import Parser
+from loconf.language.exceptions import ParseError
+from loconf.language.cache import IncludeCache
+
+def write(path:pathlib.Path, source:str):
+    path.write_text(source)
+
+def test_include_is_reparsed_after_edit(tmp_path):
+    names = tmp_path / "names.loconf"
+    write(names, "name 5 speed\n3 := 7\n")
+    top = tmp_path / "top.loconf"
+    write(top, 'include "names.loconf"\nspeed := 100\n')
+
+    with top.open() as fp:
+        assert Parser().parse(fp) == { 3: 7, 5: 100, }
+
+    parsed = Parser().parse_cached(names)
+    assert Parser().parse_cached(names) is parsed
+
+    # Same size, so only the content hash can tell the difference.
+    write(names, "name 6 speed\n3 := 8\n")
+
+    with top.open() as fp:
+        assert Parser().parse(fp) == { 3: 8, 6: 100, }
+
+    assert Parser().parse_cached(names) is not parsed
+
+def test_nested_include_invalidates_outer_entry(tmp_path):
+    write(tmp_path / "inner.loconf", "name 1 address\n")
+    write(tmp_path / "outer.loconf", 'include "inner.loconf"\nname 2 vmin\n')
+    top = tmp_path / "top.loconf"
+    write(top, 'include "outer.loconf"\naddress := 3\nvmin := 4\n')
+
+    with top.open() as fp:
+        assert Parser().parse(fp) == { 1: 3, 2: 4, }
+
+    write(tmp_path / "inner.loconf", "name 9 address\n")
+
+    with top.open() as fp:
+        assert Parser().parse(fp) == { 9: 3, 2: 4, }
+
+def test_include_using_outer_names_is_tokenized_in_place(tmp_path):
+    write(tmp_path / "uses.loconf", "address := 3\n")
+    top = tmp_path / "top.loconf"
+    write(top, 'name 1 address\ninclude "uses.loconf"\n')
+
+    with top.open() as fp:
+        assert Parser().parse(fp) == { 1: 3, }
+
+def test_failure_is_cached(tmp_path, include_cache):
+    uses = tmp_path / "uses.loconf"
+    write(uses, "address := 3\n")
+
+    with pytest.raises(ParseError) as info:
+        Parser().parse_cached(uses)
+    assert include_cache.get(uses, []).error is info.value
+
+    with pytest.raises(ParseError) as again:
+        Parser().parse_cached(uses)
+    assert again.value is info.value
+
+    write(uses, "name 1 address\n")
+    assert Parser().parse_cached(uses).variables == { "address": 1, }
+
+def test_pickled_entries(tmp_path):
+    names = tmp_path / "names.loconf"
+    write(names, "name 5 speed\n")
+
+    cache = IncludeCache(tmp_path / "cache")
+    parsed = Parser().parse_cached(names)
+    cache.put(parsed, [])
+
+    assert IncludeCache(tmp_path / "cache").get(names, []) == parsed
+
+    write(names, "name 6 speed\n")
+    assert IncludeCache(tmp_path / "cache").get(names, []) is None
+
+def test_symbol_index(tmp_path):
+    names = tmp_path / "names.loconf"
+    write(names, "name NULL None\nname 3 Vmin\nname NULL NaN\n")
+    top = tmp_path / "top.loconf"
+    write(top, 'include "names.loconf"\nname 5 Vmax\n')
+
+    parser = Parser()
+    with top.open() as fp:
+        parser.parse(fp)
+
+    symbols = parser.symbols
+    assert symbols.names_for(None) == [ "None", "NaN", ]
+    assert symbols.value("Vmax") == 5
+    assert symbols.location("NaN").lineno == 3
+    assert symbols.location("NaN").filepath == names
+    assert symbols.location("Vmax").filepath == top
+
+    assert Parser().parse_cached(names).symbols.names_for(3) == [ "Vmin", ]
+
+def test_cv_set_in_include_and_including_file(tmp_path):
+    write(tmp_path / "names.loconf", "name 5 speed\n5 := 1\n")
+    top = tmp_path / "top.loconf"
+    write(top, 'include "names.loconf"\nspeed := 100\n')
+
+    with top.open() as fp, pytest.raises(ParseError) as info:
+        Parser().parse(fp)
+    assert ( f"CV 5 already set to 1 at Location(lineno=2, "
+             f"looking_at='5 := 1\\n', "
+             f"filepath={tmp_path / 'names.loconf'!r})" in str(info.value) )
@@ -0,0 +1,93 @@
+import random, pathlib, shutil
+
+from loconf.language import cache, parser
+from loconf.tools.lsp import Document
+
+def document(tmp_path, source):
+    return Document((tmp_path / "test.loconf").as_uri(), source)
+
+def change(line, character, text, end=None):
+    if end is None:
+        end = ( line, character, )
+    return { "range": { "start": { "line": line, "character": character, },
+                        "end": { "line": end[0], "character": end[1], }, },
+             "text": text, }
+
+def test_incremental_reparse_matches_full_parse(tmp_path):
+    lines = [ f"name {cv} cv{cv}\ncv{cv} := {cv % 256}\n"
+              for cv in range(1, 201) ]
+    doc = document(tmp_path, "".join(lines))
+    assert len(doc.checkpoints) > 2
+    assert doc.cvs[200].value == 200 % 256
+
+    doc.update([ change(301, 9, "7", (301, 12)) ])
+    assert doc.errors == []
+    assert doc.cvs[151].value == 7
+    assert doc.cvs[200].value == 200 % 256
+
+    fresh = document(tmp_path, "".join(doc.lines))
+    assert ( { cv: s.value for cv, s in doc.cvs.items() }
+             == { cv: s.value for cv, s in fresh.cvs.items() } )
+
+def test_diagnostics_point_at_error(tmp_path):
+    doc = document(tmp_path, "name 1 a\na := 3\n")
+    assert doc.diagnostics() == []
+
+    doc.update([ change(1, 0, "b", (1, 1)) ])
+    diagnostics = doc.diagnostics()
+    assert len(diagnostics) == 1
+    assert diagnostics[0]["range"]["start"]["line"] == 1
+
+    doc.update([ change(1, 0, "a", (1, 1)) ])
+    assert doc.diagnostics() == []
+
+def test_checkpoints_are_statement_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(Document, "checkpoint_distance", 2)
+
+    # “3” is continued by the name statement, the error is in line 4.
+    doc = document(tmp_path, "1 := 1\n2 := 2\n3\nname 4 four\n"
+                             "5 := 5\n6 := 6\n")
+    assert [ d["range"]["start"]["line"] for d in doc.diagnostics() ] == [ 3, ]
+
+    doc.update([ change(4, 5, "7", (4, 6)) ])
+    assert [ d["range"]["start"]["line"] for d in doc.diagnostics() ] == [ 3, ]
+    assert doc.cvs[5].value == 7
+
+def test_open_document_is_not_read_from_disk(tmp_path, monkeypatch):
+    hashed = []
+    def file_digest(path):
+        hashed.append(path)
+        return cache.file_digest(path)
+    monkeypatch.setattr(parser, "file_digest", file_digest)
+
+    (tmp_path / "names.loconf").write_text("name 1 a\n")
+    doc = document(tmp_path, 'include "names.loconf"\na := 3\n')
+    doc.update([ change(1, 5, "4", (1, 6)) ])
+
+    assert doc.cvs[1].value == 4
+    assert doc.path not in hashed
+    assert tmp_path / "names.loconf" in hashed
+
+def test_random_edits(tmp_path, monkeypatch):
+    monkeypatch.setattr(Document, "checkpoint_distance", 8)
+    for name in ( "switch_commander_100901.loconf", "standard_defs.loconf", ):
+        shutil.copy(pathlib.Path("doc", name), tmp_path)
+
+    path = tmp_path / "switch_commander_100901.loconf"
+    doc = Document(path.as_uri(), path.read_text())
+    snippets = [ "", "\n", " := ", "name ", "3", "x", "(1 + 2)", "[1, 7]",
+                 "# ", "include \"nowhere.loconf\"", ]
+
+    rnd = random.Random(9)
+    for i in range(200):
+        line = rnd.randrange(len(doc.lines))
+        length = len(doc.lines[line].rstrip("\n"))
+        character = rnd.randint(0, length)
+        end = min(length, character + rnd.randrange(3))
+        doc.update([ change(line, character, rnd.choice(snippets),
+                            ( line, end, )) ])
+
+        fresh = Document(path.as_uri(), "".join(doc.lines))
+        assert doc.diagnostics() == fresh.diagnostics()
+        assert ( { cv: s.value for cv, s in doc.cvs.items() }
+                 == { cv: s.value for cv, s in fresh.cvs.items() } )
@@ -0,0 +1,62 @@
+import threading
+import serial
+
+from loconf.dccex import responses
+from loconf.dccex.reader import ResponseReader
+
+def test_lines_split_from_bytes():
+    serial_port = serial.serial_for_url("loop://", timeout=0.05)
+    reader = ResponseReader(serial_port)
+
+    received = []
+    done = threading.Event()
+    def subscriber(response):
+        received.append(response)
+        if len(received) == 4:
+            done.set()
+    reader.subscribe(subscriber)
+    reader.start()
+
+    try:
+        # Lines split across writes, a CR LF and a last line without
+        # a newline.
+        for data in ( b"<p1>\n<v 2", b"9 6>\r\n\n<* hel", b"lo *>\n<r 3>", ):
+            serial_port.write(data)
+        assert done.wait(2)
+    finally:
+        reader.stop()
+        reader.join()
+        serial_port.close()
+
+    assert [ type(response) for response in received ] == [
+        responses.TrackPower, responses.ReadCV,
+        responses.Comment, responses.ReadAddress, ]
+    assert received[1].value == 6
+    assert received[2].comment == "hello"
+
+def test_callback_errors_dont_stop_the_reader(capsys):
+    serial_port = serial.serial_for_url("loop://", timeout=0.05)
+    reader = ResponseReader(serial_port)
+
+    def broken(response):
+        raise RuntimeError("Broken subscriber")
+    reader.subscribe(broken)
+
+    # A reply to a command that has timed out.
+    future = reader.expect(lambda response: True)
+    route = future.route
+    reader.cancel(future)
+    reader.route(route.predicate, route.callback, once=True)
+
+    reply = reader.expect(lambda response: isinstance(response,
+                                                      responses.ReadCV))
+    reader.start()
+    try:
+        serial_port.write(b"<p1>\n<p0>\n<v 29 6>\n")
+        assert reply.result(2).value == 6
+    finally:
+        reader.stop()
+        reader.join()
+        serial_port.close()
+
+    assert "Broken subscriber" in capsys.readouterr().err
@@ -0,0 +1,55 @@
+import io
+import pytest
+
+from loconf.language.parser import Parser
+from loconf.language.exceptions import SyntaxError, ParseError
+from loconf.tools.compile import compile_file
+
+source = """\
+name 1 a
+a := 3
+c := 4
+2 := (3 + 1)
+5 := @ 7
+6 := 8
+name x y
+7 := [9]
+a := 1
+include "missing.loconf"
+8 := 2
+name 9
+"""
+
+@pytest.mark.parametrize("backend", [ "ply", "fast", ])
+def test_all_errors_are_collected(backend):
+    cvs, errors = Parser(backend=backend).parse_recovering(
+        io.StringIO(source))
+
+    assert cvs == { 1: 3, 5: 7, 6: 8, 8: 2, }
+    assert [ (type(error), error.lineno) for error in errors ] == [
+        (ParseError, 3),
+        (SyntaxError, 4),
+        (SyntaxError, 5),
+        (ParseError, 7),
+        (SyntaxError, 8),
+        (ParseError, 9),
+        (ParseError, 10),
+        (ParseError, 12), ]
+
+def test_first_error_is_raised_by_default():
+    with pytest.raises(ParseError) as info:
+        Parser().parse(io.StringIO(source))
+    assert info.value.lineno == 3
+
+def test_compile_file(tmp_path):
+    path = tmp_path / "broken.loconf"
+    path.write_text(source)
+
+    cvs, errors = compile_file(path, all_errors=True)
+    assert cvs == { 1: 3, 5: 7, 6: 8, 8: 2, }
+    assert len(errors) == 8
+    assert errors[0]["file"] == str(path)
+
+    cvs, errors = compile_file(path)
+    assert cvs is None
+    assert len(errors) == 1
@@ -0,0 +1,37 @@
+import pytest
+
+from loconf.dccex import responses
+
+@pytest.mark.parametrize("line, cls, fields", [
+    ("<* LCD2:Ready *>", responses.Comment, { "comment": "LCD2:Ready", }),
+    ("<X>", responses.Error, {}),
+    ("<= B PROG>", responses.TrackManagement,
+     { "trackletter": "B", "state": "PROG", "cab": None, }),
+    ("<= A DC 3>", responses.TrackManagement,
+     { "trackletter": "A", "state": "DC", "cab": 3, }),
+    ("<p1>", responses.TrackPower, { "state": 1, "trackletter": None, }),
+    ("<p0 A>\n", responses.TrackPower, { "state": 0, "trackletter": "A", }),
+    ("<p1 JOIN>", responses.TrackPower,
+     { "state": 1, "trackletter": None, "track": "JOIN", }),
+    ("<p2>", responses.TrackPower, { "state": 2, "track": None, }),
+    ('<@ 0 1 "Ready">', responses.At, {}),
+    ("<iDCC-EX V-5.0.0 / MEGA>", responses.Version, {}),
+    ("<v 29 6>", responses.ReadCV, { "cv": 29, "value": 6, }),
+    ("<r 3 100>", responses.WriteCV, { "cv": 3, "value": 100, }),
+    ("<r -1>", responses.ReadAddress, { "address": -1, }),
+    ("<w 1234>", responses.WriteAddress, { "address": 1234, }),
+    ("<r 7|4|17 192>", responses.ReadCVplus,
+     { "callbacknum": 7, "callbacksub": 4, "cv": 17, "value": 192, }), ])
+def test_from_line(line, cls, fields):
+    response = responses.Response.from_line(line)
+    assert type(response) is cls
+    for name, value in fields.items():
+        assert getattr(response, name) == value
+
+    with pytest.raises(AttributeError):
+        response.not_a_field = 1
+
+@pytest.mark.parametrize("line", [ "", "<", "<Q 1>", "<v x y>", "p1", ])
+def test_unknown_lines(line):
+    with pytest.raises(ValueError):
+        responses.Response.from_line(line)
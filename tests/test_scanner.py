@@ -0,0 +1,89 @@
+"""
+Differential tests: The “fast” parser backend must produce the same
+tokens, results and errors as the ply backend.
+"""
+
+import io, pathlib, random
+import pytest
+
+from loconf import config
+from loconf.language.parser import (Parser, LexerWrapper, ScannerWrapper,
+                                    lexer_template)
+
+doc = pathlib.Path(__file__).absolute().parent.parent / "doc"
+
+def tokens(wrapper):
+    try:
+        return [ tuple(token[:3]) for token in wrapper.tokenize() ]
+    except Exception as e:
+        return ( type(e), str(e), )
+
+def outcome(open_infile, backend, include_paths=[]):
+    config.include_cache.clear()
+    try:
+        parser = Parser(include_paths, backend)
+        with open_infile() as infile:
+            return parser.parse_settings(infile), parser.variables
+    except Exception as e:
+        return ( type(e), str(e), )
+
+def recovered(open_infile, backend, include_paths=[]):
+    config.include_cache.clear()
+    try:
+        parser = Parser(include_paths, backend)
+        with open_infile() as infile:
+            cvs, errors = parser.parse_recovering(infile)
+        return cvs, [ ( type(e), str(e), ) for e in errors ]
+    except Exception as e:
+        return ( type(e), str(e), )
+
+def compare(source, include_paths=[], open_infile=None):
+    if open_infile is None:
+        open_infile = lambda: io.StringIO(source)
+
+    assert ( tokens(LexerWrapper(lexer_template(), io.StringIO(source)))
+             == tokens(ScannerWrapper(io.StringIO(source))) )
+
+    assert ( outcome(open_infile, "ply", include_paths)
+             == outcome(open_infile, "fast", include_paths) )
+
+    assert ( recovered(open_infile, "ply", include_paths)
+             == recovered(open_infile, "fast", include_paths) )
+
+@pytest.mark.parametrize("path", sorted(doc.glob("**/*.loconf")),
+                         ids=lambda path: path.name)
+def test_doc_files(path):
+    compare(path.read_text(), [ doc, ], path.open)
+
+vocabulary = [ "name", "include", "NULL", "Vmax", "vmin", "_a1", "Grün",
+               "0", "3", "255", "1024", "0x1F", "0xff", "0xZZ", "0o17",
+               "0b101", "0b2", "٣", '"standard_defs.loconf"', '""', "''",
+               "'x'", ":=", ":", "=", "(", ")", "+", "[", "]", ",",
+               "# comment", "#", " /**/ ", "/*", "*/", "\n", "\r\n", " ",
+               "\t", "@", "-", "€", ]
+
+def test_fuzzed_inputs():
+    rng = random.Random(1701)
+    for i in range(2000):
+        words = rng.choices(vocabulary, k=rng.randint(1, 25))
+        separators = rng.choices([ "", " ", "\n", ], k=len(words))
+        source = "".join(w + s for (w, s) in zip(words, separators))
+        compare(source, [ doc, ])
+
+def test_fuzzed_statements():
+    rng = random.Random(4711)
+    numbers = [ "3", "0x10", "0b11", "0o7", "NULL", "a", "b", "(1 + 2)",
+                "(4+8)", "(3 + 1)", "[0, 7]", "[1]", "[8]", ]
+    for i in range(500):
+        lines = []
+        for j in range(rng.randint(1, 12)):
+            match rng.randint(0, 2):
+                case 0:
+                    lines.append(f"name {rng.choice(numbers)} "
+                                 f"{rng.choice(['a', 'b', 'c'])}")
+                case 1:
+                    lines.append(f"{rng.choice(numbers)} := "
+                                 f"{rng.choice(numbers)}")
+                case 2:
+                    lines.append("# " + rng.choice(numbers))
+        compare("\n".join(lines), [ doc, ])
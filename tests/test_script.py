@@ -0,0 +1,57 @@
+import time
+import pytest
+
+from loconf.dccex.script import ScriptRunner, parse, Command, Sleep, Remark
+
+@pytest.fixture
+def runner(station):
+    runner = ScriptRunner(station, timeout=0.5)
+    yield runner
+    runner.close()
+
+def test_parse():
+    assert parse([ "1 JOIN # power\n", "\n", "sleep .5\n", ]) == [
+        Command("1 JOIN"), Remark("# power"), Remark(""), Sleep(0.5), ]
+
+def test_setup_block(runner, simulator):
+    script = [ "1 JOIN\n", ] + [ f"T {id} DCC {id}\n"
+                                 for id in range(1, 201) ]
+
+    start = time.monotonic()
+    runner.run(parse(script))
+    assert time.monotonic() - start < 1
+
+    assert simulator.power
+    assert sorted(simulator.turnouts.keys()) == list(range(1, 201))
+    assert runner.errors == []
+
+def test_sleep_and_errors(runner, simulator):
+    script = [ "T 1 DCC 1\n",
+               "T 1 1\n", "sleep .1\n",
+               "T 1 0\n", "sleep .1\n",
+               "T 2 1\n", # Not defined
+               "s\n", ]   # Not known to the runner
+
+    start = time.monotonic()
+    runner.run(parse(script))
+    assert 0.2 <= time.monotonic() - start < 0.4
+
+    assert simulator.turnouts == { 1: 0, }
+    assert runner.errors == [ "T 2 1", ]
+
+def test_power_replies(runner, simulator):
+    start = time.monotonic()
+    runner.run(parse([ "1\n", "1 JOIN\n", "1 MAIN\n", "T 1 DCC 1\n", ]))
+    assert time.monotonic() - start < runner.timeout
+
+    assert simulator.turnouts == { 1: 0, }
+
+def test_reply_not_understood(runner, simulator):
+    simulator.handlers["1"] = lambda *args: [ "<p1 ?>", ]
+
+    start = time.monotonic()
+    runner.run(parse([ "1\n", "T 1 DCC 1\n", "T 2 1\n", "T 1 1\n", ]))
+    assert time.monotonic() - start < runner.timeout
+
+    assert simulator.turnouts == { 1: 1, }
+    assert runner.errors == [ "T 2 1", ]
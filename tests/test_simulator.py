@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+
+from loconf.dccex import responses
+from loconf.dccex.simulator import Simulator, Decoder
+from loconf.dccex.station import ReadFailed
+from loconf.dccex.async_station import AsyncDCCEX_Station
+
+def test_protocol():
+    simulator = Simulator(Decoder({ 1: 3, 29: 6, 5: 200, }))
+
+    assert simulator.handle("R 5") == [ "<v 5 200>", ]
+    assert simulator.handle("R 5 17 4") == [ "<r 17|4|5 200>", ]
+    assert simulator.handle("W 5 100") == [ "<r 5 100>", ]
+    assert simulator.handle("R 5") == [ "<v 5 100>", ]
+    assert simulator.handle("W 5 300") == [ "<X>", ]
+
+    assert simulator.handle("R") == [ "<r 3>", ]
+    assert simulator.handle("W 1234") == [ "<w 1234>", ]
+    assert simulator.handle("R") == [ "<r 1234>", ]
+    assert simulator.decoder.read(29) & 32
+
+    assert simulator.handle("1") == [ "<p1>", ]
+    assert simulator.handle("1 JOIN") == [ "<p1 JOIN>", ]
+    assert simulator.handle("=") == [ "<= A MAIN>", "<= B PROG>", ]
+    assert simulator.handle("Q") == [ "<X>", ]
+
+    # Everything it says must be understood.
+    for line in simulator.banner() + simulator.handle("s"):
+        responses.Response.from_line(line)
+
+def test_failure_injection():
+    simulator = Simulator(failure_rate=1.0)
+    assert simulator.handle("R 8") == [ "<v 8 -1>", ]
+    assert simulator.handle("W 3 1") == [ "<r 3 -1>", ]
+    assert simulator.decoder.read(3) == 0
+
+@pytest.mark.simulator(latency=0.002, jitter=0.002, seed=1)
+@pytest.mark.parametrize("station", [ "tcp", "pty", ], indirect=True)
+def test_station(station):
+    assert station.readcab() == 3
+    station.writecv(3, 17)
+    assert station.readcv(3) == 17
+    assert ( list(station.readcvs_many(range(1, 9)))
+             == [ (1, 3), (2, 0), (3, 17), (4, 0),
+                  (5, 0), (6, 0), (7, 1), (8, 13), ] )
+
+@pytest.mark.simulator(failure_rate=1.0)
+def test_station_read_failure(station):
+    with pytest.raises(ReadFailed):
+        station.readcv(1)
+    with pytest.raises(ReadFailed):
+        list(station.readcvs_many([ 1, 2, ]))
+
+def test_async_station():
+    simulator = Simulator(latency=0.002)
+    url = simulator.serve_tcp()
+
+    async def test():
+        station = await AsyncDCCEX_Station.connect(url, settle_time=0.05)
+        try:
+            await station.writecv(29, 14)
+            assert await station.readcv(29) == 14
+            assert await station.readcab() == 3
+        finally:
+            await station.close()
+
+    asyncio.run(test())
@@ -0,0 +1,81 @@
+import types
+import pytest
+
+from loconf import config
+from loconf.dccex.timing import LatencyProfiles
+from loconf.dccex.station import ReadFailed, StationError
+from loconf.database.controllers import ( create_roster_entry, store_cvs,
+                                          get_all_cvs, )
+from loconf.tools.configuration import writecvs_sync
+from loconf.utils import latency_profile, identify_decoder
+
+pytestmark = pytest.mark.simulator(cvs={ 1: 3, 2: 10, 3: 20, 4: 30, 29: 6, })
+
+@pytest.fixture(autouse=True)
+def configured(station, dbconn, monkeypatch):
+    monkeypatch.setitem(config.__dict__, "station", station)
+    monkeypatch.setitem(config.__dict__, "latency_profiles",
+                        LatencyProfiles({}, None))
+
+vehicle = types.SimpleNamespace(address=3, vehicle_id="")
+
+def test_only_differences_are_written(simulator, capsys):
+    args = types.SimpleNamespace(vehicle=vehicle, dont_update=True,
+                                 revision_comment="")
+
+    before = simulator.commands_handled
+    writecvs_sync(args, { 2: 10, 3: 21, 4: 30, 5: None, }, {}, 3)
+
+    assert simulator.decoder.cvs[3] == 21
+    # readcab, reading CVs 8 and 7 for the latency profile, three
+    # verifies, one write, one verify after writing
+    assert simulator.commands_handled - before == 8
+    assert "3 CVs checked, 1 written, 2 writes saved" in capsys.readouterr().err
+
+def test_more_writes_than_predicted(capsys):
+    args = types.SimpleNamespace(vehicle=vehicle, dont_update=True,
+                                 revision_comment="")
+
+    # The database thinks only CV 3 differs, but CV 2 does, too.
+    writecvs_sync(args, { 2: 11, 3: 21, }, { 2: 11, }, 1)
+    assert ( "2 CVs checked, 2 written, 1 more than the database predicted."
+             in capsys.readouterr().err )
+
+def test_station_without_verify(simulator):
+    del simulator.handlers["V"]
+    assert ( dict(config.station.verifycvs_many({ 2: 10, 3: 0, }))
+             == { 2: 10, 3: 20, } )
+
+def test_verify_error_after_first(simulator):
+    # CV 2000 doesn’t exist. That is an error, not a reason to read
+    # the CVs instead.
+    before = simulator.commands_handled
+    with pytest.raises(StationError):
+        dict(config.station.verifycvs_many({ 2: 10, 2000: 0, }, depth=1))
+    assert simulator.commands_handled - before == 2
+
+def test_decoder_from_database(simulator):
+    create_roster_entry("br01", 3, "", "BR 01")
+    store_cvs(vehicle, { 7: 1, 8: 13, }, "")
+    config.latency_profiles.learn("13/1", { "read": 0.2, })
+
+    before = simulator.commands_handled
+    with latency_profile(vehicle):
+        assert config.station.timing.estimate("read") == 0.2
+    assert simulator.commands_handled == before
+
+def test_decoder_query_is_limited(simulator):
+    create_roster_entry("br01", 3, "", "BR 01")
+    store_cvs(vehicle, { 1: 3, 7: 1, 8: 13, 29: 6, }, "")
+
+    assert get_all_cvs(vehicle, cvs=( 7, 8, )) == { 7: 1, 8: 13, }
+    assert get_all_cvs(vehicle, cvs=()) == {}
+    assert identify_decoder(vehicle) == "13/1"
+
+def test_decoder_unknown(simulator, monkeypatch):
+    def readcv(cv):
+        raise ReadFailed(f"<R {cv}>")
+    monkeypatch.setattr(config.station, "readcv", readcv)
+
+    with latency_profile(vehicle):
+        assert config.station.timing.estimate("read") is None
@@ -0,0 +1,78 @@
+import pytest
+
+from loconf.dccex.station import ReadFailed
+from loconf.dccex.timing import TimingPolicy, LatencyProfiles
+
+def test_timeouts_adapt():
+    timing = TimingPolicy(default_timeout=1, min_samples=5, factor=3,
+                          min_timeout=0.05)
+    assert timing.timeout("read") == 1
+
+    for i in range(5):
+        timing.record("read", 0.1)
+    assert timing.timeout("read") == pytest.approx(0.3)
+    assert timing.timeout("write") == 1
+
+    # Timeouts count as samples, so they push the timeout up.
+    for i in range(5):
+        timing.record("read", 1)
+    assert timing.timeout("read") == 3
+
+    assert timing.learned_profile() == { "read": 1, }
+
+def test_profile_is_used_until_timed():
+    timing = TimingPolicy(default_timeout=1, min_samples=2, factor=2,
+                          min_timeout=0.05)
+    timing.load_profile({ "read": 0.2, })
+    assert timing.timeout("read") == pytest.approx(0.4)
+
+    timing.record("read", 0.05)
+    timing.record("read", 0.05)
+    assert timing.timeout("read") == pytest.approx(0.1)
+
+def test_profiles_are_stored(tmp_path):
+    path = tmp_path / "latency_profiles.toml"
+    configured = { "151/255": { "read": 0.5, "write": 0.2, }, }
+
+    profiles = LatencyProfiles(configured, path)
+    profiles.learn("151/255", { "read": 0.3, })
+    profiles.learn("13/1", { "read": 0.1, "verify": 0.05, })
+
+    profiles = LatencyProfiles(configured, path)
+    assert profiles.get("151/255") == { "read": 0.3, "write": 0.2, }
+    assert profiles.get("13/1") == { "read": 0.1, "verify": 0.05, }
+    assert profiles.get("99/1") == {}
+
+def flaky(test):
+    """
+    Run “test” on a decoder that doesn’t acknowledge 30% of the time.
+    """
+    test = pytest.mark.simulator(cvs=dict([ (cv, cv) for cv in range(1, 41) ]),
+                                 latency=0.002, failure_rate=0.3, seed=3)(test)
+    return pytest.mark.station(retries=10, backoff=0.001)(test)
+
+@flaky
+def test_retries(station):
+    assert station.readcv(5) == 5
+    assert station.writecv(5, 50).value == 50
+    assert ( dict(station.readcvs_many(range(1, 41)))
+             == dict([ (cv, cv) for cv in range(1, 41) ]) | { 5: 50, } )
+
+    # Timeouts have adapted to the simulator’s latency.
+    assert station.timing.timeout("read") < 1
+
+@flaky
+def test_retries_give_up(station):
+    station.timing.retries = 0
+    with pytest.raises(ReadFailed):
+        for i in range(20):
+            station.readcv(1)
+
+@pytest.mark.simulator(cvs={ 1: 11, 2: 22, 3: 33, }, latency=0.15)
+@pytest.mark.station(default_line_timeout=0.1, retries=5, backoff=0.01)
+def test_late_replies_after_timeout(station):
+    # Each read times out at least once and its retry’s reply arrives
+    # while the next CV is being read.
+    assert [ station.readcv(cv) for cv in ( 1, 2, 3, ) ] == [ 11, 22, 33, ]
+    assert station.writecv(2, 23).value == 23
+    assert station.readcv(2) == 23
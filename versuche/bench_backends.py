@@ -0,0 +1,96 @@
+"""
+Compare the SQLite and the PostgreSQL backend on the controllers’
+operations.
+
+    python -m versuche.bench_backends [-v vehicles] [-r revisions]
+
+SQLite runs on a database in a temporary directory. PostgreSQL runs
+in a scratch schema of the database configured in ~/.loconfrc.toml,
+which is dropped afterwards, and is skipped if none is configured.
+"""
+
+import argparse, pathlib, tempfile, time, random
+
+from sqlclasses import sql
+
+from loconf import config
+from loconf.database.connection import SQLiteConnection, PostgresConnection
+from loconf.database.controllers import ( create_roster_entry,
+                                          query_vehicles, store_many_cvs,
+                                          store_cvs, get_all_cvs, )
+from .bench_current_value import sql_dir, statements
+
+def measure(label, count, f):
+    start = time.perf_counter()
+    f()
+    t = time.perf_counter() - start
+    print(f"    {label:16} {count:6} in {t:8.3f} s "
+          f"{t / count * 1e3:9.3f} ms each")
+
+def run(args):
+    for n in range(1, args.vehicles + 1):
+        create_roster_entry(f"v{n}", n, "", f"Vehicle {n}")
+    vehicles = list(query_vehicles(sql.where("true")))
+
+    dumps = [ ( vehicle,
+                dict([ (cv, (cv + r) % 256) for cv in range(1, 257) ]),
+                f"Dump {r}", )
+              for r in range(args.revisions)
+              for vehicle in vehicles ]
+    measure("store_many_cvs", len(dumps), lambda: store_many_cvs(dumps))
+
+    def store():
+        for vehicle in vehicles:
+            store_cvs(vehicle, { 1: vehicle.address, 29: 6, }, "Changed")
+    measure("store_cvs", len(vehicles), store)
+
+    lookups = random.Random(1).choices(vehicles, k=args.lookups)
+    def lookup():
+        for vehicle in lookups:
+            get_all_cvs(vehicle)
+    measure("get_all_cvs", len(lookups), lookup)
+
+    measure("query_vehicles", 1,
+            lambda: query_vehicles(sql.where("address > 10")))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--vehicles", type=int, default=50)
+    ap.add_argument("-r", "--revisions", type=int, default=10)
+    ap.add_argument("-n", "--lookups", type=int, default=500)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("SQLite")
+        dbconn = SQLiteConnection(pathlib.Path(tmpdir, "loconf.sqlite"))
+        config.__dict__["dbconn"] = dbconn
+        try:
+            run(args)
+        finally:
+            dbconn.close()
+
+    postgres = config.confdata.get("database", None)
+    if not isinstance(postgres, dict) or postgres.get("type") != "psycopg2":
+        print("No PostgreSQL database configured.")
+        return
+
+    print("PostgreSQL")
+    dbconn = PostgresConnection(postgres.get("params"))
+    config.__dict__["dbconn"] = dbconn
+    cursor = dbconn.cursor()
+    cursor.execute("CREATE SCHEMA loconf_bench; "
+                   "SET search_path TO loconf_bench")
+    try:
+        for statement in statements(sql_dir / "postgres.sql"):
+            cursor.execute(statement)
+        dbconn.commit()
+        run(args)
+    finally:
+        dbconn.rollback()
+        cursor.execute("SET search_path TO DEFAULT; "
+                       "DROP SCHEMA loconf_bench CASCADE")
+        dbconn.commit()
+        dbconn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare looking up a vehicle’s current CVs in the revision history,
+as get_all_cvs() used to, with looking them up in current_value.
+
+    python -m versuche.bench_current_value [-v vehicles] [-r revisions]
+
+Needs the database configured in ~/.loconfrc.toml. Everything happens
+in a scratch schema inside a transaction that is rolled back, so the
+database is left as it was. Each revision sets “-c” of 200 CVs.
+"""
+
+import argparse, pathlib, random, time
+
+from loconf import config
+
+sql_dir = pathlib.Path(__file__).absolute().parent.parent / "sql"
+
+history_query = """\
+    WITH latest AS (
+        SELECT cv, address, vehicle_id, MAX(revision_id) AS revision_id
+          FROM value
+          LEFT JOIN revision ON revision_id = revision.id
+          GROUP BY cv, address, vehicle_id
+    )
+    SELECT latest.cv, value
+      FROM latest
+      LEFT JOIN value
+             ON latest.cv = value.cv
+            AND latest.revision_id = value.revision_id
+     WHERE address = %s AND vehicle_id = %s
+     ORDER BY cv"""
+
+current_query = """\
+    SELECT cv, value
+      FROM current_value
+     WHERE address = %s AND vehicle_id = %s
+     ORDER BY cv"""
+
+def statements(path:pathlib.Path):
+    for statement in path.read_text().split(";"):
+        lines = [ line for line in statement.split("\n")
+                  if not line.strip().startswith("--") ]
+        statement = "\n".join(lines).strip()
+        if statement and statement not in ( "BEGIN", "COMMIT", ):
+            yield statement
+
+def measure(label, cursor, query, addresses):
+    start = time.perf_counter()
+    for address in addresses:
+        cursor.execute(query, ( address, "", ))
+        cursor.fetchall()
+    t = time.perf_counter() - start
+    print(f"{label:8} {len(addresses):4} lookups {t:8.3f} s "
+          f"{t / len(addresses) * 1e3:9.3f} ms per lookup")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--vehicles", type=int, default=500)
+    ap.add_argument("-r", "--revisions", type=int, default=200)
+    ap.add_argument("-c", "--cvs", type=int, default=10)
+    ap.add_argument("-n", "--lookups", type=int, default=50)
+    args = ap.parse_args()
+
+    cursor = config.dbconn.cursor()
+    try:
+        cursor.execute("CREATE SCHEMA loconf_bench; "
+                       "SET LOCAL search_path TO loconf_bench")
+        for statement in statements(sql_dir / "postgres.sql"):
+            cursor.execute(statement)
+
+        start = time.perf_counter()
+        cursor.execute("INSERT INTO roster (nickname, address, vehicle_id) "
+                       "SELECT 'v' || n, n, '' "
+                       "  FROM generate_series(1, %s) n", ( args.vehicles, ))
+        cursor.execute("INSERT INTO revision (address, vehicle_id) "
+                       "SELECT n, '' "
+                       "  FROM generate_series(1, %s) r, "
+                       "       generate_series(1, %s) n",
+                       ( args.revisions, args.vehicles, ))
+        cursor.execute("INSERT INTO value (revision_id, cv, value) "
+                       "SELECT id, 1 + (id * 7 + k * 13) %% 200, "
+                       "       (id + k) %% 256 "
+                       "  FROM revision, generate_series(1, %s) k",
+                       ( args.cvs, ))
+        print(f"{args.vehicles} vehicles × {args.revisions} revisions × "
+              f"{args.cvs} CVs inserted in "
+              f"{time.perf_counter() - start:.1f} s.")
+
+        # postgres.sql has created the table already.
+        start = time.perf_counter()
+        for statement in statements(sql_dir / "migrate_current_value.sql"):
+            if not statement.startswith("CREATE TABLE"):
+                cursor.execute(statement)
+        print(f"current_value backfilled in "
+              f"{time.perf_counter() - start:.1f} s.")
+        cursor.execute("ANALYZE")
+
+        addresses = random.Random(1).choices(range(1, args.vehicles + 1),
+                                             k=args.lookups)
+
+        # Both must find the same values.
+        for address in addresses[:5]:
+            cursor.execute(history_query, ( address, "", ))
+            history = cursor.fetchall()
+            cursor.execute(current_query, ( address, "", ))
+            assert cursor.fetchall() == history
+
+        measure("history", cursor, history_query, addresses)
+        measure("current", cursor, current_query, addresses)
+
+        cursor.execute("EXPLAIN " + current_query, ( addresses[0], "", ))
+        for line, in cursor.fetchall():
+            print("   ", line)
+    finally:
+        config.dbconn.rollback()
+
+if __name__ == "__main__":
+    main()
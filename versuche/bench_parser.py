@@ -0,0 +1,82 @@
+"""
+Measure the time it takes to parse the .loconf files in doc/.
+
+    python -m versuche.bench_parser [-n repetitions] [-s lines]
+
+“fresh lexer” builds a new ply lexer for every input file, as the
+parser used to. “lexer template” clones the process-wide lexer.
+
+With -s, parse a generated file with that many CV assignments
+instead, once per size doubling up to the given number of lines, to
+check parse time grows linearly. This compares the ply and the “fast”
+parser backends.
+"""
+
+import sys, pathlib, argparse, timeit, io
+import ply.lex
+
+from loconf.language import parser, lextokens
+
+doc = pathlib.Path(__file__).absolute().parent.parent / "doc"
+
+def fresh_lexer():
+    return ply.lex.lex(module=lextokens, reflags=0,
+                       optimize=False, lextab=None)
+
+def parse_all(paths):
+    for path in paths:
+        p = parser.Parser()
+        with path.open() as fp:
+            p.parse(fp)
+
+def synthetic(lines):
+    return "".join(f"{cv} := {cv % 256}\n" for cv in range(1, lines+1))
+
+def bench_synthetic(max_lines):
+    lines = max(1, max_lines // 16)
+    while lines <= max_lines:
+        source = synthetic(lines)
+        for backend in parser.backends.keys():
+            def parse():
+                parser.Parser(backend=backend).parse(io.StringIO(source))
+            t = timeit.timeit(parse, number=1)
+            print(f"{backend:5} {lines:8} lines {t:8.3f} s "
+                  f"{t / lines * 1e6:8.2f} µs per line")
+        lines *= 2
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--repetitions", type=int, default=20)
+    ap.add_argument("-s", "--synthetic", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.synthetic:
+        bench_synthetic(args.synthetic)
+        return
+
+    # Only files that parse without errors on their own.
+    paths = []
+    for path in sorted(doc.glob("**/*.loconf")):
+        try:
+            parse_all([path])
+        except Exception:
+            pass
+        else:
+            paths.append(path)
+
+    def run(label):
+        t = timeit.timeit(lambda: parse_all(paths), number=args.repetitions)
+        per_file = t / (args.repetitions * len(paths)) * 1000
+        print(f"{label:16} {per_file:8.3f} ms per file")
+
+    template = parser.lexer_template
+    parser.lexer_template = fresh_lexer
+    try:
+        run("fresh lexer")
+    finally:
+        parser.lexer_template = template
+
+    run("lexer template")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measure how many lines of broadcast traffic per second the reader
+thread takes off the serial port and dispatches.
+
+    python -m versuche.bench_reader [-n lines]
+
+The lines are sent all at once through a local TCP connection,
+opened as a pyserial “socket://” port. (A “loop://” port hands data
+over a byte at a time, which makes it the bottleneck.)
+“bytes” is ResponseReader, “text” the way it used to work, reading
+lines from a TextIOWrapper over a BufferedRWPair, for comparison.
+"""
+
+import argparse, io, socket, threading, time
+import serial
+
+from loconf.dccex.reader import Dispatcher, ResponseReader
+
+corpus = [
+    "<* LCD3:Free RAM=  5420b *>",
+    '<@ 0 2 "Ready">',
+    "<p1 A>",
+    "<p0>",
+    "<= A MAIN>",
+    "<= B PROG>",
+    "<iDCC-EX V-5.0.0 / MEGA / STANDARD_MOTOR_SHIELD G-3bddf4d>",
+]
+
+class TextReader(Dispatcher, threading.Thread):
+    def __init__(self, serial_port):
+        Dispatcher.__init__(self)
+        threading.Thread.__init__(self, daemon=True)
+        self.port = io.TextIOWrapper(io.BufferedRWPair(serial_port,
+                                                       serial_port))
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        while not self.stopped:
+            line = self.port.readline().rstrip()
+            if line != "":
+                self.handle_line(line)
+
+def measure(label, reader_class, lines:bytes, count:int):
+    server = socket.create_server(("127.0.0.1", 0))
+    host, port = server.getsockname()
+    serial_port = serial.serial_for_url(f"socket://{host}:{port}",
+                                        timeout=0.1)
+    connection, address = server.accept()
+    reader = reader_class(serial_port)
+
+    done = threading.Event()
+    received = 0
+    def tally(response):
+        nonlocal received
+        received += 1
+        if received == count:
+            done.set()
+    reader.subscribe(tally)
+    reader.start()
+
+    start = time.perf_counter()
+    connection.sendall(lines)
+    done.wait()
+    t = time.perf_counter() - start
+
+    reader.stop()
+    reader.join()
+    serial_port.close()
+    connection.close()
+    server.close()
+
+    print(f"{label:6} {count:7} lines {t:8.3f} s {count / t:10.0f} lines/s")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--lines", type=int, default=100000)
+    args = ap.parse_args()
+
+    lines = "".join(corpus[i % len(corpus)] + "\n"
+                    for i in range(args.lines)).encode("ascii")
+
+    measure("text", TextReader, lines, args.lines)
+    measure("bytes", ResponseReader, lines, args.lines)
+
+if __name__ == "__main__":
+    main()
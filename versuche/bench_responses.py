@@ -0,0 +1,84 @@
+"""
+Measure how many station output lines per second
+responses.Response.from_line() parses.
+
+    python -m versuche.bench_responses [-n repetitions]
+
+The corpus is modelled on what a DCC-EX prints while reading and
+writing CVs: diagnostics, display updates, power and track broadcasts
+between the replies. “sequential” is the way from_line() used to
+work, trying every regex and resolving the type hints on every
+instantiation, for comparison.
+"""
+
+import argparse, timeit, typing, types
+
+from loconf.dccex import responses
+
+corpus = [
+    "<* LCD3:Free RAM=  5420b *>",
+    "<* LCD2:Ready *>",
+    '<@ 0 1 "Free RAM=  5420b">',
+    '<@ 0 2 "Ready">',
+    "<iDCC-EX V-5.0.0 / MEGA / STANDARD_MOTOR_SHIELD G-3bddf4d>",
+    "<= A MAIN>",
+    "<= B PROG>",
+    "<p1>",
+    "<p1 A>",
+    "<p0>",
+    "<v 1 3>",
+    "<v 29 6>",
+    "<v 8 -1>",
+    "<r 3 100>",
+    "<r 3>",
+    "<w 1234>",
+    "<r 7|4|17 192>",
+    "<r 8|4|18 210>",
+    "<X>",
+    "<* TRACK A ALERT OVERLOAD 1520mA 6800mA *>",
+]
+
+def sequential(line:str):
+    line = line.rstrip()
+    for Response in responses.response_classes:
+        match = Response.regex.match(line)
+        if match is not None:
+            ret = {}
+            annotations = typing.get_type_hints(Response)
+            for name, value in match.groupdict().items():
+                target_type = annotations[name]
+                if isinstance(target_type, types.UnionType):
+                    for t in typing.get_args(target_type):
+                        if t is type(None):
+                            value = None
+                            break
+                        try:
+                            value = t(value)
+                        except (ValueError, TypeError):
+                            pass
+                        else:
+                            break
+                else:
+                    value = target_type(value)
+                ret[name] = value
+            return ret
+
+    raise ValueError(line)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--repetitions", type=int, default=5000)
+    args = ap.parse_args()
+
+    lines = corpus * args.repetitions
+    for name, parse in [ ("sequential", sequential),
+                         ("from_line", responses.Response.from_line), ]:
+        def run():
+            for line in lines:
+                parse(line)
+        t = min(timeit.repeat(run, number=1, repeat=3))
+        print(f"{name:12} {len(lines):8} lines {t:7.3f} s "
+              f"{len(lines) / t:12,.0f} lines/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the memory and the time it takes to go through a vehicle’s
+CV history as dbobjects in a Result, as compact rows in a Result and
+as compact rows streamed from the cursor.
+
+    python -m versuche.bench_result [-r revisions] [-c cvs]
+
+Runs on an SQLite database in a temporary directory. “peak” is the
+most memory tracemalloc saw allocated while the rows were gone through.
+"""
+
+import argparse, pathlib, tempfile, time, tracemalloc
+
+from sqlclasses import sql
+
+from loconf import config
+from loconf.database.connection import SQLiteConnection
+from loconf.database.object import dbobject
+from loconf.database.controllers import ( create_roster_entry,
+                                          query_vehicles, store_many_cvs,
+                                          iter_history, )
+
+query = """SELECT revision.id AS revision_id, ctime, comment, cv, value
+             FROM revision
+             JOIN value ON revision_id = revision.id
+            WHERE address = %s AND vehicle_id = %s
+            ORDER BY revision.id, cv"""
+
+def measure(label, f):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = 0
+    for row in f():
+        count += 1
+    t = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:10} {count:8} rows {t:8.3f} s "
+          f"peak {peak / 1024**2:8.1f} MiB {peak / count:8.1f} B per row")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-r", "--revisions", type=int, default=1000)
+    ap.add_argument("-c", "--cvs", type=int, default=256)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dbconn = SQLiteConnection(pathlib.Path(tmpdir, "loconf.sqlite"))
+        config.__dict__["dbconn"] = dbconn
+        try:
+            create_roster_entry("v1", 1, "", "Vehicle 1")
+            vehicle, = query_vehicles(sql.where("true"))
+            store_many_cvs([ ( vehicle,
+                               dict([ (cv, (cv + r) % 256)
+                                      for cv in range(1, args.cvs + 1) ]),
+                               f"Dump {r}", )
+                             for r in range(args.revisions) ])
+
+            parameters = ( vehicle.address, vehicle.vehicle_id, )
+            measure("dbobject",
+                    lambda: dbconn.query(query, parameters, dbobject))
+            measure("rows", lambda: list(dbconn.stream(query, parameters)))
+            measure("streamed", lambda: iter_history(vehicle))
+        finally:
+            dbconn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure CV read and write throughput against the simulated command
+station.
+
+    python -m versuche.bench_station [-n cvs] [-l latency] [-j jitter]
+
+“readcv” reads one CV at a time, “readcvs_many” keeps several reads
+in flight, “writecv” writes one CV at a time.
+"""
+
+import argparse, time
+
+from loconf.dccex.simulator import Simulator
+from loconf.dccex.station import DCCEX_Station
+
+def measure(label, count, f):
+    start = time.perf_counter()
+    f()
+    t = time.perf_counter() - start
+    print(f"{label:14} {count:5} CVs {t:8.3f} s {t / count * 1e3:8.2f} ms "
+          f"per CV")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--cvs", type=int, default=100)
+    ap.add_argument("-l", "--latency", type=float, default=0.005)
+    ap.add_argument("-j", "--jitter", type=float, default=0.0)
+    ap.add_argument("-u", "--url", default=None,
+                    help="Use this station rather than a simulator.")
+    args = ap.parse_args()
+
+    if args.url is None:
+        simulator = Simulator(latency=args.latency, jitter=args.jitter)
+        url = simulator.serve_tcp()
+    else:
+        url = args.url
+
+    station = DCCEX_Station(url)
+    cvs = range(1, args.cvs + 1)
+
+    def readcv():
+        for cv in cvs:
+            station.readcv(cv)
+
+    def readcvs_many():
+        for cv, value in station.readcvs_many(cvs):
+            pass
+
+    def writecv():
+        for cv in cvs:
+            station.writecv(cv, cv % 256)
+
+    measure("readcv", len(cvs), readcv)
+    measure("readcvs_many", len(cvs), readcvs_many)
+    measure("writecv", len(cvs), writecv)
+
+    station.close()
+
+if __name__ == "__main__":
+    main()
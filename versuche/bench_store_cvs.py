@@ -0,0 +1,75 @@
+"""
+Measure storing CV dumps in the database, one revision per dump.
+
+    python -m versuche.bench_store_cvs [-v vehicles] [-r revisions]
+
+Needs the database configured in ~/.loconfrc.toml. The tables are
+created in a scratch schema, which is dropped afterwards. “insert”
+stores each dump the way store_cvs() used to: INSERT the revision,
+SELECT its id with CURRVAL() and INSERT the values with a single
+multi-row statement, committing each. “copy” passes all of them to
+store_many_cvs() at once.
+"""
+
+import argparse, time, types
+
+from sqlclasses import sql
+
+from loconf import config
+from loconf.database.controllers import store_many_cvs
+from .bench_current_value import sql_dir, statements
+
+def store_with_insert(revisions):
+    for vehicle, cvs, comment in revisions:
+        id = config.dbconn.insert_from_dict(
+            "revision", { "address": vehicle.address,
+                          "vehicle_id": vehicle.vehicle_id,
+                          "comment": comment, })
+        config.dbconn.execute(sql.insert.from_dict(
+            "value", *[ {"revision_id": id, "cv": cv, "value": value}
+                        for ( cv, value ) in cvs.items() ]))
+        config.dbconn.commit()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--vehicles", type=int, default=50)
+    ap.add_argument("-r", "--revisions", type=int, default=20)
+    ap.add_argument("-c", "--cvs", type=int, default=256,
+                    help="CVs per dump.")
+    args = ap.parse_args()
+
+    vehicles = [ types.SimpleNamespace(address=n, vehicle_id="")
+                 for n in range(1, args.vehicles + 1) ]
+    revisions = [ ( vehicle,
+                    dict([ (cv, (cv + r) % 256)
+                           for cv in range(1, args.cvs + 1) ]),
+                    f"Dump {r}", )
+                  for r in range(args.revisions)
+                  for vehicle in vehicles ]
+
+    cursor = config.dbconn.cursor()
+    cursor.execute("CREATE SCHEMA loconf_bench; "
+                   "SET search_path TO loconf_bench")
+    try:
+        for statement in statements(sql_dir / "postgres.sql"):
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO roster (nickname, address, vehicle_id) "
+                       "SELECT 'v' || n, n, '' "
+                       "  FROM generate_series(1, %s) n", ( args.vehicles, ))
+        config.dbconn.commit()
+
+        for label, store in ( ( "insert", store_with_insert, ),
+                              ( "copy", store_many_cvs, ), ):
+            start = time.perf_counter()
+            store(revisions)
+            t = time.perf_counter() - start
+            print(f"{label:6} {len(revisions):6} dumps of {args.cvs} CVs "
+                  f"{t:8.3f} s")
+    finally:
+        config.dbconn.rollback()
+        cursor.execute("SET search_path TO DEFAULT; "
+                       "DROP SCHEMA loconf_bench CASCADE")
+        config.dbconn.commit()
+
+if __name__ == "__main__":
+    main()